@@ -0,0 +1,372 @@
+"""Placement-search bot.
+
+``find_placements`` runs a BFS over the same move/rotate transitions the
+engine uses (wall kicks included) on plain row bitmasks, and returns
+every distinct resting position of a piece together with the actions
+that reach it - also those that need a tuck or a kick under an overhang.
+``PlacementBot`` scores the resulting boards with a pluggable heuristic
+and does a beam search over the hold piece and the preview queue.  Boards
+are identified by Zobrist hashes: scored placements are kept in a
+transposition table across plans, and positions reached along several
+paths are only searched once.
+"""
+import gc
+import time
+from collections import deque, namedtuple
+
+from board import zobrist_hash, zobrist_keys, zobrist_row
+from engine import HARD_DROP, HOLD, MOVE_LEFT, MOVE_RIGHT, ROTATE, SOFT_DROP, position_key
+from pieces import PIECE_STATES
+from transposition import TranspositionTable
+
+# Board features handed to a heuristic
+Features = namedtuple("Features", "aggregate_height max_height holes bumpiness lines t_spins")
+
+# A reachable resting position; actions lead there from the start position
+Placement = namedtuple("Placement", "rotation x y t_spin actions")
+
+DEADLINE_CHECK = 32  # BFS nodes between two looks at the clock
+
+
+class SearchTimeout(Exception):
+    """A search ran past its deadline"""
+
+
+def default_heuristic(f):
+    """Weighted sum of the classic placement features (higher is better)"""
+    return (-0.510066 * f.aggregate_height
+            - 0.35663 * f.holes
+            - 0.184483 * f.bumpiness
+            + 0.760666 * f.lines
+            + 2.0 * f.t_spins)
+
+
+def _fits(rows, width, height, state, x, y):
+    """Inverse of Board.collides for a bare list of row masks"""
+    if x < 0 or x + state.width > width or y + state.height > height:
+        return False
+    for i, mask in enumerate(state.masks):
+        if y + i >= 0 and rows[y + i] & (mask << x):
+            return False
+    return True
+
+
+def _tspin(rows, width, height, state, x, y):
+    """The engine's T-spin corner rule (see Tetrimino.rotate)"""
+    corners = 0
+    for cx, cy in state.tspin_corners:
+        tx = x + cx
+        ty = y + cy
+        if (tx < 0 or tx >= width or ty >= height
+                or (ty >= 0 and (rows[ty] >> tx) & 1)):
+            corners += 1
+    return corners >= 3
+
+
+def find_placements(rows, width, height, shape_idx, x, y, rotation=0, deadline=None):
+    """All distinct resting positions reachable from (rotation, x, y)
+
+    Raises SearchTimeout once time.perf_counter() passes deadline.
+    """
+    states = PIECE_STATES[shape_idx]
+    if not _fits(rows, width, height, states[rotation], x, y):
+        return []
+
+    # Column tops (first filled row, height if empty) for the drop shortcut, and
+    # the covered empty cells ("caves") that only tucks and kicks can reach
+    tops = [height] * width
+    caves = [0] * height
+    covered = 0
+    for i, row in enumerate(rows):
+        caves[i] = covered & ~row
+        new = row & ~covered
+        while new:
+            low = new & -new
+            tops[low.bit_length() - 1] = i
+            new ^= low
+        covered |= row
+
+    def near_cave(state, x, y):
+        band = ((1 << (state.width + 4)) - 1) << max(x - 2, 0)
+        for i in range(max(y - 1, 0), min(y + state.height + 3, height)):
+            if caves[i] & band:
+                return True
+        return False
+
+    stack_top = next((i for i, row in enumerate(rows) if row), height)
+    start = (rotation, x, y)
+    parent = {start: None}
+    queue = deque([start])
+    finals = {}
+
+    def visit(node, prev, action, count=1):
+        if node not in parent:
+            parent[node] = (prev, action, count)
+            queue.append(node)
+
+    pops = 0
+    while queue:
+        pops += 1
+        if deadline is not None and pops % DEADLINE_CHECK == 0 and time.perf_counter() > deadline:
+            raise SearchTimeout()
+        node = queue.popleft()
+        r, x, y = node
+        state = states[r]
+
+        land = height
+        for col, bottom in enumerate(state.bottoms):
+            top = tops[x + col]
+            if y + bottom >= top:
+                # Under an overhang: step down the slow way
+                land = y
+                while _fits(rows, width, height, state, x, land + 1):
+                    land += 1
+                break
+            if top - bottom - 1 < land:
+                land = top - bottom - 1
+
+        # Without a cave nearby, every position inside the stack is also
+        # reachable straight from the sky above it, so the search only needs
+        # the full move set in open sky, next to caves (tucks, kicks into
+        # slots) and for T pieces resting on something (spins)
+        sky = y + state.height <= stack_top
+        cave = not sky and near_cave(state, x, y)
+        if land == y:
+            key = (state.masks, x, y)
+            if key not in finals:
+                finals[key] = (node, False)
+            if not (sky or cave or state.tspin_corners):
+                continue
+        else:
+            visit((r, x, land), node, SOFT_DROP, land - y)
+            if not (sky or cave):
+                continue
+            if land > y + 1 and cave:
+                visit((r, x, y + 1), node, SOFT_DROP)
+
+        if sky or cave:
+            if _fits(rows, width, height, state, x - 1, y):
+                visit((r, x - 1, y), node, MOVE_LEFT)
+            if _fits(rows, width, height, state, x + 1, y):
+                visit((r, x + 1, y), node, MOVE_RIGHT)
+
+        nr = (r + 1) % 4
+        new_state = states[nr]
+        for dx, dy in state.kicks:
+            nx = x + dx
+            ny = y + dy
+            if _fits(rows, width, height, new_state, nx, ny):
+                succ = (nr, nx, ny)
+                visit(succ, node, ROTATE)
+                # A spin only counts if the rotation itself is the last move
+                if (new_state.tspin_corners
+                        and not _fits(rows, width, height, new_state, nx, ny + 1)
+                        and _tspin(rows, width, height, new_state, nx, ny)):
+                    finals[(new_state.masks, nx, ny)] = ((node, succ), True)
+                break
+
+    placements = []
+    for (node, t_spin) in finals.values():
+        actions = [ROTATE] if t_spin else []
+        if t_spin:
+            node, final = node
+        else:
+            final = node
+        while parent[node] is not None:
+            prev, action, count = parent[node]
+            actions.extend([action] * count)
+            node = prev
+        actions.reverse()
+        actions.append(HARD_DROP)
+        r, x, y = final
+        placements.append(Placement(r, x, y, t_spin, tuple(actions)))
+    return placements
+
+
+def place_and_clear(rows, width, shape_idx, placement):
+    """Return (new rows, lines cleared) after locking a placement"""
+    state = PIECE_STATES[shape_idx][placement.rotation]
+    rows = list(rows)
+    for i, mask in enumerate(state.masks):
+        if placement.y + i >= 0:
+            rows[placement.y + i] |= mask << placement.x
+    full = (1 << width) - 1
+    kept = [row for row in rows if row != full]
+    lines = len(rows) - len(kept)
+    if lines:
+        kept[:0] = [0] * lines
+    return kept, lines
+
+
+def board_features(rows, width, height, lines, t_spins):
+    """Heights, holes and bumpiness of a board given as row masks"""
+    heights = [0] * width
+    covered = 0
+    holes = 0
+    for y, row in enumerate(rows):
+        holes += bin(covered & ~row).count("1")
+        new = row & ~covered
+        while new:
+            low = new & -new
+            heights[low.bit_length() - 1] = height - y
+            new ^= low
+        covered |= row
+    bumpiness = sum(abs(heights[i] - heights[i + 1]) for i in range(width - 1))
+    return Features(sum(heights), max(heights), holes, bumpiness, lines, t_spins)
+
+
+class PlacementBot:
+    def __init__(self, heuristic=default_heuristic, depth=3, beam_width=6,
+                 time_budget=0.012, use_hold=True, tt_bytes=16 * 1024 * 1024,
+                 tt_policy="lru"):
+        self.heuristic = heuristic
+        self.depth = depth
+        self.beam_width = beam_width
+        self.time_budget = time_budget  # Seconds per plan; the search stops once spent
+        self.use_hold = use_hold
+        # Scored placements per (board, piece), shared by every plan() call:
+        # the positions one plan looks ahead to are the next plan's roots
+        self.table = TranspositionTable(tt_bytes, tt_policy, _entry_size)
+
+    def evaluate(self, rows, zhash, shape_idx, start, width, height, deadline=None):
+        """Placements of a piece with their resulting boards, cached per position"""
+        spawn = (width // 2 - PIECE_STATES[shape_idx][0].width // 2, 0, 0)
+        if start == spawn:
+            start = None  # A piece that has not moved yet: the entry looked ahead to
+        key = (position_key(zhash, shape_idx, None), start)
+        children = self.table.get(key)
+        if children is not None:
+            return children
+
+        keys = zobrist_keys(width, height)
+        x, y, rotation = start if start else spawn
+        children = []
+        for placement in find_placements(rows, width, height, shape_idx, x, y, rotation,
+                                         deadline):
+            if deadline is not None and time.perf_counter() > deadline:
+                raise SearchTimeout()  # Nothing is cached for a cut-off search
+            new_rows, cleared = place_and_clear(rows, width, shape_idx, placement)
+            if new_rows[0]:
+                continue  # Topped out
+            if cleared:
+                new_hash = zobrist_hash(keys, new_rows)
+            else:
+                # Only the piece's cells were added
+                new_hash = zhash
+                state = PIECE_STATES[shape_idx][placement.rotation]
+                for i, mask in enumerate(state.masks):
+                    new_hash ^= zobrist_row(keys[placement.y + i], mask << placement.x)
+            features = board_features(new_rows, width, height, cleared, 0)
+            # Plain tuples of ints only: the collector stops tracking those, so
+            # a full table does not slow down every garbage collection
+            children.append((placement.t_spin, placement.actions, tuple(new_rows), new_hash,
+                             cleared, tuple(features[:4])))
+        children = tuple(children)
+        self.table.put(key, children)
+        return children
+
+    def expand(self, node, shape_idx, start, width, height, held, qi, prefix, deadline=None):
+        """Children of a beam node for one piece choice"""
+        _, rows, zhash, _, _, first, lines, t_spins = node
+        children = []
+        for t_spin, placement_actions, new_rows, new_hash, cleared, shape in self.evaluate(
+                rows, zhash, shape_idx, start, width, height, deadline):
+            total_lines = lines + cleared
+            total_spins = t_spins + (t_spin and cleared > 0)
+            features = Features(*shape, total_lines, total_spins)
+            actions = first if first is not None else prefix + list(placement_actions)
+            children.append((self.heuristic(features), new_rows, new_hash, held, qi,
+                             actions, total_lines, total_spins))
+        return children
+
+    def select(self, children, preview):
+        """Best beam_width children, one per distinct position"""
+        children.sort(key=lambda n: n[0], reverse=True)
+        beam = []
+        seen = set()
+        for node in children:
+            _, _, zhash, held, qi, _, _, _ = node
+            # The same board, piece to play and hold reached along two paths
+            # is the same position; only its best path is kept
+            active = preview[qi] if qi < len(preview) else None
+            key = (zhash if active is None else position_key(zhash, active, held), held, qi)
+            if key in seen:
+                continue
+            seen.add(key)
+            beam.append(node)
+            if len(beam) == self.beam_width:
+                break
+        return beam
+
+    def plan(self, engine):
+        """Actions for the current piece (possibly starting with HOLD)"""
+        deadline = time.perf_counter() + self.time_budget
+        if gc.isenabled():
+            # The collector stops tracking table entries (tuples of ints) only
+            # once it has looked at them, and left alone it looks at tens of
+            # thousands at once: a 30-40 ms pause at a random frame.  Collecting
+            # the young generations here, inside the budget, costs well under
+            # a millisecond per plan
+            gc.collect(1)
+        width, height = engine.width, engine.height
+        piece = engine.current_piece
+        preview = [p.shape_idx for p in engine.next_pieces]
+        held = engine.held_piece.shape_idx if engine.held_piece else None
+        root = (0.0, list(engine.board.rows), engine.board.zobrist, held, 0, None, 0, 0)
+
+        # Depth 0: play the current piece where it is, or hold.  The current
+        # piece's own placements are the one search a plan cannot do without
+        # (usually a table hit: the last plan looked ahead to it), so only
+        # it runs without the deadline
+        beam = self.expand(root, piece.shape_idx, (piece.x, piece.y, piece.rotation),
+                           width, height, held, 0, [])
+        if self.use_hold and engine.can_hold:
+            try:
+                if held is None:
+                    if preview:
+                        beam += self.expand(root, preview[0], None, width, height,
+                                            piece.shape_idx, 1, [HOLD], deadline)
+                else:
+                    beam += self.expand(root, held, None, width, height,
+                                        piece.shape_idx, 0, [HOLD], deadline)
+            except SearchTimeout:
+                pass  # Out of time: no hold this piece
+        if not beam:
+            return [HARD_DROP]
+        beam = self.select(beam, preview)
+
+        # Deeper levels over the preview queue; a level cut off by the
+        # deadline is thrown away and the previous beam is used
+        for _ in range(1, self.depth):
+            children = []
+            try:
+                for node in beam:
+                    _, _, _, held, qi, _, _, _ = node
+                    if qi >= len(preview):
+                        continue
+                    children += self.expand(node, preview[qi], None, width, height,
+                                            held, qi + 1, None, deadline)
+                    if self.use_hold:
+                        if held is None:
+                            if qi + 1 < len(preview):
+                                children += self.expand(node, preview[qi + 1], None, width,
+                                                        height, preview[qi], qi + 2, None,
+                                                        deadline)
+                        elif held != preview[qi]:
+                            children += self.expand(node, held, None, width, height,
+                                                    preview[qi], qi + 1, None, deadline)
+            except SearchTimeout:
+                break
+            if not children:
+                break
+            beam = self.select(children, preview)
+
+        return beam[0][5]
+
+
+def _entry_size(children):
+    """Rough bytes held by one table entry (placements, boards, features)"""
+    if not children:
+        return 64
+    rows = len(children[0][2])
+    return 64 + len(children) * (400 + 8 * rows + 8 * len(children[0][1]))
@@ -0,0 +1,204 @@
+"""Vectorized batch environment running many boards at once with NumPy.
+
+``BatchTetrisEnv`` keeps N boards in a single ``(N, height, width)``
+array and applies one placement per board per ``step``.  Locking, line
+clearing, scoring (same table, combo and back-to-back rules as
+engine.TetrisEngine), the 7-bag and hold are all done with array
+operations across the whole batch; finished games are reset in place.
+
+An action picks a final placement that is hard dropped from above::
+
+    action = hold * 4 * width + rotation * width + x
+
+Placements never tuck under overhangs, so T-spins cannot occur here.
+"""
+import numpy as np
+
+from pieces import PIECE_STATES, SHAPES
+
+NUM_SHAPES = len(SHAPES)
+PREVIEW = 5
+
+LINE_SCORES = np.array([0, 100, 300, 500, 800], dtype=np.int64)
+
+# Lookup tables shaped (shape_idx, rotation, ...) built from pieces.PIECE_STATES
+CELL_DX = np.array([[[x for x, _ in state.cells] for state in states]
+                    for states in PIECE_STATES], dtype=np.int64)
+CELL_DY = np.array([[[y for _, y in state.cells] for state in states]
+                    for states in PIECE_STATES], dtype=np.int64)
+PIECE_WIDTH = np.array([[state.width for state in states]
+                        for states in PIECE_STATES], dtype=np.int64)
+
+# Lowest cell of every bounding-box column; columns the piece does not use
+# get a large negative value so they never limit the landing row
+_NO_COLUMN = -(1 << 20)
+BOTTOM_PROFILE = np.full((NUM_SHAPES, 4, 4), _NO_COLUMN, dtype=np.int64)
+for _shape_idx, _states in enumerate(PIECE_STATES):
+    for _rotation, _state in enumerate(_states):
+        BOTTOM_PROFILE[_shape_idx, _rotation, :_state.width] = _state.bottoms
+
+
+class BatchTetrisEnv:
+    def __init__(self, num_envs, width=10, height=20, seed=None):
+        self.num_envs = num_envs
+        self.width = width
+        self.height = height
+        self.num_actions = 2 * 4 * width
+        self.rng = np.random.default_rng(seed)
+
+        n = num_envs
+        self.boards = np.zeros((n, height, width), dtype=np.uint8)
+        self.queue = np.zeros((n, 2 * NUM_SHAPES), dtype=np.int64)
+        self.queue_pos = np.zeros(n, dtype=np.int64)
+        self.current = np.zeros(n, dtype=np.int64)
+        self.held = np.full(n, -1, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.lines_cleared = np.zeros(n, dtype=np.int64)
+        self.combo = np.full(n, -1, dtype=np.int64)
+        self.b2b = np.zeros(n, dtype=bool)
+        self.piece_count = np.zeros(n, dtype=np.int64)
+
+        self._env_idx = np.arange(n)
+        self._columns = np.arange(4)
+        self._row_idx = np.arange(height)
+
+    def _new_bags(self, count):
+        """Return count independently shuffled 7-bags"""
+        return np.argsort(self.rng.random((count, NUM_SHAPES)), axis=1)
+
+    def _pop_pieces(self, idx):
+        """Take the next piece from the bag queue of the given environments"""
+        pieces = self.queue[idx, self.queue_pos[idx]]
+        self.queue_pos[idx] += 1
+
+        # Shift in a fresh bag once the first one is used up
+        refill = idx[self.queue_pos[idx] >= NUM_SHAPES]
+        if len(refill):
+            self.queue[refill, :NUM_SHAPES] = self.queue[refill, NUM_SHAPES:]
+            self.queue[refill, NUM_SHAPES:] = self._new_bags(len(refill))
+            self.queue_pos[refill] -= NUM_SHAPES
+        return pieces
+
+    def _reset_envs(self, idx):
+        """Start a new game in the given environments"""
+        if not len(idx):
+            return
+        self.boards[idx] = 0
+        self.queue[idx, :NUM_SHAPES] = self._new_bags(len(idx))
+        self.queue[idx, NUM_SHAPES:] = self._new_bags(len(idx))
+        self.queue_pos[idx] = 0
+        self.held[idx] = -1
+        self.score[idx] = 0
+        self.level[idx] = 1
+        self.lines_cleared[idx] = 0
+        self.combo[idx] = -1
+        self.b2b[idx] = False
+        self.piece_count[idx] = 0
+        self.current[idx] = self._pop_pieces(idx)
+
+    def reset(self):
+        """Reset every environment and return the batch observation"""
+        self._reset_envs(self._env_idx)
+        return self.observe()
+
+    def observe(self):
+        """Boards, current/held pieces and previews for the whole batch"""
+        preview = self.queue_pos[:, None] + np.arange(PREVIEW)
+        return {
+            "board": self.boards,
+            "current": self.current,
+            "held": self.held,
+            "next": np.take_along_axis(self.queue, preview, axis=1),
+        }
+
+    def action_mask(self):
+        """Boolean (N, num_actions) mask of placements that fit the walls"""
+        x = np.arange(self.width)
+        with_hold = np.where(self.held >= 0, self.held, self.queue[
+            self._env_idx, self.queue_pos])
+        masks = []
+        for pieces in (self.current, with_hold):
+            widths = PIECE_WIDTH[pieces]  # (N, 4)
+            fits = x[None, None, :] <= (self.width - widths)[:, :, None]
+            masks.append(fits.reshape(self.num_envs, -1))
+        return np.concatenate(masks, axis=1)
+
+    def step(self, actions):
+        """Apply one placement per environment.
+
+        Returns (observation, rewards, dones, info); environments whose game
+        ended are reset before returning and their final score is in
+        info["final_score"].
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        width, height = self.width, self.height
+        env_idx = self._env_idx
+        per_hold = 4 * width
+
+        # Hold: swap with the held piece, or stash it and take the next one
+        hold = actions >= per_hold
+        if hold.any():
+            swap = env_idx[hold & (self.held >= 0)]
+            stash = env_idx[hold & (self.held < 0)]
+            held = self.held[swap]
+            self.held[swap] = self.current[swap]
+            self.current[swap] = held
+            self.held[stash] = self.current[stash]
+            self.current[stash] = self._pop_pieces(stash)
+
+        placement = actions % per_hold
+        rotation = placement // width
+        shape = self.current
+        x = np.clip(placement % width, 0, width - PIECE_WIDTH[shape, rotation])
+
+        # Landing row from the column tops and the piece's bottom profile
+        filled = self.boards != 0
+        tops = np.where(filled.any(axis=1), filled.argmax(axis=1), height)
+        columns = np.minimum(x[:, None] + self._columns, width - 1)
+        column_tops = np.take_along_axis(tops, columns, axis=1)
+        y = (column_tops - BOTTOM_PROFILE[shape, rotation] - 1).min(axis=1)
+
+        # Lock the piece; cells above the top of the board are dropped
+        rows = y[:, None] + CELL_DY[shape, rotation]
+        cols = x[:, None] + CELL_DX[shape, rotation]
+        visible = rows >= 0
+        cell_env = np.broadcast_to(env_idx[:, None], rows.shape)
+        colors = np.broadcast_to((shape + 1)[:, None], rows.shape)
+        self.boards[cell_env[visible], rows[visible], cols[visible]] = colors[visible]
+
+        # Line clears: move full rows to the top (stable) and empty them
+        full = (self.boards != 0).all(axis=2)
+        lines = full.sum(axis=1)
+        cleared = env_idx[lines > 0]
+        if len(cleared):
+            order = np.argsort(~full[cleared], axis=1, kind="stable")
+            boards = np.take_along_axis(self.boards[cleared], order[:, :, None], axis=1)
+            boards[self._row_idx[None, :] < lines[cleared][:, None]] = 0
+            self.boards[cleared] = boards
+
+        # Scoring, mirroring TetrisEngine.clear_lines
+        has_lines = lines > 0
+        reward = LINE_SCORES[np.minimum(lines, 4)] * self.level
+        tetris = lines >= 4
+        reward = np.where(tetris & self.b2b, reward * 3 // 2, reward)
+        self.b2b = np.where(has_lines, tetris, self.b2b)
+        reward += np.where(has_lines & (self.combo >= 0),
+                           50 * self.combo * self.level, 0)
+        self.combo = np.where(has_lines, self.combo + 1, -1)
+        self.score += reward
+        self.lines_cleared += lines
+        self.level = self.lines_cleared // 10 + 1
+        self.piece_count += 1
+
+        # Game over when anything is left in the top row
+        dones = (self.boards[:, 0, :] != 0).any(axis=1)
+        alive = env_idx[~dones]
+        self.current[alive] = self._pop_pieces(alive)
+
+        info = {
+            "lines": lines,
+            "final_score": np.where(dones, self.score, 0),
+        }
+        self._reset_envs(env_idx[dones])
+        return self.observe(), reward, dones, info
@@ -0,0 +1,294 @@
+"""Micro-benchmarks for the engine hot paths.
+
+Every benchmark runs against fixed, seeded board fixtures (empty, 25%,
+50% and 75% filled) so two runs on the same machine measure the same
+work.  Per-call state that an operation consumes (a piece that was
+rotated, a board a piece was locked into) is prepared before the timer
+starts, so only the operation itself is timed.  The draw benchmarks
+render a PLAYING frame of TetrisGame on SDL's dummy video driver.  The
+startup benchmarks time fresh interpreters importing the modules batch
+tools use and opening the game window, to catch import-time regressions.
+
+Results are written as JSON; ``--compare`` checks them against an
+earlier file and exits non-zero when any benchmark got slower than the
+threshold allows.
+
+Usage: python bench.py [-o results.json] [--compare base.json]
+                       [--threshold 0.10] [--filter NAME]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from board import Board
+from engine import BagRandom, TetrisEngine
+from pieces import I_PIECE, O_PIECE, PIECE_STATES, T_PIECE, Tetrimino
+from telemetry import Telemetry, TelemetryWriter
+
+DENSITIES = (0, 25, 50, 75)
+WELL = 0  # Column left open in every fixture row so an I piece can clear lines
+TARGET_TIME = 0.05  # Seconds of work per repeat when calibrating the call count
+
+# Startup benchmarks: name -> code run in a fresh interpreter
+STARTUP = {
+    "startup_python": "pass",
+    "startup_engine": "import engine",
+    "startup_main": "import main",
+    "startup_window": "import main; main.TetrisGame(sound=False)",
+}
+
+
+def make_board(density, seed=1, clear_rows=0, width=10, height=20):
+    """Seeded fixture: the lowest density% of rows filled at random.
+
+    Every filled row keeps the WELL column empty; the lowest clear_rows
+    rows are otherwise full, so a vertical I piece in the well clears them.
+    """
+    board = Board(width, height)
+    rng = BagRandom(seed)
+    filled = max(height * density // 100, clear_rows)
+    full = board.full_row & ~(1 << WELL)
+    for y in range(height - filled, height):
+        if y >= height - clear_rows:
+            mask = full
+        else:
+            mask = rng.next() & full
+            # At least one more hole so the row never completes
+            mask &= ~(1 << (1 + rng.next() % (width - 1)))
+        board.place((mask,), 0, y, 1 + rng.next() % 7)
+    return board
+
+
+def copy_board(board):
+    copy = Board(board.width, board.height)
+    copy.rows = list(board.rows)
+    copy.colors = [bytearray(row) for row in board.colors]
+    copy.heights = list(board.heights)
+    return copy
+
+
+def resting_piece(board, shape_idx, x, rotation=0):
+    """A piece dropped onto the stack at column x"""
+    piece = Tetrimino(shape_idx, x)
+    piece.rotation = rotation
+    piece.state = PIECE_STATES[shape_idx][rotation]
+    piece.y = board.drop_y(piece.state, x, 0)
+    return piece
+
+
+def clone_piece(piece):
+    clone = Tetrimino(piece.shape_idx, piece.x, piece.y)
+    clone.rotation = piece.rotation
+    clone.state = piece.state
+    return clone
+
+
+# Each benchmark is (name, prepare) where prepare(n) returns (op, items);
+# op(item) is the timed call and items holds n prepared arguments
+
+def bench_collision(density):
+    board = make_board(density)
+    piece = resting_piece(board, T_PIECE, 4)
+    def prepare(n):
+        return (lambda p: p.collision(board)), [piece] * n
+    return f"collision[d{density}]", prepare
+
+
+def bench_rotate(density):
+    board = make_board(density)
+    piece = resting_piece(board, T_PIECE, 4)
+    def prepare(n):
+        # Resting on the stack, so the kick table is exercised
+        return (lambda p: p.rotate(board)), [clone_piece(piece) for _ in range(n)]
+    return f"rotate[d{density}]", prepare
+
+
+def bench_move(density):
+    board = make_board(density)
+    piece = resting_piece(board, T_PIECE, 4)
+    piece.y = max(piece.y - 2, 0)
+    def prepare(n):
+        moves = [(1, 0), (-1, 0)] * (n // 2 + 1)
+        return (lambda d: piece.move(d[0], d[1], board)), moves[:n]
+    return f"move[d{density}]", prepare
+
+
+def bench_hard_drop(density):
+    board = make_board(density)
+    piece = Tetrimino(T_PIECE, 4)
+    def prepare(n):
+        return (lambda p: p.hard_drop(board)), [clone_piece(piece) for _ in range(n)]
+    return f"hard_drop[d{density}]", prepare
+
+
+def bench_ghost(density, cached):
+    engine = TetrisEngine(seed=1)
+    engine.board = make_board(density)
+    engine.current_piece = Tetrimino(T_PIECE, 4)
+    def ghost(_):
+        if not cached:
+            engine.ghost_key = None
+        return engine.get_ghost_position()
+    def prepare(n):
+        return ghost, [None] * n
+    return f"ghost{'_cached' if cached else ''}[d{density}]", prepare
+
+
+def bench_lock(density, lines, telemetry=False):
+    engine = TetrisEngine(seed=1)
+    if telemetry:
+        # Full collection, records written to the null device by the writer thread
+        Telemetry(TelemetryWriter(os.devnull)).start(engine)
+    board = make_board(density, clear_rows=lines)
+    if lines:
+        piece = resting_piece(board, I_PIECE, WELL, rotation=1)
+    else:
+        piece = resting_piece(board, O_PIECE, 4)
+    def lock(item):
+        engine.board, engine.current_piece = item
+        engine.lock_piece()
+    def prepare(n):
+        return lock, [(copy_board(board), clone_piece(piece)) for _ in range(n)]
+    name = f"lock_clear{lines}" if lines else "lock"
+    if telemetry:
+        name += "_telemetry"
+    return f"{name}[d{density}]", prepare
+
+
+def bench_draw(dirty):
+    game = None
+    def setup():
+        # The game window needs a display; the dummy driver renders off-screen
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        import main
+
+        game = main.TetrisGame(dirty_rendering=dirty, sound=False)
+        game.engine.reset(seed=1)
+        game.engine.board = make_board(50)
+        game.game_state = main.PLAYING
+        game.draw()
+        return game
+    def draw(d):
+        # Move the piece so the dirty renderer has something to redraw
+        game.engine.current_piece.x += d
+        game.draw()
+    def prepare(n):
+        nonlocal game
+        if game is None:
+            game = setup()
+        return draw, [1, -1] * (n // 2) + [1] * (n % 2)
+    return f"draw_{'dirty' if dirty else 'full'}[d50]", prepare
+
+
+def all_benchmarks():
+    for density in DENSITIES:
+        yield bench_collision(density)
+        yield bench_rotate(density)
+        yield bench_move(density)
+        yield bench_hard_drop(density)
+        yield bench_ghost(density, cached=False)
+        yield bench_ghost(density, cached=True)
+        yield bench_lock(density, 0)
+        yield bench_lock(density, 4)
+        yield bench_lock(density, 0, telemetry=True)
+    yield bench_draw(dirty=False)
+    yield bench_draw(dirty=True)
+
+
+def measure_startup(code, repeat):
+    """Wall time in ns of a fresh interpreter running code, over repeat runs"""
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1e9)
+    samples.sort()
+    return {"ns": samples[len(samples) // 2], "min_ns": samples[0],
+            "number": 1, "repeat": repeat}
+
+
+def measure(prepare, repeat):
+    """Per-call times in ns over repeat runs, with the call count calibrated first"""
+    def run(n):
+        op, items = prepare(n)
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for item in items:
+                op(item)
+            return time.perf_counter() - start
+        finally:
+            gc.enable()
+
+    probe = 20
+    elapsed = run(probe)
+    number = max(probe, min(int(TARGET_TIME / max(elapsed / probe, 1e-9)), 200000))
+    samples = sorted(run(number) / number * 1e9 for _ in range(repeat))
+    return {"ns": samples[len(samples) // 2], "min_ns": samples[0],
+            "number": number, "repeat": repeat}
+
+
+def compare(base, results, threshold):
+    """Print the change against base; return the names that regressed"""
+    regressed = []
+    print(f"{'benchmark':<22} {'base ns':>10} {'new ns':>10} {'change':>8}")
+    for name, result in results.items():
+        if name not in base:
+            continue
+        old = base[name]["ns"]
+        change = result["ns"] / old - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        print(f"{name:<22} {old:>10.0f} {result['ns']:>10.0f} {change:>+8.1%}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Engine hot-path micro-benchmarks")
+    parser.add_argument("-o", "--output", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown before a benchmark counts as a regression")
+    parser.add_argument("--repeat", type=int, default=7, help="timed runs per benchmark")
+    parser.add_argument("--filter", metavar="NAME", help="only run benchmarks containing NAME")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, prepare in all_benchmarks():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(prepare, args.repeat)
+        print(f"{name:<22} {results[name]['ns']:>10.0f} ns")
+    for name, code in STARTUP.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure_startup(code, args.repeat)
+        print(f"{name:<22} {results[name]['ns']:>10.0f} ns")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)["results"]
+        print()
+        if compare(base, results, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""Bitboard playfield for Advanced Tetris.
+
+Every row of the field is a single integer where bit ``x`` is set when
+column ``x`` is occupied.  Colors live in a separate plane of bytearrays
+(0 = empty, otherwise a shape index + 1) so the hot paths (collision,
+line detection, line removal) only ever touch plain integers.
+
+The board also keeps a Zobrist hash of its occupied cells (XOR of one
+random 64-bit key per filled cell), updated as pieces are placed and rows
+removed, so searches and caches can key positions without rehashing.
+
+Setting ``journal`` to a list makes the board log the row shifts it makes
+(line clears and garbage) so a copy elsewhere can replay them instead of
+receiving every shifted row (see versus.py).
+"""
+import random
+import sys
+import zlib
+from array import array
+
+# Zobrist keys per board size: ZOBRIST_KEYS[(width, height)][y][x]
+ZOBRIST_KEYS = {}
+
+
+def row_masks(shape):
+    """Convert a shape matrix into one bitmask per shape row"""
+    masks = []
+    for row in shape:
+        mask = 0
+        for x, cell in enumerate(row):
+            if cell:
+                mask |= 1 << x
+        masks.append(mask)
+    return tuple(masks)
+
+
+def zobrist_keys(width, height):
+    """Per-cell Zobrist keys for a board size (the same in every run)"""
+    keys = ZOBRIST_KEYS.get((width, height))
+    if keys is None:
+        rng = random.Random(width * 100003 + height)
+        keys = [[rng.getrandbits(64) for _ in range(width)] for _ in range(height)]
+        ZOBRIST_KEYS[(width, height)] = keys
+    return keys
+
+
+def zobrist_row(row_keys, mask):
+    """XOR of the keys of the filled cells of one row"""
+    h = 0
+    while mask:
+        low = mask & -mask
+        h ^= row_keys[low.bit_length() - 1]
+        mask ^= low
+    return h
+
+
+def zobrist_hash(keys, rows):
+    """Zobrist hash of a whole board given as row masks"""
+    h = 0
+    for y, row in enumerate(rows):
+        if row:
+            h ^= zobrist_row(keys[y], row)
+    return h
+
+
+class Board:
+    def __init__(self, width=10, height=20):
+        self.width = width
+        self.height = height
+        self.full_row = (1 << width) - 1
+        self.zobrist_keys = zobrist_keys(width, height)
+        self.journal = None  # List receiving ("clear", lines) / ("garbage", ...) entries
+        self.reset()
+
+    def reset(self):
+        """Empty the playfield"""
+        self.rows = [0] * self.height
+        self.colors = [bytearray(self.width) for _ in range(self.height)]
+        # Skyline: filled height of every column (0 = empty), kept up to date
+        # by place() and remove_rows()
+        self.heights = [0] * self.width
+        # Bumped on every change so renderers and caches can skip unchanged boards
+        self.version = 0
+        self.zobrist = 0
+
+    def collides(self, masks, x, y, piece_width):
+        """Check if a piece given as row masks overlaps walls, floor or blocks"""
+        if x < 0 or x + piece_width > self.width or y + len(masks) > self.height:
+            return True
+
+        rows = self.rows
+        for i, mask in enumerate(masks):
+            board_y = y + i
+            if board_y >= 0 and rows[board_y] & (mask << x):
+                return True
+        return False
+
+    def filled(self, x, y):
+        """Check a single cell; walls and floor count as filled, the sky does not"""
+        if x < 0 or x >= self.width or y >= self.height:
+            return True
+        return y >= 0 and (self.rows[y] >> x) & 1 == 1
+
+    def cell(self, x, y):
+        """Return the color index stored at a cell (0 when empty)"""
+        return self.colors[y][x]
+
+    def place(self, masks, x, y, color):
+        """Write a piece into the field; cells above the top are dropped"""
+        self.version += 1
+        for i, mask in enumerate(masks):
+            board_y = y + i
+            if not 0 <= board_y < self.height:
+                continue
+            # Only newly filled cells change the hash (a piece spawned into
+            # the stack at game over can overlap it)
+            new = (mask << x) & ~self.rows[board_y]
+            self.rows[board_y] |= new
+            self.zobrist ^= zobrist_row(self.zobrist_keys[board_y], new)
+            colors = self.colors[board_y]
+            heights = self.heights
+            cell_height = self.height - board_y
+            col = x
+            while mask:
+                if mask & 1:
+                    colors[col] = color
+                    if heights[col] < cell_height:
+                        heights[col] = cell_height
+                mask >>= 1
+                col += 1
+
+    def set_row(self, y, colors):
+        """Overwrite row y from a row of color indices; call update_heights() after"""
+        mask = 0
+        for x, color in enumerate(colors):
+            if color:
+                mask |= 1 << x
+        keys = self.zobrist_keys[y]
+        self.zobrist ^= zobrist_row(keys, self.rows[y]) ^ zobrist_row(keys, mask)
+        self.rows[y] = mask
+        self.colors[y][:] = colors
+        self.version += 1
+
+    def insert_garbage(self, count, hole, color):
+        """Push the stack up and fill the bottom count rows, leaving column hole open.
+
+        Returns True when filled cells were pushed off the top.
+        """
+        count = min(count, self.height)
+        if self.journal is not None:
+            self.journal.append(("garbage", count, hole, color))
+        self.version += 1
+        overflow = any(self.rows[:count])
+        mask = self.full_row & ~(1 << hole)
+        row_colors = bytearray([color]) * self.width
+        row_colors[hole] = 0
+        self.rows = self.rows[count:] + [mask] * count
+        self.colors = self.colors[count:] + [bytearray(row_colors) for _ in range(count)]
+        self.zobrist = zobrist_hash(self.zobrist_keys, self.rows)
+        if overflow:
+            self.update_heights()
+        else:
+            heights = self.heights
+            for x in range(self.width):
+                if heights[x]:
+                    heights[x] += count
+                elif x != hole:
+                    heights[x] = count
+        return overflow
+
+    def row_typecode(self):
+        """array typecode whose items are wide enough for one row mask"""
+        for code in ("B", "H", "I", "Q"):
+            if self.width <= array(code).itemsize * 8:
+                return code
+        raise ValueError(f"rows of width {self.width} do not fit in 64 bits")
+
+    def pack_rows(self):
+        """Row masks as little-endian bytes, one fixed-size item per row"""
+        rows = array(self.row_typecode(), self.rows)
+        if sys.byteorder == "big":
+            rows.byteswap()
+        return rows.tobytes()
+
+    def unpack_rows(self, data):
+        """Inverse of pack_rows; the caller keeps colors and heights in step"""
+        rows = array(self.row_typecode())
+        rows.frombytes(data)
+        if sys.byteorder == "big":
+            rows.byteswap()
+        self.rows = rows.tolist()
+        self.version += 1
+        self.zobrist = zobrist_hash(self.zobrist_keys, self.rows)
+
+    def hash(self):
+        """64-bit hash of the occupied cells, stable across runs"""
+        return self.zobrist
+
+    def digest(self):
+        """Stable 32-bit hash of the cells and their colors"""
+        return zlib.crc32(b"".join(self.colors))
+
+    def full_rows(self, start=0, stop=None):
+        """Return the indices of completed rows in [start, stop), top to bottom"""
+        full = self.full_row
+        rows = self.rows
+        start = max(start, 0)
+        stop = self.height if stop is None else min(stop, self.height)
+        return [y for y in range(start, stop) if rows[y] == full]
+
+    def remove_rows(self, lines):
+        """Splice out the given rows (ascending) and add empty rows at the top"""
+        if not lines:
+            return
+        if self.journal is not None:
+            self.journal.append(("clear", tuple(lines)))
+        self.version += 1
+        # Rows below the lowest cleared row keep their place; the hash of
+        # everything above it is swapped for the shifted rows
+        keys = self.zobrist_keys
+        last = lines[-1]
+        h = self.zobrist
+        for y in range(last + 1):
+            if self.rows[y]:
+                h ^= zobrist_row(keys[y], self.rows[y])
+        for y in lines:
+            del self.rows[y]
+            self.rows.insert(0, 0)
+            del self.colors[y]
+            self.colors.insert(0, bytearray(self.width))
+        for y in range(last + 1):
+            if self.rows[y]:
+                h ^= zobrist_row(keys[y], self.rows[y])
+        self.zobrist = h
+
+        # A full row spans every column, so each column simply loses one cell
+        # per cleared row.  Columns whose top cell was in the highest cleared
+        # row are rescanned, starting there: nothing above it was in them
+        heights = self.heights
+        top_line = self.height - lines[0]
+        cleared = len(lines)
+        for x in range(self.width):
+            if heights[x] > top_line:
+                heights[x] -= cleared
+            else:
+                heights[x] = self.column_height(x, lines[0])
+
+    def column_height(self, x, start=0):
+        """Filled height of column x, scanning down from row start"""
+        bit = 1 << x
+        rows = self.rows
+        for y in range(start, self.height):
+            if rows[y] & bit:
+                return self.height - y
+        return 0
+
+    def update_heights(self):
+        """Rebuild the skyline from the row masks, top to bottom"""
+        heights = [0] * self.width
+        seen = 0
+        for y, row in enumerate(self.rows):
+            new = row & ~seen
+            if not new:
+                continue
+            seen |= row
+            while new:
+                low = new & -new
+                heights[low.bit_length() - 1] = self.height - y
+                new ^= low
+            if seen == self.full_row:
+                break
+        self.heights = heights
+
+    def drop_y(self, state, x, y):
+        """Row where a piece state at (x, y) comes to rest when dropped"""
+        # Above the skyline the landing row follows from the column heights
+        # and the piece's bottom profile; under an overhang step down instead
+        heights = self.heights
+        land = self.height
+        for col, bottom in enumerate(state.bottoms):
+            top = self.height - heights[x + col]
+            if y + bottom >= top:
+                break
+            if top - bottom - 1 < land:
+                land = top - bottom - 1
+        else:
+            return land
+
+        while not self.collides(state.masks, x, y + 1, state.width):
+            y += 1
+        return y
@@ -0,0 +1,232 @@
+"""Asynchronous frame capture for recording games.
+
+``FrameCapture`` copies the screen into a preallocated ring of surfaces
+after every drawn frame; that blit is the only work on the game loop.  A
+worker thread hands each filled surface to a sink as a zero-copy view of
+its pixels and returns it to the ring.  When the worker falls behind and
+the ring is full, the frame is dropped and counted instead of stalling
+the loop.
+
+pygame.image.save holds the GIL while it encodes, so PNGs are not
+encoded in this process.  Sinks only write raw pixels, which releases
+the GIL:
+- ``png:DIR`` pipes frames to ``python capture.py png ...``, which
+  writes DIR/frame_000000.png, ...
+- ``raw:DIR`` writes DIR/frame_000000.raw, ... (screen pixel format,
+  as printed)
+- ``pipe:COMMAND`` pipes frames to an encoder's stdin. ``{width}``,
+  ``{height}``, ``{fps}`` and ``{pix_fmt}`` (an ffmpeg pixel format)
+  are filled in, e.g.
+  ``pipe:ffmpeg -f rawvideo -pix_fmt {pix_fmt} -s {width}x{height} -r {fps} -i - out.mkv``
+
+Usage (encoder side): python capture.py png DIR WIDTH HEIGHT BPP R G B
+"""
+import os
+import queue
+import shlex
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+RING_SLOTS = 8  # Frames the worker may lag behind before frames are dropped
+
+# ffmpeg pixel formats by (bytes per pixel, byte offset of R, G, B)
+FFMPEG_FORMATS = {
+    (4, 2, 1, 0): "bgr0",
+    (4, 0, 1, 2): "rgb0",
+    (4, 1, 2, 3): "0rgb",
+    (4, 3, 2, 1): "0bgr",
+    (3, 2, 1, 0): "bgr24",
+    (3, 0, 1, 2): "rgb24",
+}
+
+
+def pixel_layout(surface):
+    """(bytes per pixel, byte offsets of R, G, B) of a surface's pixels"""
+    shifts = surface.get_shifts()
+    return (surface.get_bytesize(),) + tuple(shift // 8 for shift in shifts[:3])
+
+
+def frame_view(surface):
+    """The surface's pixels as a buffer; zero-copy unless rows are padded"""
+    try:
+        return surface.get_view("0")
+    except ValueError:
+        return surface.get_buffer().raw
+
+
+class RawSequence:
+    """Sink writing one raw pixel file per frame"""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def write(self, index, pixels):
+        with open(os.path.join(self.directory, f"frame_{index:06d}.raw"), "wb") as f:
+            f.write(pixels)
+
+    def close(self):
+        pass
+
+
+class PipeSink:
+    """Sink streaming frames into a local encoder process"""
+
+    def __init__(self, args):
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE)
+
+    def write(self, index, pixels):
+        self.process.stdin.write(pixels)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class FrameCapture:
+    def __init__(self, screen, sink, slots=RING_SLOTS):
+        import pygame
+
+        self.sink = sink
+        # Same size and pixel format as the screen, so capturing is a plain copy
+        self.ring = [pygame.Surface(screen.get_size(), 0, screen) for _ in range(slots)]
+        self.free = queue.SimpleQueue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.ready = queue.SimpleQueue()
+        self.frames = 0  # Frames offered to capture()
+        self.dropped = 0
+        self.written = 0
+        self.capture_time = 0.0  # Game loop time spent in capture()
+        self.max_capture_time = 0.0
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="frame-capture", daemon=True)
+        self.thread.start()
+
+    def capture(self, screen):
+        """Queue a copy of screen for the worker; False if the frame was dropped"""
+        start = time.perf_counter()
+        index = self.frames
+        self.frames += 1
+        if self.error is not None:
+            self.dropped += 1  # Sink failed; keep the game running
+            return False
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1  # Worker is behind
+            return False
+        self.ring[slot].blit(screen, (0, 0))
+        self.ready.put((slot, index))
+        elapsed = time.perf_counter() - start
+        self.capture_time += elapsed
+        self.max_capture_time = max(self.max_capture_time, elapsed)
+        return True
+
+    def run(self):
+        while True:
+            item = self.ready.get()
+            if item is None:
+                break
+            slot, index = item
+            if self.error is None:
+                pixels = frame_view(self.ring[slot])
+                try:
+                    self.sink.write(index, pixels)
+                    self.written += 1
+                except OSError as e:
+                    self.error = e
+                finally:
+                    del pixels  # Unlocks the surface for the next capture
+            self.free.put(slot)
+        try:
+            self.sink.close()
+        except OSError as e:
+            self.error = self.error or e
+
+    def close(self):
+        """Finish writing the queued frames and stop the worker"""
+        self.ready.put(None)
+        self.thread.join()
+
+    def report(self):
+        """One-line summary of the recording"""
+        mean = self.capture_time / max(self.frames - self.dropped, 1)
+        line = (f"capture: {self.written} of {self.frames} frames written, {self.dropped} dropped, "
+                f"{mean * 1000:.2f} ms per frame on the game loop "
+                f"(max {self.max_capture_time * 1000:.2f})")
+        if self.error:
+            line += f"; sink failed: {self.error}"
+        return line
+
+
+def open_capture(spec, screen, fps=60):
+    """FrameCapture for a "png:DIR", "raw:DIR" or "pipe:COMMAND" spec"""
+    kind, _, target = spec.partition(":")
+    width, height = screen.get_size()
+    layout = pixel_layout(screen)
+    if kind == "png":
+        os.makedirs(target, exist_ok=True)
+        args = [sys.executable, os.path.abspath(__file__), "png", target, str(width), str(height)]
+        sink = PipeSink(args + [str(n) for n in layout])
+    elif kind == "raw":
+        sink = RawSequence(target)
+        print(f"capture: raw frames are {width}x{height}, {layout[0]} bytes per pixel, "
+              f"R/G/B at byte {layout[1]}/{layout[2]}/{layout[3]}")
+    elif kind == "pipe":
+        pix_fmt = FFMPEG_FORMATS.get(layout, "bgr0")
+        command = target.format(width=width, height=height, fps=fps, pix_fmt=pix_fmt)
+        sink = PipeSink(shlex.split(command))
+    else:
+        raise ValueError(f"unknown capture spec {spec!r} (png:DIR, raw:DIR or pipe:COMMAND)")
+    return FrameCapture(screen, sink)
+
+
+def encode_png(pixels, width, height, bpp, r, g, b):
+    """8-bit RGB PNG of raw pixels in the given layout"""
+    stride = width * 3
+    rgb = bytearray(stride * height)
+    rgb[0::3] = pixels[r::bpp]
+    rgb[1::3] = pixels[g::bpp]
+    rgb[2::3] = pixels[b::bpp]
+    # Filter type 0 (none) in front of every row
+    rows = bytearray((stride + 1) * height)
+    for y in range(height):
+        start = y * (stride + 1) + 1
+        rows[start:start + stride] = rgb[y * stride:(y + 1) * stride]
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data)))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 1))
+            + chunk(b"IEND", b""))
+
+
+def main(argv):
+    """PNG encoder process: raw frames on stdin to DIR/frame_NNNNNN.png"""
+    if len(argv) != 8 or argv[0] != "png":
+        print(__doc__)
+        return 2
+    directory = argv[1]
+    width, height, bpp, r, g, b = (int(n) for n in argv[2:])
+    size = width * height * bpp
+    stdin = sys.stdin.buffer
+    index = 0
+    while True:
+        pixels = stdin.read(size)
+        if len(pixels) < size:
+            return 0
+        with open(os.path.join(directory, f"frame_{index:06d}.png"), "wb") as f:
+            f.write(encode_png(pixels, width, height, bpp, r, g, b))
+        index += 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,130 @@
+"""Keyboard input layer: DAS, ARR, soft drop and input latency.
+
+``InputHandler`` turns key presses and releases into engine actions the
+way guideline games do.  A held left/right key moves once on the press,
+then after the delayed auto shift (DAS) repeats every ARR seconds
+(ARR 0 = straight to the wall).  A held soft drop moves down
+soft_drop_factor times faster than gravity (0 = straight to the floor).
+Rotate, hard drop and hold act once per press.
+
+Repeats are counted from the press timestamps, not from frames.  A frame
+therefore applies exactly the moves that fell due since the last one,
+at any frame rate.  Key state belongs to the handler rather than the
+piece, so a key held through a lock keeps its DAS charge for the next
+piece.  The handler knows nothing about pygame; main.py maps keys to
+actions and stamps each event with time.perf_counter() as it is
+polled, because pygame does not expose SDL's event timestamps.
+
+``LatencyMeter`` measures the time from a key event to the display flip
+of the first frame that shows its effect.
+"""
+from array import array
+
+from engine import HARD_DROP, HOLD, MOVE_LEFT, MOVE_RIGHT, ROTATE, SOFT_DROP
+
+DAS = 0.167  # Seconds a direction is held before it auto-repeats
+ARR = 0.033  # Seconds between auto-repeat moves
+SOFT_DROP_FACTOR = 20  # Soft drop speed as a multiple of gravity
+
+ONCE_ACTIONS = (ROTATE, HARD_DROP, HOLD)  # No auto-repeat
+
+
+class InputHandler:
+    def __init__(self, act, das=DAS, arr=ARR, soft_drop_factor=SOFT_DROP_FACTOR):
+        self.act = act  # act(action) applies an engine action, True if it did anything
+        self.das = das
+        self.arr = arr
+        self.soft_drop_factor = soft_drop_factor
+        self.reset()
+
+    def reset(self):
+        """Forget all held keys (e.g. when the game is paused)"""
+        # action -> [press time, repeats applied] for held left/right/soft drop
+        self.held = {}
+        self.direction = None  # Left or right, whichever was pressed last
+
+    def key_down(self, action, t):
+        """A key mapped to action went down at time t; True if the game changed"""
+        if action in ONCE_ACTIONS:
+            return self.act(action)
+        if action in self.held:
+            return False  # Key repeat from the OS; auto-repeat is ours
+        self.held[action] = [t, 0]
+        if action != SOFT_DROP:
+            self.direction = action
+        return self.act(action)
+
+    def key_up(self, action, t):
+        """A key mapped to action went up at time t"""
+        self.held.pop(action, None)
+        if action == self.direction:
+            # The other direction takes over if it is still held, charge kept:
+            # it moves on the next update, without the repeats it missed
+            other = MOVE_RIGHT if action == MOVE_LEFT else MOVE_LEFT
+            self.direction = None
+            if other in self.held:
+                self.direction = other
+                state = self.held[other]
+                state[1] = max(state[1], self.due(t - state[0] - self.das, self.arr) - 1)
+
+    def update(self, t, gravity):
+        """Apply the auto-repeat moves that fell due up to time t"""
+        if self.direction is not None:
+            state = self.held[self.direction]
+            self.repeat(self.direction, state, t - state[0] - self.das, self.arr)
+        state = self.held.get(SOFT_DROP)
+        if state is not None:
+            interval = gravity / self.soft_drop_factor if self.soft_drop_factor else 0
+            self.repeat(SOFT_DROP, state, t - state[0] - interval, interval)
+
+    def due(self, elapsed, interval):
+        """Repeats due elapsed seconds after the first delay ran out"""
+        if elapsed < 0:
+            return 0
+        return int(elapsed / interval) + 1 if interval > 0 else 1
+
+    def repeat(self, action, state, elapsed, interval):
+        """Apply the repeats of a held key due after elapsed seconds"""
+        if elapsed >= 0 and interval <= 0:
+            # Instant: as far as the piece goes
+            while self.act(action):
+                pass
+            return
+        due = self.due(elapsed, interval)
+        while state[1] < due:
+            state[1] += 1
+            self.act(action)
+
+
+class LatencyMeter:
+    """Key event to displayed frame latency samples"""
+
+    def __init__(self):
+        self.samples = array("d")
+        self.pending = None  # Time of the oldest key event not yet on screen
+
+    def input(self, t):
+        """A key event at time t changed the game"""
+        if self.pending is None:
+            self.pending = t
+
+    def presented(self, t):
+        """A frame was flipped to the display at time t"""
+        if self.pending is not None:
+            self.samples.append(t - self.pending)
+            self.pending = None
+
+    def percentiles(self, points=(50, 90, 99)):
+        """{point: seconds} over all samples (empty without samples)"""
+        samples = sorted(self.samples)
+        if not samples:
+            return {}
+        return {p: samples[min(len(samples) - 1, len(samples) * p // 100)] for p in points}
+
+    def report(self):
+        """One-line summary in milliseconds"""
+        result = self.percentiles((50, 90, 99, 100))
+        if not result:
+            return "input latency: no samples"
+        return (f"input latency over {len(self.samples)} key events: "
+                + " ".join(f"p{p}={t * 1000:.1f}ms" for p, t in result.items()))
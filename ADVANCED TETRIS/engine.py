@@ -0,0 +1,376 @@
+"""Headless Tetris rules engine.
+
+``TetrisEngine`` owns everything that decides the outcome of a game
+(grid, 7-bag, hold, score, combo, back-to-back and lock delay) and has no
+pygame dependency.  It only advances through explicit ``step(action)``
+and ``tick(dt)`` calls, so it can be driven by the pygame front end in
+main.py, by bots or by simulations on machines without a display.
+"""
+import random
+
+from board import Board
+from pieces import SHAPES, Tetrimino
+
+# Actions accepted by TetrisEngine.step
+MOVE_LEFT = 0
+MOVE_RIGHT = 1
+ROTATE = 2
+SOFT_DROP = 3
+HARD_DROP = 4
+HOLD = 5
+
+LINE_SCORES = {1: 100, 2: 300, 3: 500, 4: 800}
+
+# Versus mode: garbage lines sent per clear, by lines cleared, plus one for
+# back-to-back and the combo bonus indexed by combo count (capped)
+ATTACK_LINES = {1: 0, 2: 1, 3: 2, 4: 4}
+T_SPIN_ATTACK_LINES = {1: 2, 2: 4, 3: 6}
+COMBO_ATTACK_LINES = (0, 1, 1, 2, 2, 3, 3, 4, 4, 4, 5)
+GARBAGE_COLOR = len(SHAPES) + 1  # Board color index of garbage cells
+
+# Length of one logic frame; replays and fixed-step loops tick by this amount
+FRAME_DT = 1 / 60
+
+LOCK_DELAY = 0.5  # Seconds a grounded piece may still move before it locks
+
+MASK64 = (1 << 64) - 1
+
+# Zobrist keys for the falling and the held piece (index 7 = empty hold);
+# combined with Board.zobrist they identify a search position
+_keys = random.Random(0x7E7215)
+ACTIVE_KEYS = tuple(_keys.getrandbits(64) for _ in SHAPES)
+HOLD_KEYS = tuple(_keys.getrandbits(64) for _ in range(len(SHAPES) + 1))
+del _keys
+
+
+def position_key(board_hash, active, held):
+    """Zobrist key of a board hash plus the active and held shape (None = empty)"""
+    return board_hash ^ ACTIVE_KEYS[active] ^ HOLD_KEYS[len(SHAPES) if held is None else held]
+
+
+def attack_lines(lines, t_spin, b2b, combo):
+    """Garbage lines a clear sends to an opponent"""
+    attack = (T_SPIN_ATTACK_LINES if t_spin else ATTACK_LINES).get(lines, 0)
+    if b2b:
+        attack += 1
+    if combo > 0:
+        attack += COMBO_ATTACK_LINES[min(combo, len(COMBO_ATTACK_LINES) - 1)]
+    return attack
+
+
+class BagRandom:
+    """Seeded splitmix64 generator used to shuffle the 7-bag.
+
+    The whole state is one 64-bit integer and the sequence does not depend
+    on the Python version, so a seed always reproduces the same pieces.
+    """
+
+    def __init__(self, seed):
+        self.state = seed & MASK64
+
+    def next(self):
+        """Return the next 64-bit output"""
+        self.state = (self.state + 0x9E3779B97F4A7C15) & MASK64
+        z = self.state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+        return z ^ (z >> 31)
+
+    def shuffle(self, items):
+        """Fisher-Yates shuffle in place"""
+        for i in range(len(items) - 1, 0, -1):
+            j = self.next() % (i + 1)
+            items[i], items[j] = items[j], items[i]
+
+
+class TetrisEngine:
+    def __init__(self, width=10, height=20, clock=None, seed=None):
+        self.width = width
+        self.height = height
+        # Any callable returning seconds; defaults to the time accumulated by tick()
+        self.clock = clock if clock is not None else self.simulated_time
+        # Free Tetrimino objects; the queue, hold and current piece are taken
+        # from here and handed back when they lock, so pieces are not allocated
+        # during a game
+        self.piece_pool = []
+        self.current_piece = None
+        self.next_pieces = []
+        self.held_piece = None
+        self.ghost = Tetrimino(0)
+        # Optional listener (e.g. telemetry.Telemetry) told about every lock
+        # and hold: piece_locking(engine, piece) before the piece is written,
+        # piece_locked(engine, piece, lines) after its clear and garbage,
+        # piece_held(engine) after a hold
+        self.observer = None
+        self.reset(seed)
+
+    def position_key(self):
+        """Zobrist key of the board, current piece and held piece"""
+        held = self.held_piece.shape_idx if self.held_piece else None
+        return position_key(self.board.zobrist, self.current_piece.shape_idx, held)
+
+    def simulated_time(self):
+        """Seconds of game time advanced through tick()"""
+        return self.elapsed
+
+    def reset(self, seed=None):
+        """Reset the game state; a new random seed is drawn unless one is given"""
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.rng = BagRandom(self.seed)
+        self.board = Board(self.width, self.height)
+        self.bag = []
+        self.elapsed = 0.0
+        self.frame = 0  # Number of tick() calls so far
+        self.release_pieces()
+        self.current_piece = self.spawn(self.new_piece())
+        self.next_pieces = [self.new_piece() for _ in range(5)]
+        self.held_piece = None
+        self.can_hold = True
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.combo = -1
+        self.last_clear_time = 0
+        self.gravity = self.calculate_gravity()
+        self.drop_timer = 0
+        self.piece_count = 0
+        self.b2b = False  # Back-to-back flag
+        self.t_spins = 0  # Line clears made with a T-spin
+        self.b2b_count = 0  # Clears that earned the back-to-back bonus
+        # Versus mode: garbage lines owed to opponents (drained by the caller)
+        # and incoming (lines, hole) batches not yet inserted
+        self.attack = 0
+        self.garbage = []
+        self.game_over = False
+        # The ghost piece is reused; ghost_key is the (piece, board) state it shows
+        self.ghost_key = None
+
+    def new_piece(self):
+        """Create a new tetrimino using the 7-bag randomization system"""
+        if not self.bag:
+            self.bag = list(range(len(SHAPES)))
+            self.rng.shuffle(self.bag)
+
+        return self.take_piece(self.bag.pop())
+
+    def take_piece(self, shape_idx):
+        """A fresh piece from the pool; only allocated while the pool is empty"""
+        if self.piece_pool:
+            return self.piece_pool.pop().reset(shape_idx)
+        return Tetrimino(shape_idx)
+
+    def release_pieces(self):
+        """Hand the current, held and queued pieces back to the pool"""
+        for piece in [self.current_piece, self.held_piece] + self.next_pieces:
+            if piece is not None:
+                self.piece_pool.append(piece)
+        self.current_piece = self.held_piece = None
+        self.next_pieces = []
+
+    def spawn(self, piece):
+        """Make piece the falling piece at the spawn position, lock delay unarmed"""
+        piece.x = self.width // 2 - piece.state.width // 2
+        piece.y = 0
+        self.locking = False
+        self.lock_timer = 0
+        return piece
+
+    def calculate_gravity(self):
+        """Fixed slow falling speed (ignores level)"""
+        return 0.5  # Smaller = slower
+
+    def hold_piece(self):
+        """Hold the current piece"""
+        if not self.can_hold:
+            return False
+
+        # The current piece goes into hold unrotated; the objects are swapped
+        piece = self.current_piece
+        piece.reset(piece.shape_idx)
+        if self.held_piece is None:
+            self.current_piece = self.next_pieces.pop(0)
+            self.next_pieces.append(self.new_piece())
+        else:
+            # Swap current piece with held piece
+            self.current_piece = self.held_piece
+        self.held_piece = piece
+
+        self.can_hold = False
+        self.spawn(self.current_piece)
+        if self.observer is not None:
+            self.observer.piece_held(self)
+        return True
+
+    def clear_lines(self):
+        """Clear completed lines and calculate score"""
+        # Only the rows the locked piece touched can have been completed
+        piece = self.current_piece
+        lines_to_clear = self.board.full_rows(piece.y, piece.y + piece.state.height)
+
+        if not lines_to_clear:
+            self.combo = -1
+            return 0
+
+        # Calculate score based on lines cleared, level, and special conditions
+        lines = len(lines_to_clear)
+        base_score = LINE_SCORES.get(lines, 0) * self.level
+        t_spin = self.current_piece.t_spin
+
+        # T-spin bonus
+        if t_spin:
+            if lines == 1:
+                base_score = 800 * self.level
+            elif lines == 2:
+                base_score = 1200 * self.level
+            self.b2b = True
+            self.t_spins += 1
+
+        # Back-to-back bonus
+        b2b_bonus = False
+        if lines >= 4 or t_spin:
+            if self.b2b:
+                base_score = base_score * 3 // 2
+                self.b2b_count += 1
+                b2b_bonus = True
+            self.b2b = True
+        else:
+            self.b2b = False
+
+        # Combo bonus
+        if self.combo >= 0:
+            base_score += 50 * self.combo * self.level
+
+        self.score += base_score
+        self.combo += 1
+        self.lines_cleared += lines
+        self.add_attack(attack_lines(lines, t_spin, b2b_bonus, self.combo))
+
+        # Update level (every 10 lines)
+        self.level = self.lines_cleared // 10 + 1
+        self.gravity = self.calculate_gravity()
+
+        # Remove cleared lines and add new empty ones at the top
+        self.board.remove_rows(lines_to_clear)
+
+        self.last_clear_time = self.clock()
+        return lines
+
+    def add_attack(self, lines):
+        """Cancel incoming garbage with an attack; the rest goes to self.attack"""
+        garbage = self.garbage
+        while lines and garbage:
+            count, hole = garbage[0]
+            if count > lines:
+                garbage[0] = (count - lines, hole)
+                lines = 0
+            else:
+                garbage.pop(0)
+                lines -= count
+        self.attack += lines
+
+    def receive_garbage(self, lines, hole):
+        """Queue garbage from an opponent; it rises after the next lock that clears nothing"""
+        if lines > 0:
+            self.garbage.append((lines, hole))
+
+    def get_ghost_position(self):
+        """Calculate where the piece would land if hard dropped"""
+        piece = self.current_piece
+        board = self.board
+        key = (piece.state, piece.x, piece.y, board, board.version)
+        ghost = self.ghost
+        if key != self.ghost_key:
+            ghost.shape_idx = piece.shape_idx
+            ghost.rotation = piece.rotation
+            ghost.state = piece.state
+            ghost.x = piece.x
+            ghost.y = board.drop_y(piece.state, piece.x, piece.y)
+            self.ghost_key = key
+        return ghost
+
+    def lock_piece(self):
+        """Lock the current piece into the grid"""
+        piece = self.current_piece
+        observer = self.observer
+        if observer is not None:
+            observer.piece_locking(self, piece)
+        self.board.place(piece.state.masks, piece.x, piece.y, piece.shape_idx + 1)
+
+        lines_cleared = self.clear_lines()
+        overflow = False
+        if not lines_cleared:
+            for count, hole in self.garbage:
+                overflow |= self.board.insert_garbage(count, hole, GARBAGE_COLOR)
+            self.garbage.clear()
+        if observer is not None:
+            observer.piece_locked(self, piece, lines_cleared)
+
+        # Check for game over
+        if overflow or self.board.rows[0]:
+            self.game_over = True
+            return lines_cleared
+
+        self.piece_pool.append(piece)
+        self.current_piece = self.spawn(self.next_pieces.pop(0))
+        self.next_pieces.append(self.new_piece())
+        self.can_hold = True
+        self.piece_count += 1
+        return lines_cleared
+
+    def move_down(self):
+        """Move the piece one row down; doing so resets the lock delay"""
+        if not self.current_piece.move(0, 1, self.board):
+            return False
+        self.locking = False
+        self.lock_timer = 0
+        return True
+
+    def step(self, action):
+        """Apply one player action; returns True if it changed the piece"""
+        if self.game_over:
+            return False
+        if self.locking and self.lock_timer >= LOCK_DELAY:
+            # Hard dropped, locking on the next tick: later actions in the same
+            # frame (auto-repeat of a held key, say) must not move it
+            return False
+
+        piece = self.current_piece
+        if action == MOVE_LEFT:
+            return piece.move(-1, 0, self.board)
+        if action == MOVE_RIGHT:
+            return piece.move(1, 0, self.board)
+        if action == ROTATE:
+            return piece.rotate(self.board)
+        if action == SOFT_DROP:
+            return self.move_down()
+        if action == HARD_DROP:
+            # The piece locks on the next tick
+            piece.hard_drop(self.board)
+            self.locking = True
+            self.lock_timer = LOCK_DELAY
+            return True
+        if action == HOLD:
+            return self.hold_piece()
+        raise ValueError(f"unknown action: {action!r}")
+
+    def tick(self, dt):
+        """Advance gravity and lock delay by dt seconds"""
+        if self.game_over:
+            return
+
+        self.elapsed += dt
+        self.frame += 1
+
+        # Apply gravity
+        self.drop_timer += dt
+        if self.drop_timer >= self.gravity:
+            if not self.move_down():
+                # Piece can't move down - start lock delay
+                self.locking = True
+            self.drop_timer = 0
+
+        # Check if piece should lock
+        if self.locking:
+            self.lock_timer += dt
+            if self.lock_timer >= LOCK_DELAY:
+                self.lock_piece()
@@ -0,0 +1,80 @@
+"""Per-phase frame timing instrumentation.
+
+``FrameTimer`` records how long event processing, logic updates, drawing
+and the display flip took in each frame.  Samples go into fixed-size
+ring buffers (no per-frame allocation) and can be shown as an on-screen
+stacked frame-time graph or dumped to CSV.
+"""
+import csv
+import time
+from array import array
+
+import pygame
+
+PHASES = ("events", "update", "draw", "flip")
+PHASE_COLORS = ((80, 160, 255), (80, 220, 120), (255, 200, 60), (230, 80, 80))
+
+# Frame budget at 60 FPS, drawn as a reference line in the graph
+BUDGET = 1 / 60
+
+
+class FrameTimer:
+    def __init__(self, capacity=240):
+        self.capacity = capacity
+        self.samples = [array("d", bytes(8 * capacity)) for _ in PHASES]
+        self.count = 0  # Frames recorded so far
+        self.index = 0  # Slot of the frame being recorded
+        self.phase = 0
+        self.last = 0.0
+
+    def begin_frame(self):
+        """Start timing a new frame"""
+        self.phase = 0
+        self.last = time.perf_counter()
+
+    def mark(self):
+        """Close the current phase and start the next one"""
+        now = time.perf_counter()
+        self.samples[self.phase][self.index] = now - self.last
+        self.last = now
+        self.phase += 1
+        if self.phase == len(PHASES):
+            self.index = (self.index + 1) % self.capacity
+            self.count += 1
+
+    def frames(self):
+        """Recorded frames, oldest first, as tuples of phase durations"""
+        n = min(self.count, self.capacity)
+        start = (self.index - n) % self.capacity
+        for i in range(n):
+            slot = (start + i) % self.capacity
+            yield tuple(samples[slot] for samples in self.samples)
+
+    def dump_csv(self, path):
+        """Write the buffered frames to a CSV file (durations in ms)"""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame"] + [f"{phase}_ms" for phase in PHASES] + ["total_ms"])
+            first = max(self.count - self.capacity, 0)
+            for i, frame in enumerate(self.frames()):
+                ms = [round(t * 1000, 3) for t in frame]
+                writer.writerow([first + i] + ms + [round(sum(frame) * 1000, 3)])
+
+    def draw_graph(self, surface, rect, scale=2 * BUDGET):
+        """Stacked bar graph of recent frames; the line marks the 60 FPS budget"""
+        pygame.draw.rect(surface, (0, 0, 0), rect)
+        n = min(self.count, self.capacity, rect.width)
+        bottom = rect.bottom - 1
+        x = rect.right - n
+        start = (self.index - n) % self.capacity
+        for i in range(n):
+            slot = (start + i) % self.capacity
+            y = bottom
+            for samples, color in zip(self.samples, PHASE_COLORS):
+                h = int(samples[slot] / scale * rect.height)
+                if h:
+                    top = max(y - h, rect.top)
+                    pygame.draw.line(surface, color, (x + i, y), (x + i, top))
+                    y = top
+        budget_y = bottom - int(BUDGET / scale * rect.height)
+        pygame.draw.line(surface, (255, 255, 255), (rect.left, budget_y), (rect.right - 1, budget_y))
@@ -0,0 +1,275 @@
+"""Local leaderboard and replay store for finished games.
+
+Games are kept in one SQLite file.  ``games`` holds one small row per
+game: mode, time, score, lines, level, pieces, duration and seed.
+``replays`` holds the zlib-compressed input replay (see replay.py) in a
+separate table, so the leaderboard queries never read replay blobs.
+
+Top-N lookups use indexes on (mode, score) for all time and on
+(mode, day, score) for a single day.  They read N index entries,
+however many games the file holds.
+
+``add`` only queues a game; ``flush`` writes the queue in one
+transaction (WAL journal, one sync per batch), which the game does
+once at game over.  Every ``PRUNE_INTERVAL`` games, replays outside the
+eviction policy are deleted:
+- the best ``keep_top`` per mode are kept
+- the newest ``keep_recent`` are kept
+The freed pages are returned to the file system (incremental vacuum,
+then a WAL checkpoint so the file shrinks right away).
+Score rows are never evicted; at a few dozen bytes each, even a cabinet
+with tens of thousands of games keeps them all.
+
+Usage: python leaderboard.py DB top [--mode M] [--day YYYY-MM-DD|today] [-n N]
+       python leaderboard.py DB replay ID OUT.trpl
+       python leaderboard.py DB prune
+       python leaderboard.py DB bench [--games N]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+import zlib
+from collections import namedtuple
+
+from replay import parse_replay
+
+KEEP_TOP = 100  # Replays kept for the best games of every mode
+KEEP_RECENT = 1000  # Replays kept for the newest games
+PRUNE_INTERVAL = 100  # Games written between two prunes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    mode TEXT NOT NULL,
+    played_at REAL NOT NULL,  -- Unix time at game end
+    day INTEGER NOT NULL,     -- Local date as YYYYMMDD
+    score INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    pieces INTEGER NOT NULL,
+    duration REAL NOT NULL,   -- Seconds of game time
+    seed INTEGER NOT NULL     -- u64 stored as i64
+);
+CREATE INDEX IF NOT EXISTS games_mode_score ON games (mode, score DESC);
+CREATE INDEX IF NOT EXISTS games_mode_day_score ON games (mode, day, score DESC);
+CREATE TABLE IF NOT EXISTS replays (
+    game_id INTEGER PRIMARY KEY REFERENCES games (id),
+    data BLOB NOT NULL        -- zlib-compressed replay.py bytes
+);
+"""
+
+GAME_COLUMNS = "id mode played_at day score lines level pieces duration seed"
+Game = namedtuple("Game", GAME_COLUMNS)
+# A finished game before it has an id
+GameResult = namedtuple("GameResult", "mode played_at score lines level pieces duration seed")
+
+
+def day_of(t):
+    """Local date of a Unix time as a YYYYMMDD integer"""
+    return int(time.strftime("%Y%m%d", time.localtime(t)))
+
+
+def engine_result(engine, mode, played_at=None):
+    """GameResult of a finished TetrisEngine game"""
+    return GameResult(mode, time.time() if played_at is None else played_at, engine.score,
+                      engine.lines_cleared, engine.level, engine.piece_count,
+                      engine.elapsed, engine.seed)
+
+
+def _signed(seed):
+    return seed - (1 << 64) if seed >= 1 << 63 else seed
+
+
+def _game(row):
+    game = Game(*row)
+    return game._replace(seed=game.seed & ((1 << 64) - 1))
+
+
+class Leaderboard:
+    def __init__(self, path, keep_top=KEEP_TOP, keep_recent=KEEP_RECENT,
+                 prune_interval=PRUNE_INTERVAL):
+        self.path = path
+        self.keep_top = keep_top
+        self.keep_recent = keep_recent
+        self.prune_interval = prune_interval
+        self.db = sqlite3.connect(path)
+        # Must be set before the first table exists to take effect
+        self.db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")  # WAL stays consistent; one sync per checkpoint
+        self.db.executescript(SCHEMA)
+        self.pending = []  # (GameResult, replay bytes or None) not yet written
+        self.unpruned = 0  # Games written since the last prune
+
+    def add(self, result, replay=None):
+        """Queue a finished game (and its replay bytes) for the next flush"""
+        self.pending.append((result, replay))
+
+    def flush(self):
+        """Write the queued games in one transaction; returns their ids"""
+        if not self.pending:
+            return []
+        ids = []
+        with self.db:
+            for result, replay in self.pending:
+                cursor = self.db.execute(
+                    "INSERT INTO games (mode, played_at, day, score, lines, level, pieces, "
+                    "duration, seed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (result.mode, result.played_at, day_of(result.played_at), result.score,
+                     result.lines, result.level, result.pieces, result.duration,
+                     _signed(result.seed)))
+                ids.append(cursor.lastrowid)
+            self.db.executemany(
+                "INSERT INTO replays (game_id, data) VALUES (?, ?)",
+                [(game_id, zlib.compress(replay, 9))
+                 for game_id, (_, replay) in zip(ids, self.pending) if replay is not None])
+        self.unpruned += len(self.pending)
+        self.pending = []
+        if self.unpruned >= self.prune_interval:
+            self.prune()
+        return ids
+
+    def top(self, mode, n=10, day=None):
+        """Best n games of a mode, of all time or of one YYYYMMDD day"""
+        if day is None:
+            rows = self.db.execute(
+                f"SELECT {GAME_COLUMNS.replace(' ', ', ')} FROM games "
+                "WHERE mode = ? ORDER BY score DESC LIMIT ?", (mode, n))
+        else:
+            rows = self.db.execute(
+                f"SELECT {GAME_COLUMNS.replace(' ', ', ')} FROM games "
+                "WHERE mode = ? AND day = ? ORDER BY score DESC LIMIT ?", (mode, day, n))
+        return [_game(row) for row in rows]
+
+    def rank(self, mode, score, day=None):
+        """1-based place a score takes in a mode (ties share the place)"""
+        if day is None:
+            (better,) = self.db.execute(
+                "SELECT COUNT(*) FROM games WHERE mode = ? AND score > ?", (mode, score)).fetchone()
+        else:
+            (better,) = self.db.execute(
+                "SELECT COUNT(*) FROM games WHERE mode = ? AND day = ? AND score > ?",
+                (mode, day, score)).fetchone()
+        return better + 1
+
+    def modes(self):
+        """Modes with at least one game"""
+        return [mode for (mode,) in self.db.execute("SELECT DISTINCT mode FROM games")]
+
+    def replay(self, game_id):
+        """Replay bytes of a game, or None if it has none (or was pruned)"""
+        row = self.db.execute("SELECT data FROM replays WHERE game_id = ?", (game_id,)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def prune(self):
+        """Drop replays outside the eviction policy and compact the file"""
+        # Only replay rows and index ranges are read, not the whole games table
+        keep = {game_id for (game_id,) in self.db.execute(
+            "SELECT id FROM games ORDER BY id DESC LIMIT ?", (self.keep_recent,))}
+        modes = [mode for (mode,) in self.db.execute(
+            "SELECT DISTINCT games.mode FROM replays JOIN games ON games.id = replays.game_id")]
+        for mode in modes:
+            keep.update(game_id for (game_id,) in self.db.execute(
+                "SELECT id FROM games WHERE mode = ? ORDER BY score DESC LIMIT ?",
+                (mode, self.keep_top)))
+        evicted = [(game_id,) for (game_id,) in self.db.execute("SELECT game_id FROM replays")
+                   if game_id not in keep]
+        with self.db:
+            self.db.executemany("DELETE FROM replays WHERE game_id = ?", evicted)
+        # execute() would step the pragma once, freeing a single page
+        self.db.executescript("PRAGMA incremental_vacuum; PRAGMA wal_checkpoint(TRUNCATE);")
+        self.unpruned = 0
+        return len(evicted)
+
+    def close(self):
+        """Write what is queued and close the file"""
+        self.flush()
+        self.db.close()
+
+
+def print_games(games):
+    print(f"{'#':>3} {'id':>6} {'score':>9} {'lines':>6} {'level':>5} {'pieces':>6} "
+          f"{'time':>7}  date")
+    for place, g in enumerate(games, 1):
+        date = time.strftime("%Y-%m-%d %H:%M", time.localtime(g.played_at))
+        print(f"{place:>3} {g.id:>6} {g.score:>9} {g.lines:>6} {g.level:>5} {g.pieces:>6} "
+              f"{g.duration:>7.1f}  {date}")
+
+
+def bench(board, games, mode="bench"):
+    """Write games synthetic results in batches, then time top-N lookups"""
+    rng = random.Random(1)
+    replay = os.urandom(64) + bytes(1500)  # About the size of a short game's log
+    now = time.time()
+    start = time.perf_counter()
+    for i in range(games):
+        board.add(GameResult(mode, now - (games - i) * 60, rng.randrange(200000),
+                             rng.randrange(300), rng.randrange(1, 20), rng.randrange(800),
+                             rng.uniform(30, 900), rng.getrandbits(64)), replay)
+        if len(board.pending) == 50:
+            board.flush()
+    board.flush()
+    write = time.perf_counter() - start
+
+    day = day_of(now)
+    timings = []
+    for query in (lambda: board.top(mode, 10), lambda: board.top(mode, 10, day),
+                  lambda: board.rank(mode, 100000)):
+        start = time.perf_counter()
+        for _ in range(100):
+            query()
+        timings.append((time.perf_counter() - start) / 100)
+    print(f"wrote {games} games in {write:.2f}s ({write / games * 1e6:.0f} us/game)")
+    print(f"top-10 all time {timings[0] * 1000:.3f} ms, top-10 today {timings[1] * 1000:.3f} ms, "
+          f"rank {timings[2] * 1000:.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local leaderboard and replay store")
+    parser.add_argument("db", help="leaderboard database file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    top = sub.add_parser("top", help="print the best games")
+    top.add_argument("--mode", help="game mode (default: every mode)")
+    top.add_argument("--day", help="YYYY-MM-DD or today (default: all time)")
+    top.add_argument("-n", type=int, default=10, help="number of games")
+    get = sub.add_parser("replay", help="export a game's replay for replay.py")
+    get.add_argument("id", type=int)
+    get.add_argument("out")
+    sub.add_parser("prune", help="apply the replay eviction policy now")
+    bench_parser = sub.add_parser("bench", help="write synthetic games and time lookups")
+    bench_parser.add_argument("--games", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    board = Leaderboard(args.db)
+    try:
+        if args.command == "top":
+            day = None
+            if args.day == "today":
+                day = day_of(time.time())
+            elif args.day:
+                day = int(args.day.replace("-", ""))
+            for mode in [args.mode] if args.mode else board.modes():
+                print(f"{mode}:")
+                print_games(board.top(mode, args.n, day))
+        elif args.command == "replay":
+            data = board.replay(args.id)
+            if data is None:
+                print(f"game {args.id} has no replay")
+                return 1
+            parse_replay(data)  # Fail on a damaged blob rather than write it
+            with open(args.out, "wb") as f:
+                f.write(data)
+        elif args.command == "prune":
+            print(f"removed {board.prune()} replays")
+        else:
+            bench(board, args.games)
+    finally:
+        board.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,41 @@
-import pygame
-import random
+"""Advanced Tetris: the pygame front end.
+
+Importing this module has no side effects and does not import pygame:
+analysis scripts and batch tools that only need the constants or
+TetrisGame's rules pay nothing for SDL.  pygame is imported, and only the
+display and font subsystems are initialized, when the first TetrisGame
+opens its window; the mixer is started by SoundBank if sound is on.
+"""
+import argparse
+import os
+import sys
 import time
-import math
-from collections import defaultdict
 
-# Initialize pygame
-pygame.init()
+from ai import PlacementBot
+from controls import ARR, DAS, SOFT_DROP_FACTOR, InputHandler, LatencyMeter
+from engine import (TetrisEngine, FRAME_DT, MOVE_LEFT, MOVE_RIGHT, ROTATE, SOFT_DROP,
+                    HARD_DROP, HOLD)
+from leaderboard import Leaderboard, engine_result
+from pieces import PIECE_STATES
+from replay import InputRecorder
+from snapshot import (HEADER as SNAPSHOT_HEADER, MAX_WIDTH as SNAPSHOT_MAX_WIDTH, dump_state,
+                      load_state)
+from solver import SolverWorker, engine_position
+from telemetry import Telemetry, TelemetryWriter
+
+pygame = None  # Imported by init_pygame() once a window is requested
 
 # Constants
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 700
-GRID_WIDTH = 10
+GRID_WIDTH = 10  # Default board size; set per game with TetrisGame(width, height)
 GRID_HEIGHT = 20
-BLOCK_SIZE = 30
-GRID_OFFSET_X = (SCREEN_WIDTH - GRID_WIDTH * BLOCK_SIZE) // 2
-GRID_OFFSET_Y = SCREEN_HEIGHT - GRID_HEIGHT * BLOCK_SIZE - 50
+BLOCK_SIZE = 30  # Largest cell size; wide boards shrink it to fit
+MIN_BLOCK_SIZE = 4
+PANEL_WIDTH = 200  # Room kept for the hold/score and next panels on each side
+FIELD_MAX_HEIGHT = SCREEN_HEIGHT - 100  # Taller fields scroll
+MAX_FRAME_TIME = 0.25  # Longest wall-clock gap fed to the fixed-step loop
+HIGH_SCORES = 5  # Leaderboard entries shown on the menu
 
 # Colors
 BLACK = (0, 0, 0)
@@ -29,18 +50,23 @@ YELLOW = (255, 255, 0)
 ORANGE = (255, 165, 0)
 PURPLE = (128, 0, 128)
 
-# Tetrimino shapes with colors
-SHAPES = [
-    [[1, 1, 1, 1]],  # I
-    [[1, 1], [1, 1]],  # O
-    [[1, 1, 1], [0, 1, 0]],  # T
-    [[1, 1, 1], [1, 0, 0]],  # J
-    [[1, 1, 1], [0, 0, 1]],  # L
-    [[0, 1, 1], [1, 1, 0]],  # S
-    [[1, 1, 0], [0, 1, 1]]   # Z
-]
-
+# Tetrimino colors, indexed like pieces.SHAPES
 SHAPES_COLORS = [CYAN, YELLOW, PURPLE, BLUE, ORANGE, GREEN, RED]
+# Board cell colors by color index - 1 (versus garbage last)
+CELL_COLORS = SHAPES_COLORS + [GRAY]
+OPPONENT_BLOCK_SIZE = 8  # Largest cell of the opponents' boards in versus mode
+
+# Gameplay keys (pygame key names) and the engine action each one sends
+KEY_BINDINGS = {
+    "left": MOVE_LEFT,
+    "right": MOVE_RIGHT,
+    "up": ROTATE,
+    "down": SOFT_DROP,
+    "space": HARD_DROP,
+    "c": HOLD,
+}
+ACTION_SOUNDS = {MOVE_LEFT: "move", MOVE_RIGHT: "move", ROTATE: "rotate",
+                 SOFT_DROP: "soft_drop", HARD_DROP: "hard_drop"}
 
 # Game states
 MENU = 0
@@ -48,403 +74,335 @@ PLAYING = 1
 PAUSED = 2
 GAME_OVER = 3
 
-class Tetrimino:
-    pygame.mixer.init()  # Initialize the sound mixer
-    def __init__(self, shape_idx, x=GRID_WIDTH // 2 - 2, y=0):
-        self.shape = SHAPES[shape_idx]
-        self.color = SHAPES_COLORS[shape_idx]
-        self.x = x
-        self.y = y
-        self.rotation = 0
-        self.shape_idx = shape_idx
-        # Add these cooldown attributes:
-        self.last_move_time = 0
-        self.last_rotate_time = 0
-        self.move_cooldown = 0.1  # seconds between moves
-        self.rotate_cooldown = 0.2  # seconds between rotations
-        self.last_drop_time = 0
-        self.lock_delay = 0.5
-        self.lock_timer = 0
-        self.locking = False
-        self.t_spin = False
-    def rotate(self, grid):
-        """Rotate the tetrimino clockwise with wall kicks and T-spin detection"""
-        original_rotation = self.rotation
-        original_shape = self.shape
-        
-        # Rotate the shape
-        self.rotation = (self.rotation + 1) % 4
-        self.shape = [list(row) for row in zip(*self.shape[::-1])]
-        
-        # Wall kick tests (5 tests for each rotation)
-        kick_offsets = [
-            [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],  # 0->1
-            [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],      # 1->2
-            [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],      # 2->3
-            [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)]     # 3->0
-        ]
-        
-        # Try each offset in the current rotation's kick table
-        for dx, dy in kick_offsets[original_rotation]:
-            self.x += dx
-            self.y += dy
-            
-            if not self.collision(grid):
-                # Check for T-spin conditions
-                if self.shape_idx == 2:  # T piece
-                    corners = 0
-                    test_positions = [
-                        (self.x, self.y),
-                        (self.x + len(self.shape[0]) - 1, self.y),
-                        (self.x, self.y + len(self.shape) - 1),
-                        (self.x + len(self.shape[0]) - 1, self.y + len(self.shape) - 1)
-                    ]
-                    
-                    for tx, ty in test_positions:
-                        if (tx < 0 or tx >= GRID_WIDTH or ty >= GRID_HEIGHT or 
-                            (ty >= 0 and grid[ty][tx] is not None)):
-                            corners += 1
-                    
-                    # T-spin if 3 or more corners are filled and last move was rotation
-                    self.t_spin = (corners >= 3 and 
-                                  time.time() - self.last_rotate_time < 0.1)
-                
-                self.last_rotate_time = time.time()
-                return True
-            
-            # Revert the offset if it didn't work
-            self.x -= dx
-            self.y -= dy
-        
-        # If all kicks failed, revert rotation
-        self.rotation = original_rotation
-        self.shape = original_shape
-        return False
-    
-    def move(self, dx, dy, grid):
-        """Move the tetrimino by dx, dy if possible"""
-        self.x += dx
-        self.y += dy
-        
-        if self.collision(grid):
-            self.x -= dx
-            self.y -= dy
-            return False
-        
-        self.last_move_time = time.time()
-        
-        # Reset lock timer if movement was successful
-        if dy != 0:  # Only reset on downward movement
-            self.locking = False
-            self.lock_timer = 0
-        
-        return True
-    
-    def hard_drop(self, grid):
-        """Drop the piece instantly to the lowest possible position"""
-        while self.move(0, 1, grid):
-            pass
-        self.locking = True
-        self.lock_timer = self.lock_delay
-        self.last_drop_time = time.time()
-    
-    def collision(self, grid):
-        """Check if the tetrimino collides with walls or other blocks"""
-        for y, row in enumerate(self.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    board_x = self.x + x
-                    board_y = self.y + y
-                    
-                    if (board_x < 0 or board_x >= GRID_WIDTH or 
-                        board_y >= GRID_HEIGHT or 
-                        (board_y >= 0 and grid[board_y][board_x] is not None)):
-                        return True
-        return False
-    
-    def update_lock_timer(self, dt):
-        """Update the lock timer based on time passed"""
-        if self.locking:
-            self.lock_timer += dt
-            if self.lock_timer >= self.lock_delay:
-                return True
-        return False
-    
-    def draw(self, screen, ghost=False):
-        """Draw the tetrimino on the screen"""
-        color = self.color
-        alpha = 100 if ghost else 255
-        s = pygame.Surface((BLOCK_SIZE, BLOCK_SIZE), pygame.SRCALPHA)
-        s.fill((color[0], color[1], color[2], alpha))
-        
-        for y, row in enumerate(self.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    pos_x = GRID_OFFSET_X + (self.x + x) * BLOCK_SIZE
-                    pos_y = GRID_OFFSET_Y + (self.y + y) * BLOCK_SIZE
-                    
-                    if ghost:
-                        # Draw ghost piece outline
-                        pygame.draw.rect(screen, color, 
-                                        (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE), 1)
-                    else:
-                        screen.blit(s, (pos_x, pos_y))
-                        pygame.draw.rect(screen, WHITE, 
-                                        (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE), 1)
+
+def init_pygame():
+    """Import pygame and start the subsystems a window needs (display, fonts)"""
+    global pygame
+    if pygame is None:
+        import pygame as module
+        pygame = module
+    pygame.display.init()
+    pygame.font.init()
+    return pygame
 
 class TetrisGame:
-    def __init__(self):
+    def __init__(self, dirty_rendering=True, sound=True, record_dir=None,
+                 render_fps=60, interpolate=False, profile_frames=False, frame_csv=None,
+                 bot=None, bot_delay=0.1, width=GRID_WIDTH, height=GRID_HEIGHT,
+                 block_size=None, snapshot_path=None, versus=None,
+                 das=DAS, arr=ARR, soft_drop_factor=SOFT_DROP_FACTOR, measure_latency=False,
+                 telemetry_path=None, capture=None, hints=False, scores_path=None):
+        init_pygame()
+        # pygame modules, loaded with the window
+        from frametime import FrameTimer
+        from renderer import BoardRenderer, SurfaceCache
+        from sound import SoundBank
+        
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Advanced Tetris")
         self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont('Arial', 24)
+        self.small_font = pygame.font.SysFont('Arial', 18)
         self.big_font = pygame.font.SysFont('Arial', 48)
-        
+        self.sounds = SoundBank(enabled=sound)  # All effects are built once here
+        
+        # Board layout: cells shrink to fit wide boards, tall boards get a
+        # scrolling viewport of the rows that fit on screen
+        self.width = width
+        self.height = height
+        if block_size is None:
+            block_size = max(MIN_BLOCK_SIZE, min(BLOCK_SIZE, (SCREEN_WIDTH - 2 * PANEL_WIDTH) // width))
+        self.block_size = block_size
+        visible_rows = min(height, FIELD_MAX_HEIGHT // block_size)
+        self.offset_x = (SCREEN_WIDTH - width * block_size) // 2
+        self.offset_y = SCREEN_HEIGHT - visible_rows * block_size - 50
+        
+        # All game rules live in the headless engine; this class only
+        # turns keyboard input into engine actions and draws its state
+        self.engine = TetrisEngine(width, height, clock=time.time)
+        # Every game's inputs are logged; with record_dir they are saved at game over
+        self.record_dir = record_dir
+        
+        # Held keys with DAS/ARR auto-repeat; key state outlives pieces
+        self.key_actions = {pygame.key.key_code(name): action
+                            for name, action in KEY_BINDINGS.items()}
+        self.controls = InputHandler(self.input_action, das, arr, soft_drop_factor)
+        # Optional key event to displayed frame latency measurement
+        self.latency = LatencyMeter() if measure_latency else None
+        # Per-piece stats for the HUD (PPS, APM, finesse); logged with telemetry_path
+        self.telemetry = Telemetry(TelemetryWriter(telemetry_path) if telemetry_path else None)
+        # Optional recording of every drawn frame ("png:DIR", "raw:DIR" or "pipe:COMMAND")
+        self.capture = None
+        if capture:
+            from capture import open_capture
+            self.capture = open_capture(capture, self.screen, render_fps or 60)
+        
+        # Versus mode: a connected versus.VersusClient; the match decides
+        # when the game starts and the seed
+        self.versus = versus
+        
+        # Optional local leaderboard: every finished game (and its replay) is
+        # stored per mode; the menu shows the mode's best scores
+        self.mode = "versus" if versus else "bot" if bot else "marathon"
+        if (width, height) != (GRID_WIDTH, GRID_HEIGHT):
+            self.mode += f"-{width}x{height}"
+        self.leaderboard = Leaderboard(scores_path) if scores_path else None
+        self.high_scores = self.leaderboard.top(self.mode, HIGH_SCORES) if self.leaderboard else []
+        self.final_rank = None
+        
+        # Optional perfect clear / T-spin hints, searched in a worker process
+        # (not offered in versus matches)
+        self.solver = SolverWorker() if hints and not versus else None
+        self.hint = None  # Solution for the position in hint_tag
+        self.hint_tag = None
+        
+        # Optional PlacementBot that plays instead of the keyboard
+        self.bot = bot
+        self.bot_delay = bot_delay  # seconds between bot placements
+        self.bot_timer = 0.0
+        
+        # Cached sprites/background; with dirty_rendering only changed areas are redrawn
+        self.renderer = BoardRenderer(self.screen, CELL_COLORS, self.offset_x, self.offset_y,
+                                      block_size, width, height, visible_rows)
+        self.dirty_rendering = dirty_rendering
+        self.text_cache = SurfaceCache()
+        self.drawn_state = None
+        self.pending_update = None
+        self.render_fps = render_fps  # 0 = uncapped; logic always runs at 1 / FRAME_DT
+        self.interpolate = interpolate
+        
+        # Optional per-phase frame timing (events/update/draw/flip)
+        self.frame_timer = FrameTimer() if profile_frames or frame_csv else None
+        self.show_frame_graph = profile_frames
+        self.frame_csv = frame_csv
+        self.graph_rect = pygame.Rect(10, SCREEN_HEIGHT - 110, self.offset_x - 20, 100)
+        self.hud_key = None
+        panel_right = self.offset_x + width * block_size + 2
+        self.panel_rects = [pygame.Rect(0, 0, self.offset_x - 2, SCREEN_HEIGHT),
+                            pygame.Rect(panel_right, 0, SCREEN_WIDTH - panel_right, SCREEN_HEIGHT)]
         self.reset_game()
+        
+        # Kiosk suspend/resume: an unfinished game is saved here on exit and
+        # picked up again on the next start
+        self.snapshot_path = snapshot_path
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load_snapshot(snapshot_path)
 
     def reset_game(self):
          """Reset the game state"""
-         self.grid = [[None for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-         self.bag = list(range(len(SHAPES)))  # Initialize the bag first
-         random.shuffle(self.bag)  # Then shuffle it
-         self.current_piece = self.new_piece()
-         self.next_pieces = [self.new_piece() for _ in range(5)]
-         self.held_piece = None
-         self.can_hold = True
-         self.score = 0
-         self.level = 1
-         self.lines_cleared = 0
-         self.combo = -1
+         self.engine.reset(self.versus.welcome.seed if self.versus else None)
+         self.telemetry.start(self.engine)
+         # Received garbage is not in the input log, so a versus game cannot be
+         # replayed: it is neither recorded nor stored with a replay
+         self.recorder = None if self.versus else InputRecorder(self.engine)
+         self.bot_piece = None
+         self.controls.reset()
+         self.hint = None
+         self.hint_tag = None
+         self.final_rank = None
          self.game_state = MENU
-         self.last_clear_time = 0
-         self.gravity = self.calculate_gravity()
-         self.drop_timer = 0
-         self.piece_count = 0
-         self.b2b = False  # Back-to-back flag
-        
     
-        
-    def new_piece(self):
-        """Create a new tetrimino using the 7-bag randomization system"""
-        if not self.bag:
-            self.bag = list(range(len(SHAPES)))
-            random.shuffle(self.bag)
-        
-        shape_idx = self.bag.pop()
-        return Tetrimino(shape_idx)
+    def act(self, action):
+        """Apply a player action to the engine and log it for the replay"""
+        if self.recorder:
+            self.recorder.record(action)
+        return self.engine.step(action)
     
-    def calculate_gravity(self):
-     """Fixed slow falling speed (ignores level)"""
-     return 0.5  # Smaller = slower
+    def input_action(self, action):
+        """Apply an action from the keyboard, with its sound"""
+        changed = self.act(action)
+        if changed and action in ACTION_SOUNDS:
+            self.sounds.play(ACTION_SOUNDS[action])
+        return changed
     
-    def hold_piece(self):
-        """Hold the current piece"""
-        if not self.can_hold:
-            return
-        
-        if self.held_piece is None:
-            self.held_piece = Tetrimino(self.current_piece.shape_idx)
-            self.current_piece = self.next_pieces.pop(0)
-            self.next_pieces.append(self.new_piece())
-        else:
-            # Swap current piece with held piece
-            held_idx = self.held_piece.shape_idx
-            self.held_piece = Tetrimino(self.current_piece.shape_idx)
-            self.current_piece = Tetrimino(held_idx)
-        
-        self.can_hold = False
-        self.current_piece.x = GRID_WIDTH // 2 - len(self.current_piece.shape[0]) // 2
-        self.current_piece.y = 0
+    def save_replay(self):
+        """Write the finished game's input log to record_dir"""
+        os.makedirs(self.record_dir, exist_ok=True)
+        name = time.strftime("%Y%m%d-%H%M%S") + f"-{self.engine.seed:016x}.trpl"
+        self.recorder.save(os.path.join(self.record_dir, name))
     
-    def clear_lines(self):
-        """Clear completed lines and calculate score"""
-        lines_to_clear = []
-        for y in range(GRID_HEIGHT):
-            if all(self.grid[y]):
-                lines_to_clear.append(y)
-        
-        if not lines_to_clear:
-            self.combo = -1
-            return 0
-        
-        # Calculate score based on lines cleared, level, and special conditions
-        line_scores = {1: 100, 2: 300, 3: 500, 4: 800}
-        base_score = line_scores.get(len(lines_to_clear), 0) * self.level
-        
-        # T-spin bonus
-        if self.current_piece.t_spin:
-            if len(lines_to_clear) == 0:
-                base_score = 400 * self.level
-            elif len(lines_to_clear) == 1:
-                base_score = 800 * self.level
-            elif len(lines_to_clear) == 2:
-                base_score = 1200 * self.level
-            self.b2b = True
-        
-        # Back-to-back bonus
-        if len(lines_to_clear) >= 4 or (self.current_piece.t_spin and len(lines_to_clear) > 0):
-            if self.b2b:
-                base_score = base_score * 3 // 2
-            self.b2b = True
-        elif len(lines_to_clear) > 0:
-            self.b2b = False
-        
-        # Combo bonus
-        if self.combo >= 0:
-            base_score += 50 * self.combo * self.level
-        
-        self.score += base_score
-        self.combo += 1
-        self.lines_cleared += len(lines_to_clear)
-        
-        # Update level (every 10 lines)
-        self.level = self.lines_cleared // 10 + 1
-        self.gravity = self.calculate_gravity()
-        
-        # Remove cleared lines and add new empty ones at the top
-        for y in sorted(lines_to_clear):
-            del self.grid[y]
-            self.grid.insert(0, [None for _ in range(GRID_WIDTH)])
-        
-        self.last_clear_time = time.time()
-        return len(lines_to_clear)
+    def record_score(self):
+        """Store the finished game with its replay and look up its place"""
+        board = self.leaderboard
+        board.add(engine_result(self.engine, self.mode),
+                  self.recorder.to_bytes() if self.recorder else None)
+        board.flush()
+        self.final_rank = board.rank(self.mode, self.engine.score)
+        self.high_scores = board.top(self.mode, HIGH_SCORES)
     
-    def get_ghost_position(self):
-        """Calculate where the piece would land if hard dropped"""
-        ghost = Tetrimino(self.current_piece.shape_idx, 
-                         self.current_piece.x, self.current_piece.y)
-        while not ghost.collision(self.grid):
-            ghost.y += 1
-        ghost.y -= 1
-        return ghost
+    def save_snapshot(self, path):
+        """Write the running game to path so it can be resumed later"""
+        with open(path, "wb") as f:
+            f.write(dump_state(self.engine))
     
-    def lock_piece(self):
-        """Lock the current piece into the grid"""
-        for y, row in enumerate(self.current_piece.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    board_y = self.current_piece.y + y
-                    board_x = self.current_piece.x + x
-                    if 0 <= board_y < GRID_HEIGHT and 0 <= board_x < GRID_WIDTH:
-                        self.grid[board_y][board_x] = self.current_piece.color
-        
-        lines_cleared = self.clear_lines()
-        
-        # Check for game over
-        if any(self.grid[0]):
-            self.game_state = GAME_OVER
-            return
-        
-        self.current_piece = self.next_pieces.pop(0)
-        self.next_pieces.append(self.new_piece())
-        self.can_hold = True
-        self.piece_count += 1
-        
-        # Reset position
-        self.current_piece.x = GRID_WIDTH // 2 - len(self.current_piece.shape[0]) // 2
-        self.current_piece.y = 0
+    def load_snapshot(self, path):
+        """Resume a game written by save_snapshot; it starts paused"""
+        with open(path, "rb") as f:
+            data = f.read()
+        _, _, width, height = SNAPSHOT_HEADER.unpack_from(data, 0)
+        if (width, height) != (self.width, self.height):
+            raise ValueError(f"snapshot is for a {width}x{height} board")
+        load_state(self.engine, data)
+        # The input log would not start at the seed, so no replay is kept
+        self.recorder = None
+        self.bot_piece = None
+        self.game_state = PAUSED
+    
+    def draw_piece(self, piece, ghost=False, offset_y=0):
+        """Draw a tetrimino on the screen"""
+        self.renderer.blit_piece(piece, ghost, offset_y)
     
     def draw_grid(self):
         """Draw the game grid and borders"""
+        bs = self.block_size
+        top = self.renderer.view_top
+        rows = self.renderer.visible_rows
+        field_width = self.width * bs
+        field_height = rows * bs
+        
         # Draw grid background
         pygame.draw.rect(self.screen, GRAY, 
-                         (GRID_OFFSET_X - 2, GRID_OFFSET_Y - 2, 
-                          GRID_WIDTH * BLOCK_SIZE + 4, GRID_HEIGHT * BLOCK_SIZE + 4), 0)
-        
-        # Draw grid cells
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if self.grid[y][x] is not None:
-                    pygame.draw.rect(self.screen, self.grid[y][x], 
-                                    (GRID_OFFSET_X + x * BLOCK_SIZE, 
-                                     GRID_OFFSET_Y + y * BLOCK_SIZE, 
-                                     BLOCK_SIZE, BLOCK_SIZE))
+                         (self.offset_x - 2, self.offset_y - 2, 
+                          field_width + 4, field_height + 4), 0)
+        
+        # Draw grid cells in the viewport (empty rows are skipped via their bitmask)
+        board = self.engine.board
+        for y in range(top, top + rows):
+            if not board.rows[y]:
+                continue
+            colors = board.colors[y]
+            pos_y = self.offset_y + (y - top) * bs
+            for x in range(self.width):
+                if colors[x]:
+                    pygame.draw.rect(self.screen, CELL_COLORS[colors[x] - 1], 
+                                    (self.offset_x + x * bs, pos_y, bs, bs))
                     pygame.draw.rect(self.screen, WHITE, 
-                                    (GRID_OFFSET_X + x * BLOCK_SIZE, 
-                                     GRID_OFFSET_Y + y * BLOCK_SIZE, 
-                                     BLOCK_SIZE, BLOCK_SIZE), 1)
+                                    (self.offset_x + x * bs, pos_y, bs, bs), 1)
         
         # Draw grid lines
-        for x in range(GRID_WIDTH + 1):
+        for x in range(self.width + 1):
             pygame.draw.line(self.screen, (50, 50, 50), 
-                            (GRID_OFFSET_X + x * BLOCK_SIZE, GRID_OFFSET_Y), 
-                            (GRID_OFFSET_X + x * BLOCK_SIZE, GRID_OFFSET_Y + GRID_HEIGHT * BLOCK_SIZE))
+                            (self.offset_x + x * bs, self.offset_y), 
+                            (self.offset_x + x * bs, self.offset_y + field_height))
         
-        for y in range(GRID_HEIGHT + 1):
+        for y in range(rows + 1):
             pygame.draw.line(self.screen, (50, 50, 50), 
-                            (GRID_OFFSET_X, GRID_OFFSET_Y + y * BLOCK_SIZE), 
-                            (GRID_OFFSET_X + GRID_WIDTH * BLOCK_SIZE, GRID_OFFSET_Y + y * BLOCK_SIZE))
+                            (self.offset_x, self.offset_y + y * bs), 
+                            (self.offset_x + field_width, self.offset_y + y * bs))
     
     def draw_info_panel(self):
         """Draw the side panel with game information"""
         # Next pieces
-        next_text = self.font.render("NEXT:", True, WHITE)
-        self.screen.blit(next_text, (GRID_OFFSET_X + GRID_WIDTH * BLOCK_SIZE + 30, 50))
-        
-        for i, piece in enumerate(self.next_pieces[:5]):
-            for y, row in enumerate(piece.shape):
-                for x, cell in enumerate(row):
-                    if cell:
-                        pos_x = GRID_OFFSET_X + GRID_WIDTH * BLOCK_SIZE + 50 + x * BLOCK_SIZE
-                        pos_y = 100 + i * 100 + y * BLOCK_SIZE
-                        pygame.draw.rect(self.screen, piece.color, 
-                                        (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE))
-                        pygame.draw.rect(self.screen, WHITE, 
-                                        (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE), 1)
+        next_text = self.text_cache.text(self.font, "NEXT:", WHITE)
+        panel_x = self.offset_x + self.width * self.block_size
+        self.screen.blit(next_text, (panel_x + 30, 50))
+        
+        engine = self.engine
+        for i, piece in enumerate(engine.next_pieces[:5]):
+            for x, y in piece.state.cells:
+                pos_x = panel_x + 50 + x * BLOCK_SIZE
+                pos_y = 100 + i * 100 + y * BLOCK_SIZE
+                pygame.draw.rect(self.screen, SHAPES_COLORS[piece.shape_idx], 
+                                (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE))
+                pygame.draw.rect(self.screen, WHITE, 
+                                (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE), 1)
         
         # Held piece
-        hold_text = self.font.render("HOLD:", True, WHITE)
-        self.screen.blit(hold_text, (GRID_OFFSET_X - 150, 50))
-        
-        if self.held_piece:
-            for y, row in enumerate(self.held_piece.shape):
-                for x, cell in enumerate(row):
-                    if cell:
-                        pos_x = GRID_OFFSET_X - 130 + x * BLOCK_SIZE
-                        pos_y = 100 + y * BLOCK_SIZE
-                        pygame.draw.rect(self.screen, self.held_piece.color, 
-                                        (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE))
-                        pygame.draw.rect(self.screen, WHITE, 
-                                        (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE), 1)
+        hold_text = self.text_cache.text(self.font, "HOLD:", WHITE)
+        self.screen.blit(hold_text, (self.offset_x - 150, 50))
+        
+        if engine.held_piece:
+            for x, y in engine.held_piece.state.cells:
+                pos_x = self.offset_x - 130 + x * BLOCK_SIZE
+                pos_y = 100 + y * BLOCK_SIZE
+                pygame.draw.rect(self.screen, SHAPES_COLORS[engine.held_piece.shape_idx], 
+                                (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE))
+                pygame.draw.rect(self.screen, WHITE, 
+                                (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE), 1)
         
         # Score and level
-        score_text = self.font.render(f"SCORE: {self.score}", True, WHITE)
-        level_text = self.font.render(f"LEVEL: {self.level}", True, WHITE)
-        lines_text = self.font.render(f"LINES: {self.lines_cleared}", True, WHITE)
+        score_text = self.text_cache.text(self.font, f"SCORE: {engine.score}", WHITE)
+        level_text = self.text_cache.text(self.font, f"LEVEL: {engine.level}", WHITE)
+        lines_text = self.text_cache.text(self.font, f"LINES: {engine.lines_cleared}", WHITE)
         
-        self.screen.blit(score_text, (GRID_OFFSET_X - 150, 250))
-        self.screen.blit(level_text, (GRID_OFFSET_X - 150, 300))
-        self.screen.blit(lines_text, (GRID_OFFSET_X - 150, 350))
+        self.screen.blit(score_text, (self.offset_x - 150, 250))
+        self.screen.blit(level_text, (self.offset_x - 150, 300))
+        self.screen.blit(lines_text, (self.offset_x - 150, 350))
         
         # Combo
-        if self.combo > 0:
-            combo_text = self.font.render(f"COMBO: {self.combo}", True, WHITE)
-            self.screen.blit(combo_text, (GRID_OFFSET_X - 150, 400))
+        if engine.combo > 0:
+            combo_text = self.text_cache.text(self.font, f"COMBO: {engine.combo}", WHITE)
+            self.screen.blit(combo_text, (self.offset_x - 150, 400))
         
         # T-spin indicator
-        if self.current_piece.t_spin:
-            tspin_text = self.font.render("T-SPIN!", True, YELLOW)
-            self.screen.blit(tspin_text, (GRID_OFFSET_X - 150, 450))
+        if engine.current_piece.t_spin:
+            tspin_text = self.text_cache.text(self.font, "T-SPIN!", YELLOW)
+            self.screen.blit(tspin_text, (self.offset_x - 150, 450))
         
         # Back-to-back indicator
-        if self.b2b:
-            b2b_text = self.font.render("B2B", True, ORANGE)
-            self.screen.blit(b2b_text, (GRID_OFFSET_X - 150, 500))
+        if engine.b2b:
+            b2b_text = self.text_cache.text(self.font, "B2B", ORANGE)
+            self.screen.blit(b2b_text, (self.offset_x - 150, 500))
+        
+        # Live telemetry
+        stats = self.telemetry
+        pps_text = self.text_cache.text(self.font, f"PPS {stats.pps:.2f}  APM {stats.apm:.0f}", WHITE)
+        finesse_text = self.text_cache.text(self.font, f"FINESSE {stats.faults}/{stats.judged}",
+                                            RED if stats.faults else WHITE)
+        self.screen.blit(pps_text, (panel_x + 30, 610))
+        self.screen.blit(finesse_text, (panel_x + 30, 645))
+        
+        if self.hint:
+            kind = self.hint.kind.upper()
+            hold = " HOLD" if self.hint.steps[0].hold else ""
+            hint_text = self.text_cache.text(self.font, f"{kind} IN {len(self.hint.steps)}{hold}", CYAN)
+            self.screen.blit(hint_text, (self.offset_x - 150, 550))
+        
+        if self.versus:
+            self.draw_opponents()
+    
+    def draw_opponents(self):
+        """Draw the other players' boards small, below the score panel"""
+        boards = self.versus.boards
+        if not boards:
+            return
+        width, height = self.width, self.height
+        top = 540
+        room = self.offset_x - 20
+        bs = max(1, min(OPPONENT_BLOCK_SIZE, (SCREEN_HEIGHT - top - 10) // height,
+                        room // (len(boards) * (width + 1))))
+        for i, (player, board) in enumerate(sorted(boards.items())):
+            left = 10 + i * (width + 1) * bs
+            pygame.draw.rect(self.screen, GRAY, (left - 1, top - 1, width * bs + 2, height * bs + 2), 1)
+            out = player in self.versus.out
+            for y, row in enumerate(board.rows):
+                if not row:
+                    continue
+                colors = board.colors[y]
+                for x in range(width):
+                    if colors[x]:
+                        color = GRAY if out else CELL_COLORS[colors[x] - 1]
+                        pygame.draw.rect(self.screen, color, (left + x * bs, top + y * bs, bs, bs))
     
     def draw_menu(self):
         """Draw the main menu"""
-        title = self.big_font.render("ADVANCED TETRIS", True, WHITE)
-        start_text = self.font.render("Press ENTER to Start", True, WHITE)
-        controls_text1 = self.font.render("Controls:", True, WHITE)
-        controls_text2 = self.font.render("Left/Right: Move", True, WHITE)
-        controls_text3 = self.font.render("Up: Rotate", True, WHITE)
-        controls_text4 = self.font.render("Down: Soft Drop", True, WHITE)
-        controls_text5 = self.font.render("Space: Hard Drop", True, WHITE)
-        controls_text6 = self.font.render("C: Hold", True, WHITE)
-        controls_text7 = self.font.render("P: Pause", True, WHITE)
+        title = self.text_cache.text(self.big_font, "ADVANCED TETRIS", WHITE)
+        if self.versus:
+            start_text = self.text_cache.text(self.font, "Waiting for players...", WHITE)
+        else:
+            start_text = self.text_cache.text(self.font, "Press ENTER to Start", WHITE)
+        controls_text1 = self.text_cache.text(self.font, "Controls:", WHITE)
+        controls_text2 = self.text_cache.text(self.font, "Left/Right: Move", WHITE)
+        controls_text3 = self.text_cache.text(self.font, "Up: Rotate", WHITE)
+        controls_text4 = self.text_cache.text(self.font, "Down: Soft Drop", WHITE)
+        controls_text5 = self.text_cache.text(self.font, "Space: Hard Drop", WHITE)
+        controls_text6 = self.text_cache.text(self.font, "C: Hold", WHITE)
+        controls_text7 = self.text_cache.text(self.font, "P: Pause", WHITE)
         
         self.screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 100))
         self.screen.blit(start_text, (SCREEN_WIDTH // 2 - start_text.get_width() // 2, 300))
+        if self.high_scores:
+            self.draw_high_scores(165)
         self.screen.blit(controls_text1, (SCREEN_WIDTH // 2 - controls_text1.get_width() // 2, 400))
         self.screen.blit(controls_text2, (SCREEN_WIDTH // 2 - controls_text2.get_width() // 2, 450))
         self.screen.blit(controls_text3, (SCREEN_WIDTH // 2 - controls_text3.get_width() // 2, 480))
@@ -453,51 +411,160 @@ class TetrisGame:
         self.screen.blit(controls_text6, (SCREEN_WIDTH // 2 - controls_text6.get_width() // 2, 570))
         self.screen.blit(controls_text7, (SCREEN_WIDTH // 2 - controls_text7.get_width() // 2, 600))
     
+    def draw_high_scores(self, top):
+        """Draw the mode's best scores from the leaderboard, starting at y = top"""
+        header = self.text_cache.text(self.small_font, "HIGH SCORES", YELLOW)
+        self.screen.blit(header, (SCREEN_WIDTH // 2 - header.get_width() // 2, top))
+        for i, game in enumerate(self.high_scores):
+            date = time.strftime("%Y-%m-%d", time.localtime(game.played_at))
+            line = self.text_cache.text(self.small_font,
+                                        f"{i + 1}.  {game.score:>7}   {game.lines:>3} lines   {date}",
+                                        WHITE)
+            self.screen.blit(line, (SCREEN_WIDTH // 2 - line.get_width() // 2, top + 22 + i * 20))
+    
     def draw_pause(self):
         """Draw the pause screen"""
-        pause_text = self.big_font.render("PAUSED", True, WHITE)
-        continue_text = self.font.render("Press P to Continue", True, WHITE)
+        pause_text = self.text_cache.text(self.big_font, "PAUSED", WHITE)
+        continue_text = self.text_cache.text(self.font, "Press P to Continue", WHITE)
         
         # Semi-transparent overlay
-        s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        s.fill((0, 0, 0, 128))
-        self.screen.blit(s, (0, 0))
+        self.screen.blit(self.text_cache.overlay((SCREEN_WIDTH, SCREEN_HEIGHT), (0, 0, 0, 128)), (0, 0))
         
         self.screen.blit(pause_text, (SCREEN_WIDTH // 2 - pause_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
         self.screen.blit(continue_text, (SCREEN_WIDTH // 2 - continue_text.get_width() // 2, SCREEN_HEIGHT // 2 + 50))
     
     def draw_game_over(self):
         """Draw the game over screen"""
-        over_text = self.big_font.render("GAME OVER", True, RED)
-        score_text = self.font.render(f"Final Score: {self.score}", True, WHITE)
-        restart_text = self.font.render("Press ENTER to Restart", True, WHITE)
+        over_text = self.text_cache.text(self.big_font, "GAME OVER", RED)
+        score_text = self.text_cache.text(self.font, f"Final Score: {self.engine.score}", WHITE)
+        restart_text = self.text_cache.text(self.font, "Press ENTER to Restart", WHITE)
+        if self.versus:
+            won = self.versus.winner == self.versus.welcome.player
+            over_text = self.text_cache.text(self.big_font, "YOU WIN" if won else "YOU LOSE",
+                                             GREEN if won else RED)
+            restart_text = self.text_cache.text(self.font, "Match over", WHITE)
         
         # Semi-transparent overlay
-        s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        s.fill((0, 0, 0, 180))
-        self.screen.blit(s, (0, 0))
+        self.screen.blit(self.text_cache.overlay((SCREEN_WIDTH, SCREEN_HEIGHT), (0, 0, 0, 180)), (0, 0))
         
         self.screen.blit(over_text, (SCREEN_WIDTH // 2 - over_text.get_width() // 2, SCREEN_HEIGHT // 2 - 100))
         self.screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, SCREEN_HEIGHT // 2))
+        if self.final_rank is not None:
+            rank_text = self.text_cache.text(self.font, f"Rank #{self.final_rank}", YELLOW)
+            self.screen.blit(rank_text, (SCREEN_WIDTH // 2 - rank_text.get_width() // 2, SCREEN_HEIGHT // 2 + 40))
         self.screen.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, SCREEN_HEIGHT // 2 + 100))
     
     def update(self, dt):
         """Update game state"""
+        versus = self.versus
+        if versus:
+            versus.poll(self.engine)
+            if self.game_state == MENU and versus.started:
+                self.game_state = PLAYING
         if self.game_state == PLAYING:
-            # Apply gravity
-            self.drop_timer += dt
-            if self.drop_timer >= self.gravity:
-                if not self.current_piece.move(0, 1, self.grid):
-                    # Piece can't move down - start lock delay
-                    self.current_piece.locking = True
-                self.drop_timer = 0
-            
-            # Check if piece should lock
-            if self.current_piece.update_lock_timer(dt):
-                self.lock_piece()
+            if self.bot:
+                self.update_bot(dt)
+            self.engine.tick(dt)
+            if self.solver and not self.engine.game_over:
+                self.update_hint()
+            if versus:
+                versus.flush(self.engine)
+            if self.engine.game_over or (versus and versus.winner is not None):
+                self.game_state = GAME_OVER
+                if self.record_dir and self.recorder:
+                    self.save_replay()
+                if self.leaderboard:
+                    self.record_score()
+    
+    def fall_offset(self, alpha):
+        """Pixels the falling piece is drawn below its cell for render interpolation"""
+        engine = self.engine
+        piece = engine.current_piece
+        if not self.interpolate or engine.locking or engine.get_ghost_position().y <= piece.y:
+            return 0
+        progress = (engine.drop_timer + alpha * FRAME_DT) / engine.gravity
+        return min(int(progress * self.block_size), self.block_size - 1)
+    
+    def update_hint(self):
+        """Ask the solver about each new position and pick up its answers"""
+        engine = self.engine
+        held = engine.held_piece.shape_idx if engine.held_piece else None
+        tag = (engine.piece_count, engine.current_piece.shape_idx, held)
+        if tag != self.hint_tag:
+            self.hint_tag = tag
+            self.hint = None
+            self.solver.submit(tag, engine_position(engine))
+        for answer_tag, solution in self.solver.poll():
+            if answer_tag == tag:
+                self.hint = solution
+    
+    def hint_cells(self):
+        """Where the hint puts the next piece, for BoardRenderer.set_hint"""
+        if self.hint is None or self.game_state != PLAYING:
+            return None
+        step = self.hint.steps[0]
+        placement = step.placement
+        return (step.shape_idx, PIECE_STATES[step.shape_idx][placement.rotation],
+                placement.x, placement.y)
+    
+    def update_bot(self, dt):
+        """Let the bot place each new piece once bot_delay has passed"""
+        self.bot_timer += dt
+        if self.engine.piece_count == self.bot_piece or self.bot_timer < self.bot_delay:
+            return
+        for action in self.bot.plan(self.engine):
+            self.act(action)
+        self.bot_piece = self.engine.piece_count
+        self.bot_timer = 0.0
     
-    def draw(self):
-        """Draw everything"""
+    def draw_dirty(self, alpha):
+        """Draw a PLAYING frame, updating only the regions that changed"""
+        engine = self.engine
+        full = self.drawn_state != PLAYING
+        if full:
+            # Coming back from the menu, pause or game over screen
+            self.renderer.draw_full(engine.board)
+            self.hud_key = None
+        
+        piece = engine.current_piece
+        dirty = self.renderer.draw_playfield(engine.board, piece, engine.get_ghost_position(),
+                                             self.fall_offset(alpha))
+        
+        held = engine.held_piece.shape_idx if engine.held_piece else None
+        hud_key = (engine.score, engine.level, engine.lines_cleared, engine.combo,
+                   piece.t_spin, engine.b2b, held,
+                   tuple(p.shape_idx for p in engine.next_pieces),
+                   self.telemetry.pieces, self.telemetry.judged, self.hint)
+        if self.versus:
+            hud_key += (tuple(b.version for b in self.versus.boards.values()),
+                        len(self.versus.out))
+        if hud_key != self.hud_key:
+            for rect in self.panel_rects:
+                self.screen.blit(self.renderer.static, rect, rect)
+            self.draw_info_panel()
+            dirty.extend(self.panel_rects)
+            self.hud_key = hud_key
+        
+        if self.frame_timer and self.show_frame_graph:
+            self.frame_timer.draw_graph(self.screen, self.graph_rect)
+            dirty.append(self.graph_rect)
+        
+        self.drawn_state = PLAYING
+        self.pending_update = None if full else dirty
+    
+    def draw(self, alpha=0.0):
+        """Draw everything; alpha is the fraction of a logic frame since the last update"""
+        self.renderer.follow(self.engine.current_piece)
+        if self.solver:
+            self.renderer.set_hint(self.hint_cells())
+        if self.dirty_rendering:
+            if self.game_state == PLAYING:
+                self.draw_dirty(alpha)
+                return
+            if self.game_state == self.drawn_state:
+                self.pending_update = []
+                return  # Menu, pause and game over screens are static
+        
         self.screen.fill(BLACK)
         
         if self.game_state == MENU:
@@ -508,100 +575,192 @@ class TetrisGame:
             self.draw_game_over()
         else:
             self.draw_grid()
+            self.renderer.blit_hint(self.screen)
             self.draw_info_panel()
             
             # Draw ghost piece
-            ghost = self.get_ghost_position()
-            ghost.draw(self.screen, ghost=True)
+            ghost = self.engine.get_ghost_position()
+            self.draw_piece(ghost, ghost=True)
             
             # Draw current piece
-            self.current_piece.draw(self.screen)
+            self.draw_piece(self.engine.current_piece, offset_y=self.fall_offset(alpha))
             
             if self.game_state == PAUSED:
                 self.draw_pause()
         
-        pygame.display.flip()
+        if self.frame_timer and self.show_frame_graph:
+            self.frame_timer.draw_graph(self.screen, self.graph_rect)
+        
+        self.drawn_state = self.game_state
+        self.pending_update = None
+    
+    def present(self):
+        """Push the frame drawn by draw() to the display"""
+        if self.pending_update is None:
+            pygame.display.flip()
+        elif self.pending_update:
+            pygame.display.update(self.pending_update)
     
     def run(self):
         """Main game loop"""
         running = True
-        last_time = time.time()
+        last_time = time.perf_counter()
+        lag = 0.0
+        timer = self.frame_timer
         
         while running:
-            current_time = time.time() 
-            dt = current_time - last_time
+            if timer:
+                timer.begin_frame()
+            current_time = time.perf_counter()
+            # Clamp long stalls so the logic doesn't try to catch up for seconds
+            dt = min(current_time - last_time, MAX_FRAME_TIME)
             last_time = current_time
             
             for event in pygame.event.get():
-             if event.type == pygame.QUIT:
-                 running = False
-             elif event.type == pygame.KEYDOWN:
-                 current_time = time.time()
-                 # Left Movement
-                 if event.key == pygame.K_LEFT:
-                     if current_time - self.current_piece.last_move_time > self.current_piece.move_cooldown:
-                         self.current_piece.move(-1, 0, self.grid)
-                         self.current_piece.last_move_time = current_time
-                         try:
-                             pygame.mixer.Sound(buffer=bytearray([64] * 500)).play()  # Low-pitched
-                         except:
-                             pass
-                 # Right Movement        
-                 elif event.key == pygame.K_RIGHT:
-                     if current_time - self.current_piece.last_move_time > self.current_piece.move_cooldown:
-                         self.current_piece.move(1, 0, self.grid)
-                         self.current_piece.last_move_time = current_time
-                         try:
-                             pygame.mixer.Sound(buffer=bytearray([64] * 500)).play()  # Low-pitched
-                         except:
-                             pass
-                 # Rotation
-                 elif event.key == pygame.K_UP:
-                     if current_time - self.current_piece.last_rotate_time > self.current_piece.rotate_cooldown:
-                         self.current_piece.rotate(self.grid)
-                         self.current_piece.last_rotate_time = current_time
-                         try:
-                             pygame.mixer.Sound(buffer=bytearray([128] * 1000)).play()  # Mid-pitched
-                         except:
-                             pass
-                 # Soft Drop (Down Key)
-                 elif event.key == pygame.K_DOWN:
-                     if current_time - self.current_piece.last_move_time > self.current_piece.move_cooldown:
-                         self.current_piece.move(0, 1, self.grid)
-                         self.current_piece.last_move_time = current_time
-                         try:
-                             pygame.mixer.Sound(buffer=bytearray([150] * 800)).play()  # Higher-pitched
-                         except:
-                             pass
-                 # Hard Drop (Space)
-                 elif event.key == pygame.K_SPACE:
-                     self.current_piece.hard_drop(self.grid)
-                     try:
-                         pygame.mixer.Sound(buffer=bytearray([200] * 1500)).play()  # Loudest/longest
-                     except:
-                         pass
-                 # ... rest of your key handling code
-                 elif event.key == pygame.K_c:
-                     self.hold_piece() # Hold current piece
-                 elif event.key == pygame.K_p:
-                     if self.game_state == PLAYING:
-                         self.game_state = PAUSED
-                     elif self.game_state == PAUSED:
-                         self.game_state = PLAYING
-                 elif event.key == pygame.K_RETURN:
-                     if self.game_state == MENU or self.game_state == GAME_OVER:
-                         if self.game_state == GAME_OVER:
-                             self.reset_game() # Reset game state
-                         self.game_state = PLAYING   
-                    
-                          
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    # Stamped as polled; pygame does not expose SDL's event times
+                    event_time = time.perf_counter()
+                    action = self.key_actions.get(event.key)
+                    # Gameplay keys only act on a running game
+                    if action is not None:
+                        if self.game_state == PLAYING:
+                            self.telemetry.key_press(action)
+                            if self.controls.key_down(action, event_time) and self.latency:
+                                self.latency.input(event_time)
+                    elif event.key == pygame.K_p and not self.versus:
+                        if self.game_state == PLAYING:
+                            self.game_state = PAUSED
+                            self.controls.reset()
+                        elif self.game_state == PAUSED:
+                            self.game_state = PLAYING
+                    elif event.key == pygame.K_RETURN and not self.versus:
+                        if self.game_state == MENU or self.game_state == GAME_OVER:
+                            if self.game_state == GAME_OVER:
+                                self.reset_game() # Reset game state
+                            self.game_state = PLAYING
+                elif event.type == pygame.KEYUP and event.key in self.key_actions:
+                    self.controls.key_up(self.key_actions[event.key], time.perf_counter())
             
-            self.update(dt)
-            self.draw()
-            self.clock.tick(60)
-        
+            # Auto-repeat of held keys, due times taken from the key events
+            if self.game_state == PLAYING:
+                self.controls.update(time.perf_counter(), self.engine.gravity)
+            
+            if timer:
+                timer.mark()
+            
+            # Game logic advances in whole FRAME_DT steps so replays are exact;
+            # rendering runs at its own rate and interpolates between steps
+            lag += dt
+            while lag >= FRAME_DT:
+                self.update(FRAME_DT)
+                lag -= FRAME_DT
+            if timer:
+                timer.mark()
+            self.draw(lag / FRAME_DT)
+            if timer:
+                timer.mark()
+            self.present()
+            if self.latency:
+                self.latency.presented(time.perf_counter())
+            if self.capture:
+                # Copied into the capture ring; encoding happens off the game loop
+                self.capture.capture(self.screen)
+            if timer:
+                timer.mark()
+            self.clock.tick(self.render_fps)
+        
+        if timer and self.frame_csv:
+            timer.dump_csv(self.frame_csv)
+        if self.versus:
+            self.versus.close()
+        if self.latency:
+            print(self.latency.report())
+        if self.telemetry.writer:
+            self.telemetry.writer.close()
+            if self.telemetry.writer.error:
+                print(f"telemetry: writing {self.telemetry.writer.path} failed: "
+                      f"{self.telemetry.writer.error}")
+        if self.capture:
+            self.capture.close()
+            print(self.capture.report())
+        if self.solver:
+            self.solver.close()
+        if self.leaderboard:
+            self.leaderboard.close()
+        if self.snapshot_path:
+            # Suspend an unfinished game; a finished one leaves nothing to resume
+            if self.game_state in (PLAYING, PAUSED):
+                self.save_snapshot(self.snapshot_path)
+            elif os.path.exists(self.snapshot_path):
+                os.remove(self.snapshot_path)
         pygame.quit()
 
 if __name__ == "__main__":
-    game = TetrisGame()
+    if sys.argv[1:2] == ["tournament"]:
+        # Headless bot games on a process pool: python main.py tournament --help
+        import tournament
+        sys.exit(tournament.main(sys.argv[2:]))
+    if sys.argv[1:2] == ["versus"]:
+        # Match server / loopback benchmark: python main.py versus --help
+        import versus
+        sys.exit(versus.main(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Advanced Tetris")
+    parser.add_argument("--record", metavar="DIR",
+                        help="save an input replay of every finished game to DIR")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="render frame rate cap (0 = uncapped)")
+    parser.add_argument("--interpolate", action="store_true",
+                        help="smooth the falling piece between gravity steps")
+    parser.add_argument("--profile-frames", action="store_true",
+                        help="show a per-phase frame-time graph")
+    parser.add_argument("--frame-csv", metavar="PATH",
+                        help="dump per-phase frame times to PATH on exit")
+    parser.add_argument("--bot", action="store_true",
+                        help="let the placement-search bot play")
+    parser.add_argument("--width", type=int, default=GRID_WIDTH, help="board width in cells")
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT, help="board height in cells")
+    parser.add_argument("--snapshot", metavar="PATH",
+                        help="resume the game saved in PATH and save it there again on exit")
+    parser.add_argument("--connect", metavar="HOST[:PORT]",
+                        help="play a versus match on the server at HOST")
+    parser.add_argument("--das", type=float, default=DAS * 1000,
+                        help="delayed auto shift in ms (default %(default).0f)")
+    parser.add_argument("--arr", type=float, default=ARR * 1000,
+                        help="auto repeat rate in ms, 0 = instant (default %(default).0f)")
+    parser.add_argument("--sdf", type=float, default=SOFT_DROP_FACTOR,
+                        help="soft drop speed as a multiple of gravity, 0 = instant")
+    parser.add_argument("--input-latency", action="store_true",
+                        help="print key-to-screen latency percentiles on exit")
+    parser.add_argument("--telemetry", metavar="PATH",
+                        help="log per-piece telemetry to PATH (.jsonl for JSON lines, else binary)")
+    parser.add_argument("--hints", action="store_true",
+                        help="show perfect clear and T-spin setup hints")
+    parser.add_argument("--scores", metavar="PATH",
+                        help="keep finished games and their replays in the leaderboard at PATH")
+    parser.add_argument("--capture", metavar="SPEC",
+                        help="record every frame: png:DIR, raw:DIR or pipe:COMMAND "
+                             "({width} {height} {fps} {pix_fmt} are filled in)")
+    args = parser.parse_args()
+    
+    client = None
+    if args.connect:
+        from versus import DEFAULT_PORT, VersusClient
+        host, _, port = args.connect.partition(":")
+        client = VersusClient(host, int(port or DEFAULT_PORT))
+        args.width, args.height = client.welcome.width, client.welcome.height
+        args.snapshot = None  # A match cannot be suspended
+    if args.snapshot and args.width > SNAPSHOT_MAX_WIDTH:
+        parser.error(f"--snapshot only supports boards up to {SNAPSHOT_MAX_WIDTH} cells wide")
+    
+    game = TetrisGame(record_dir=args.record, render_fps=args.fps,
+                      interpolate=args.interpolate, profile_frames=args.profile_frames,
+                      frame_csv=args.frame_csv, bot=PlacementBot() if args.bot else None,
+                      width=args.width, height=args.height, snapshot_path=args.snapshot,
+                      versus=client, das=args.das / 1000, arr=args.arr / 1000,
+                      soft_drop_factor=args.sdf, measure_latency=args.input_latency,
+                      telemetry_path=args.telemetry, capture=args.capture, hints=args.hints,
+                      scores_path=args.scores)
     game.run()
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""Tetrimino shapes and their precomputed rotation states.
+
+``PIECE_STATES[shape_idx][rotation]`` is built once at import time and
+holds everything the engine needs about one orientation of a piece, so
+rotating a piece is a table lookup instead of rebuilding its matrix.
+"""
+from collections import namedtuple
+
+from board import row_masks
+
+# Tetrimino shapes (spawn orientation)
+SHAPES = [
+    [[1, 1, 1, 1]],  # I
+    [[1, 1], [1, 1]],  # O
+    [[1, 1, 1], [0, 1, 0]],  # T
+    [[1, 1, 1], [1, 0, 0]],  # J
+    [[1, 1, 1], [0, 0, 1]],  # L
+    [[0, 1, 1], [1, 1, 0]],  # S
+    [[1, 1, 0], [0, 1, 1]]   # Z
+]
+
+I_PIECE = 0
+O_PIECE = 1
+T_PIECE = 2
+J_PIECE = 3
+L_PIECE = 4
+
+# Wall kick tests for a clockwise rotation out of each state (0->1, 1->2, 2->3, 3->0)
+JLSTZ_KICKS = (
+    ((0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)),
+    ((0, 0), (1, 0), (1, -1), (0, 2), (1, 2)),
+    ((0, 0), (1, 0), (1, 1), (0, -2), (1, -2)),
+    ((0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)),
+)
+
+I_KICKS = (
+    ((0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)),
+    ((0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)),
+    ((0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)),
+    ((0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)),
+)
+
+O_KICKS = (((0, 0),),) * 4
+
+# One orientation of a piece:
+#   cells          - (x, y) offsets of the filled cells
+#   width, height  - bounding box of the orientation
+#   masks          - one row bitmask per bounding-box row (see board.row_masks)
+#   bottoms        - lowest cell of every bounding-box column
+#   kicks          - kick tests for rotating clockwise out of this orientation
+#   tspin_corners  - the four diagonal neighbours of the T centre, () for other pieces
+PieceState = namedtuple(
+    "PieceState", "cells width height masks bottoms kicks tspin_corners")
+
+
+def _tspin_corners(cells):
+    """Corners around the T centre, i.e. the cell with three piece neighbours"""
+    cell_set = set(cells)
+    for cx, cy in cells:
+        neighbours = sum((cx + dx, cy + dy) in cell_set
+                         for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)))
+        if neighbours == 3:
+            return ((cx - 1, cy - 1), (cx + 1, cy - 1),
+                    (cx - 1, cy + 1), (cx + 1, cy + 1))
+    return ()
+
+
+def _build_states():
+    """Build the rotation table for every (shape_idx, rotation) pair"""
+    table = []
+    for shape_idx, shape in enumerate(SHAPES):
+        if shape_idx == I_PIECE:
+            kicks = I_KICKS
+        elif shape_idx == O_PIECE:
+            kicks = O_KICKS
+        else:
+            kicks = JLSTZ_KICKS
+
+        states = []
+        for rotation in range(4):
+            cells = tuple((x, y) for y, row in enumerate(shape)
+                          for x, cell in enumerate(row) if cell)
+            states.append(PieceState(
+                cells=cells,
+                width=len(shape[0]),
+                height=len(shape),
+                masks=row_masks(shape),
+                bottoms=tuple(max(y for cx, y in cells if cx == x)
+                              for x in range(len(shape[0]))),
+                kicks=kicks[rotation],
+                tspin_corners=_tspin_corners(cells) if shape_idx == T_PIECE else (),
+            ))
+            # Rotate the matrix clockwise for the next state
+            shape = [list(row) for row in zip(*shape[::-1])]
+        table.append(tuple(states))
+    return tuple(table)
+
+
+PIECE_STATES = _build_states()
+
+
+class Tetrimino:
+    # Slotted: pieces are reused through the engine's pool, and timing and
+    # lock state live in TetrisEngine / TetrisGame rather than per piece
+    __slots__ = ("shape_idx", "rotation", "state", "x", "y", "t_spin")
+
+    def __init__(self, shape_idx, x=0, y=0):
+        self.reset(shape_idx, x, y)
+
+    def reset(self, shape_idx, x=0, y=0):
+        """Turn this piece into a fresh, unrotated piece of the given shape"""
+        self.shape_idx = shape_idx
+        self.rotation = 0
+        self.state = PIECE_STATES[shape_idx][0]
+        self.x = x
+        self.y = y
+        self.t_spin = False
+        return self
+
+    def rotate(self, board):
+        """Rotate the tetrimino clockwise with wall kicks and T-spin detection"""
+        rotation = (self.rotation + 1) % 4
+        state = PIECE_STATES[self.shape_idx][rotation]
+
+        # Try each offset in the current rotation's kick table
+        for dx, dy in self.state.kicks:
+            x = self.x + dx
+            y = self.y + dy
+
+            if not board.collides(state.masks, x, y, state.width):
+                self.x = x
+                self.y = y
+                self.rotation = rotation
+                self.state = state
+
+                # T-spin if 3 or more corners around the T centre are filled
+                # (the flag is cleared again by any later successful move)
+                if state.tspin_corners:
+                    corners = 0
+                    for cx, cy in state.tspin_corners:
+                        if board.filled(x + cx, y + cy):
+                            corners += 1
+                    self.t_spin = corners >= 3
+                return True
+
+        # All kicks failed, the piece keeps its orientation
+        return False
+
+    def move(self, dx, dy, board):
+        """Move the tetrimino by dx, dy if possible"""
+        self.x += dx
+        self.y += dy
+
+        if self.collision(board):
+            self.x -= dx
+            self.y -= dy
+            return False
+
+        self.t_spin = False
+        return True
+
+    def hard_drop(self, board):
+        """Drop the piece instantly to the lowest possible position"""
+        y = board.drop_y(self.state, self.x, self.y)
+        if y != self.y:
+            self.y = y
+            self.t_spin = False
+
+    def collision(self, board):
+        """Check if the tetrimino collides with walls or other blocks"""
+        state = self.state
+        return board.collides(state.masks, self.x, self.y, state.width)
@@ -0,0 +1,262 @@
+"""Cached, dirty-rectangle renderer for the playfield.
+
+Everything that does not change between frames is drawn once: the
+background and border, one block sprite per color plus a ghost outline
+sprite, and a persistent copy of the locked stack that is only rebuilt
+when the board's version changes (lock or line clear).  Each frame the
+renderer restores the areas the falling piece and ghost used last frame,
+draws them at their new position and returns just those rectangles for
+``pygame.display.update``.
+
+An optional placement hint (see solver.py) is drawn into the static copy
+as translucent cells, so it costs nothing per frame and the falling
+piece passes over it like over the stack.
+
+Fields taller than the screen are shown through a scrolling viewport of
+``visible_rows`` rows that follows the falling piece; rows outside it are
+never drawn.
+"""
+from collections import OrderedDict
+
+import pygame
+
+GRID_LINE_COLOR = (50, 50, 50)
+BORDER_COLOR = (128, 128, 128)
+OUTLINE_COLOR = (255, 255, 255)
+
+
+class BoardRenderer:
+    def __init__(self, screen, colors, offset_x, offset_y, block_size,
+                 width, height, visible_rows=None):
+        self.screen = screen
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+        self.block_size = block_size
+        self.width = width
+        self.height = height
+        # Viewport: board rows view_top .. view_top + visible_rows are on screen
+        self.visible_rows = min(visible_rows or height, height)
+        self.view_top = height - self.visible_rows
+        self.grid_rect = pygame.Rect(offset_x, offset_y,
+                                     width * block_size, self.visible_rows * block_size)
+        # The closing grid lines sit one pixel past the right and bottom edge
+        self.field_rect = pygame.Rect(offset_x, offset_y,
+                                      self.grid_rect.width + 1, self.grid_rect.height + 1)
+
+        self.sprites = [self._block_sprite(color) for color in colors]
+        self.ghost_sprites = [self._ghost_sprite(color) for color in colors]
+        self.hint_sprites = [self._hint_sprite(color) for color in colors]
+        self.background = self._build_background()
+        self.grid_lines = self._build_grid_lines()
+
+        # Background plus locked blocks; what the screen looks like with no piece
+        self.static = self.background.copy()
+        self.stack_board = None
+        self.stack_version = None
+        self.stack_view = None
+        self.hint = None
+        self.piece_key = None
+        self.piece_rect = None
+
+    def _block_sprite(self, color):
+        s = pygame.Surface((self.block_size, self.block_size)).convert()
+        s.fill(color)
+        pygame.draw.rect(s, OUTLINE_COLOR, s.get_rect(), 1)
+        return s
+
+    def _ghost_sprite(self, color):
+        s = pygame.Surface((self.block_size, self.block_size), pygame.SRCALPHA).convert_alpha()
+        s.fill((0, 0, 0, 0))
+        pygame.draw.rect(s, color, s.get_rect(), 1)
+        return s
+
+    def _hint_sprite(self, color):
+        s = pygame.Surface((self.block_size, self.block_size), pygame.SRCALPHA).convert_alpha()
+        s.fill((0, 0, 0, 0))
+        inset = max(1, self.block_size // 6)
+        s.fill(color + (90,), s.get_rect().inflate(-2 * inset, -2 * inset))
+        return s
+
+    def _build_background(self):
+        background = pygame.Surface(self.screen.get_size()).convert()
+        background.fill((0, 0, 0))
+        pygame.draw.rect(background, BORDER_COLOR, self.grid_rect.inflate(4, 4), 0)
+        return background
+
+    def _build_grid_lines(self):
+        lines = pygame.Surface(self.field_rect.size, pygame.SRCALPHA).convert_alpha()
+        lines.fill((0, 0, 0, 0))
+        w, h, bs = self.grid_rect.width, self.grid_rect.height, self.block_size
+        for x in range(self.width + 1):
+            pygame.draw.line(lines, GRID_LINE_COLOR, (x * bs, 0), (x * bs, h))
+        for y in range(self.visible_rows + 1):
+            pygame.draw.line(lines, GRID_LINE_COLOR, (0, y * bs), (w, y * bs))
+        return lines
+
+    def stack_changed(self, board):
+        """True when the static surface no longer matches the board"""
+        return (board is not self.stack_board or board.version != self.stack_version
+                or self.view_top != self.stack_view)
+
+    def follow(self, piece):
+        """Scroll the viewport so the piece stays in view (rows, not pixels)"""
+        if self.visible_rows == self.height:
+            return
+        margin = self.visible_rows // 4
+        top = self.view_top
+        if piece.y < top + margin or piece.y + piece.state.height > top + self.visible_rows - margin:
+            # Re-centre with the piece in the upper third, so scrolling
+            # (and the full redraw it costs) happens in jumps
+            top = piece.y - self.visible_rows // 3
+        self.view_top = max(0, min(top, self.height - self.visible_rows))
+
+    def set_hint(self, hint):
+        """Mark a placement: (shape_idx, PieceState, x, y), or None for no hint"""
+        if hint != self.hint:
+            self.hint = hint
+            self.stack_board = None  # The hint lives in the static surface
+
+    def blit_hint(self, surface):
+        """Draw the hint cells that are in the viewport onto surface"""
+        if self.hint is None:
+            return
+        shape_idx, state, x, y = self.hint
+        bs = self.block_size
+        sprite = self.hint_sprites[shape_idx]
+        for cx, cy in state.cells:
+            row = y + cy - self.view_top
+            if 0 <= row < self.visible_rows:
+                surface.blit(sprite, (self.offset_x + (x + cx) * bs, self.offset_y + row * bs))
+
+    def invalidate(self):
+        """Forget what is on screen; the next frame redraws everything"""
+        self.stack_board = None
+        self.piece_key = None
+        self.piece_rect = None
+
+    def rebuild_stack(self, board):
+        """Redraw the locked blocks in the viewport into the static surface"""
+        self.static.blit(self.background, self.field_rect, self.field_rect)
+        bs = self.block_size
+        top = self.view_top
+        for y in range(top, top + self.visible_rows):
+            if not board.rows[y]:
+                continue
+            colors = board.colors[y]
+            pos_y = self.offset_y + (y - top) * bs
+            for x in range(self.width):
+                if colors[x]:
+                    self.static.blit(self.sprites[colors[x] - 1],
+                                     (self.offset_x + x * bs, pos_y))
+        self.blit_hint(self.static)
+        self.static.blit(self.grid_lines, self.field_rect)
+        self.stack_board = board
+        self.stack_version = board.version
+        self.stack_view = top
+
+    def piece_cells_rect(self, piece, offset_y=0):
+        """Screen rectangle covered by a piece's bounding box, cut to the field"""
+        bs = self.block_size
+        state = piece.state
+        rect = pygame.Rect(self.offset_x + piece.x * bs,
+                           self.offset_y + (piece.y - self.view_top) * bs + offset_y,
+                           state.width * bs, state.height * bs)
+        if self.visible_rows < self.height:
+            rect = rect.clip(self.grid_rect)
+        return rect
+
+    def blit_piece(self, piece, ghost=False, offset_y=0):
+        """Draw a piece from the cached sprites, offset_y pixels below its cell"""
+        bs = self.block_size
+        sprite = (self.ghost_sprites if ghost else self.sprites)[piece.shape_idx]
+        base_x = self.offset_x + piece.x * bs
+        base_y = self.offset_y + (piece.y - self.view_top) * bs + offset_y
+        if self.visible_rows == self.height:
+            for x, y in piece.state.cells:
+                self.screen.blit(sprite, (base_x + x * bs, base_y + y * bs))
+            return
+        # Cells scrolled out of the viewport are clipped away
+        clip = self.screen.get_clip()
+        self.screen.set_clip(self.grid_rect)
+        for x, y in piece.state.cells:
+            self.screen.blit(sprite, (base_x + x * bs, base_y + y * bs))
+        self.screen.set_clip(clip)
+
+    def draw_playfield(self, board, piece, ghost, offset_y=0):
+        """Bring the playfield up to date and return the rectangles that changed"""
+        dirty = []
+        if self.stack_changed(board):
+            self.rebuild_stack(board)
+            self.screen.blit(self.static, self.field_rect, self.field_rect)
+            dirty.append(self.field_rect)
+            self.piece_key = None
+
+        key = (piece.shape_idx, piece.rotation, piece.x, piece.y, ghost.y, offset_y)
+        if key == self.piece_key:
+            return dirty
+
+        rect = self.piece_cells_rect(piece, offset_y)
+        ghost_rect = self.piece_cells_rect(ghost)
+        # Either may be empty when scrolled out of the viewport
+        rect = rect.union(ghost_rect) if rect and ghost_rect else rect or ghost_rect
+        # Restore what was under the piece and ghost last frame
+        if self.piece_rect is not None:
+            self.screen.blit(self.static, self.piece_rect, self.piece_rect)
+            dirty.append(self.piece_rect)
+        self.screen.blit(self.static, rect, rect)
+
+        self.blit_piece(ghost, ghost=True)
+        self.blit_piece(piece, offset_y=offset_y)
+        dirty.append(rect)
+        self.piece_key = key
+        self.piece_rect = rect
+        return dirty
+
+    def draw_full(self, board):
+        """Draw the static background and stack to the whole screen"""
+        if self.stack_changed(board):
+            self.rebuild_stack(board)
+        self.screen.blit(self.static, (0, 0))
+        self.piece_key = None
+        self.piece_rect = None
+
+
+class SurfaceCache:
+    """Bounded LRU cache of rendered text and translucent overlay surfaces.
+
+    Text is keyed on (font, string, color), so a HUD label is only
+    rasterized again when the value it shows changes.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, build):
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = build()
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+    def text(self, font, string, color):
+        """Antialiased text surface for string in the given font and color"""
+        return self._get((font, string, color),
+                         lambda: font.render(string, True, color))
+
+    def overlay(self, size, rgba):
+        """Full-size translucent surface filled with rgba"""
+        def build():
+            s = pygame.Surface(size, pygame.SRCALPHA)
+            s.fill(rgba)
+            return s
+        return self._get(("overlay", size, rgba), build)
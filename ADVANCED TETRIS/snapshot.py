@@ -0,0 +1,118 @@
+"""Compact binary snapshots of a running game.
+
+``dump_state`` packs everything ``TetrisEngine`` needs to continue a game
+exactly (board, pieces, queue, bag, RNG state, score and timers) into a
+fixed-layout blob of a few hundred bytes, and ``load_state`` writes one
+back into an existing engine without allocating pieces.  Restoring a
+snapshot and continuing gives the same game as never having stopped, so
+snapshots can be used to suspend/resume, to fork positions for search and
+to deduplicate states (compare the bytes, or hash them).  Versus garbage
+is not part of a snapshot: a loaded game has none pending either way.
+
+Layout (little endian), fixed for a given board size::
+
+    header  "TSNP" magic, u8 version, u16 width, u16 height
+    state   u64 seed, u64 RNG state, u32 frame, f64 elapsed, drop timer,
+            lock timer and last clear time, u64 score, u32 level, lines,
+            i32 combo, u32 pieces, T-spins, B2B count, u8 flags
+    piece   current piece: u8 shape, u8 rotation, i16 x, i16 y, u8 t_spin
+    queue   u8 held shape (0xFF = none), 5 x u8 next shapes,
+            u8 bag size, 7 x u8 bag (zero padded)
+    board   row masks (1, 2, 4 or 8 bytes per row by width),
+            u16 column heights, width x height u8 colors
+"""
+import struct
+from array import array
+
+from board import Board
+from pieces import PIECE_STATES
+
+MAGIC = b"TSNP"
+VERSION = 1
+HEADER = struct.Struct("<4sBHH")
+STATE = struct.Struct("<QQIddddQIIiIIIB")
+PIECE = struct.Struct("<BBhhB")
+QUEUE = struct.Struct("<B5sB7s")
+NO_PIECE = 0xFF
+MAX_WIDTH = 64  # Widest board whose row masks fit the layout
+
+# Bits of the flags byte
+LOCKING = 1
+CAN_HOLD = 2
+B2B = 4
+GAME_OVER = 8
+
+
+def dump_state(engine):
+    """Serialize the engine's game into snapshot bytes"""
+    board = engine.board
+    piece = engine.current_piece
+    flags = ((engine.locking and LOCKING) | (engine.can_hold and CAN_HOLD)
+             | (engine.b2b and B2B) | (engine.game_over and GAME_OVER))
+    held = engine.held_piece.shape_idx if engine.held_piece else NO_PIECE
+    return b"".join((
+        HEADER.pack(MAGIC, VERSION, engine.width, engine.height),
+        STATE.pack(engine.seed, engine.rng.state, engine.frame, engine.elapsed,
+                   engine.drop_timer, engine.lock_timer, engine.last_clear_time,
+                   engine.score, engine.level, engine.lines_cleared, engine.combo,
+                   engine.piece_count, engine.t_spins, engine.b2b_count, flags),
+        PIECE.pack(piece.shape_idx, piece.rotation, piece.x, piece.y, piece.t_spin),
+        QUEUE.pack(held, bytes(p.shape_idx for p in engine.next_pieces),
+                   len(engine.bag), bytes(engine.bag)),
+        board.pack_rows(),
+        struct.pack(f"<{engine.width}H", *board.heights),
+        *board.colors,
+    ))
+
+
+def load_state(engine, data):
+    """Restore snapshot bytes into engine, reusing its board and pieces"""
+    magic, version, width, height = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a game snapshot (or unsupported version)")
+    pos = HEADER.size
+
+    (engine.seed, engine.rng.state, engine.frame, engine.elapsed, engine.drop_timer,
+     engine.lock_timer, engine.last_clear_time, engine.score, engine.level,
+     engine.lines_cleared, engine.combo, engine.piece_count, engine.t_spins,
+     engine.b2b_count, flags) = STATE.unpack_from(data, pos)
+    pos += STATE.size
+    engine.locking = bool(flags & LOCKING)
+    engine.can_hold = bool(flags & CAN_HOLD)
+    engine.b2b = bool(flags & B2B)
+    engine.game_over = bool(flags & GAME_OVER)
+    engine.gravity = engine.calculate_gravity()
+    engine.attack = 0
+    engine.garbage.clear()
+
+    shape_idx, rotation, x, y, t_spin = PIECE.unpack_from(data, pos)
+    pos += PIECE.size
+    held, next_shapes, bag_size, bag = QUEUE.unpack_from(data, pos)
+    pos += QUEUE.size
+
+    engine.release_pieces()
+    piece = engine.take_piece(shape_idx)
+    piece.rotation = rotation
+    piece.state = PIECE_STATES[shape_idx][rotation]
+    piece.x = x
+    piece.y = y
+    piece.t_spin = bool(t_spin)
+    engine.current_piece = piece
+    engine.held_piece = None if held == NO_PIECE else engine.take_piece(held)
+    engine.next_pieces = [engine.take_piece(shape) for shape in next_shapes]
+    engine.bag = list(bag[:bag_size])
+    engine.ghost_key = None
+
+    if (width, height) != (engine.width, engine.height):
+        engine.width = width
+        engine.height = height
+        engine.board = Board(width, height)
+    board = engine.board
+    size = height * array(board.row_typecode()).itemsize
+    board.unpack_rows(data[pos:pos + size])
+    pos += size
+    board.heights = list(struct.unpack_from(f"<{width}H", data, pos))
+    pos += 2 * width
+    for row in board.colors:
+        row[:] = data[pos:pos + width]
+        pos += width
@@ -0,0 +1,482 @@
+"""Perfect-clear and T-spin setup solver over the preview queue.
+
+``Solver.solve`` looks at a position (board, falling piece, hold and
+preview) and returns a ``Solution``: the pieces, holds and placements
+that reach either a perfect clear or a T-spin double/triple.  A perfect
+clear is preferred.  Everything works on row bitmasks with
+``ai.find_placements``, so placements are the ones the engine allows,
+including kicks, tucks and the T-spin corner rule of Tetrimino.rotate.
+No Tetrimino is ever copied.
+
+Perfect clears are searched depth first for every line count the pieces
+can fill.  A branch is cut as soon as it can no longer end empty:
+- a cell was placed above the lines being cleared
+- the pieces left cannot fill the empty cells (cell count)
+- an empty region's size is not a multiple of 4
+- an empty region is sealed off from above (hole reachability)
+- the pieces left cannot even out the empty cells between even and odd
+  columns (column parity; I, T, J and L are the only pieces that
+  cover a column pair unevenly)
+
+Region and reachability cuts assume that no region is opened up by a
+line clear later in the sequence, so the rare solution that needs one
+is not found.  T-spin setups are searched breadth first over up to
+``setup_depth`` pieces.  Each level keeps the ``setup_beam`` boards that
+add at most ``SETUP_HOLES`` covered cells (room for the
+slot) and are closest to a T-spin double slot.  The shallowest level
+where the T can spin into a double or triple wins.
+
+Results are cached per position, and so is every suffix of a solution.
+Following a hint therefore finds the rest of the solution in the cache
+on the next piece.  ``SolverWorker`` runs a Solver in its own process
+and the game polls it for answers, so a search never costs a frame.
+
+Usage: python solver.py [SNAPSHOT ...] [--seed S --pieces N]
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+from collections import namedtuple
+
+from ai import PlacementBot, SearchTimeout, board_features, find_placements, place_and_clear
+from board import zobrist_hash, zobrist_keys
+from engine import FRAME_DT, TetrisEngine, position_key
+from pieces import I_PIECE, J_PIECE, L_PIECE, PIECE_STATES, T_PIECE
+from snapshot import load_state
+from transposition import TranspositionTable
+
+PERFECT_CLEAR = "pc"
+T_SPIN_DOUBLE = "tsd"
+T_SPIN_TRIPLE = "tst"
+
+MAX_PC_LINES = 4  # Tallest perfect clear searched for
+SETUP_DEPTH = 3  # Pieces placed before the T-spin, at most
+SETUP_BEAM = 8  # Setup boards kept per level
+SETUP_HOLES = 3  # Covered empty cells a setup may add (the slot's overhang)
+TIME_BUDGET = 1.0  # Seconds per search; an unfinished search is not cached
+
+# What the searched pieces may do: the falling piece, the hold slot, the
+# preview (shape indices) and whether hold is still allowed for this piece
+Position = namedtuple("Position", "rows width height zobrist current start held preview can_hold")
+
+# One piece of a solution: hold is True when it is played by holding first
+Step = namedtuple("Step", "shape_idx hold placement lines")
+Solution = namedtuple("Solution", "kind steps")
+
+# Most even/odd column imbalance one piece can cover (I vertical, T vertical, J/L any)
+COLUMN_IMBALANCE = {I_PIECE: 4, T_PIECE: 2, J_PIECE: 2, L_PIECE: 2}
+UNEVEN_PIECES = (T_PIECE, J_PIECE, L_PIECE)  # Change the imbalance by 2 (mod 4)
+
+NO_SOLUTION = ()  # Cached for positions searched to the end without one
+
+
+def engine_position(engine):
+    """The Position of a running game"""
+    piece = engine.current_piece
+    return Position(list(engine.board.rows), engine.width, engine.height, engine.board.zobrist,
+                    piece.shape_idx, (piece.x, piece.y, piece.rotation),
+                    engine.held_piece.shape_idx if engine.held_piece else None,
+                    tuple(p.shape_idx for p in engine.next_pieces), engine.can_hold)
+
+
+def choices(seq, i, held, can_hold):
+    """(shape, uses hold, next index, next held) for each way to play piece i"""
+    result = [(seq[i], False, i + 1, held)]
+    if can_hold:
+        if held is None:
+            if i + 1 < len(seq):
+                result.append((seq[i + 1], True, i + 2, seq[i]))
+        elif held != seq[i]:
+            result.append((held, True, i + 1, seq[i]))
+    return result
+
+
+def covered_cells(rows):
+    """Empty cells with a filled cell somewhere above them"""
+    covered = 0
+    count = 0
+    for row in rows:
+        count += bin(covered & ~row).count("1")
+        covered |= row
+    return count
+
+
+def regions_fillable(rows, width, lines):
+    """Every empty region of the bottom lines rows is open above and a multiple of 4"""
+    # The zone as one integer, width + 1 bits per row: the spare bit is
+    # never empty, so shifting by one cannot leak into the next row
+    stride = width + 1
+    full = (1 << width) - 1
+    empty = 0
+    open_cells = 0
+    covered = 0
+    for k, row in enumerate(rows[len(rows) - lines:]):
+        free = full & ~row
+        empty |= free << (k * stride)
+        open_cells |= (free & ~covered) << (k * stride)
+        covered |= row
+    while empty:
+        region = empty & -empty
+        while True:
+            grown = (region | region << 1 | region >> 1
+                     | region << stride | region >> stride) & empty
+            if grown == region:
+                break
+            region = grown
+        if bin(region).count("1") % 4 or not region & open_cells:
+            return False
+        empty &= ~region
+    return True
+
+
+def parity_possible(rows, width, lines, pieces):
+    """Whether pieces can fill the zone's even and odd columns alike"""
+    even = int("01" * ((width + 1) // 2), 2) & ((1 << width) - 1)  # Bits 0, 2, 4, ...
+    imbalance = 0
+    for row in rows[len(rows) - lines:]:
+        free = ~row & ((1 << width) - 1)
+        imbalance += bin(free & even).count("1") - bin(free & ~even).count("1")
+    imbalance = abs(imbalance)
+    if imbalance > sum(COLUMN_IMBALANCE.get(p, 0) for p in pieces):
+        return False
+    return imbalance % 4 == 0 or any(p in UNEVEN_PIECES for p in pieces)
+
+
+def slot_distance(rows, width, height):
+    """Fewest cells missing from a T-spin double slot anywhere on the board.
+
+    With clockwise-only rotation and these kick tables, the double that
+    can be spun in is the stem-up T (rotation 2): its stem fills the only
+    hole of one row, its flat side the three-wide gap of the row below,
+    and it has to kick in under an overhang to the right of the stem.
+    """
+    full = (1 << width) - 1
+    best = 2 * width
+    for y in range(1, height - 1):
+        above, top, bottom = rows[y - 1], rows[y], rows[y + 1]
+        if not top and not bottom:
+            continue
+        for x in range(width - 2):
+            stem = 2 << x
+            flat = 7 << x
+            if top & stem or bottom & flat or above & (3 << x):
+                continue
+            missing = (bin(full & ~top & ~stem).count("1")
+                       + bin(full & ~bottom & ~flat).count("1")
+                       + (not above & (4 << x)))
+            best = min(best, missing)
+    return best
+
+
+def setup_score(rows, width, height):
+    """Closest to a T-spin double slot, then flattest (higher is better)"""
+    f = board_features(rows, width, height, 0, 0)
+    return -4 * slot_distance(rows, width, height) - f.bumpiness - 0.5 * f.aggregate_height
+
+
+class Solver:
+    def __init__(self, max_pc_lines=MAX_PC_LINES, setup_depth=SETUP_DEPTH,
+                 setup_beam=SETUP_BEAM, time_budget=TIME_BUDGET,
+                 cache_bytes=8 * 1024 * 1024):
+        self.max_pc_lines = max_pc_lines
+        self.setup_depth = setup_depth
+        self.setup_beam = setup_beam
+        self.time_budget = time_budget
+        # (kind, position key, pieces used after the current one, can hold) ->
+        # Solution, or NO_SOLUTION under the whole preview
+        self.cache = TranspositionTable(cache_bytes, "lru", _entry_size)
+        self.nodes = 0  # Placements tried by the last search
+
+    def solve(self, position):
+        """Best Solution for the position (perfect clear first), or None"""
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.time_budget
+        for kind, search in ((PERFECT_CLEAR, self.perfect_clear), ("tspin", self.t_spin)):
+            solution = self.cached(kind, position)
+            if solution is None:
+                try:
+                    solution = search(position)
+                except SearchTimeout:
+                    continue  # Not cached: the next request may get further
+                self.store(kind, position, solution)
+            if solution:
+                return solution
+        return None
+
+    def cached(self, kind, position):
+        """Cached answer for a position: a Solution, NO_SOLUTION or None"""
+        pk = position_key(position.zobrist, position.current, position.held)
+        preview = tuple(position.preview)
+        found = self.cache.get((kind, pk, preview, position.can_hold))
+        if found is not None:
+            return found
+        # A solution cached for a shorter preview (e.g. the rest of a solution)
+        for n in range(len(preview)):
+            found = self.cache.get((kind, pk, preview[:n], position.can_hold))
+            if found:
+                return found
+        return None
+
+    def store(self, kind, position, solution):
+        """Cache a search result, and the remaining steps after every step"""
+        preview = tuple(position.preview)
+        if not solution:
+            pk = position_key(position.zobrist, position.current, position.held)
+            self.cache.put((kind, pk, preview, position.can_hold), NO_SOLUTION)
+            return
+        # Replay the steps for the position before each one
+        seq = (position.current,) + preview
+        keys = zobrist_keys(position.width, position.height)
+        rows, zhash, i, held = position.rows, position.zobrist, 0, position.held
+        states = []
+        for step in solution.steps:
+            states.append((zhash, i, held))
+            if step.hold:
+                i, held = (i + 2 if held is None else i + 1), seq[i]
+            else:
+                i += 1
+            rows, _ = place_and_clear(rows, position.width, step.shape_idx, step.placement)
+            zhash = zobrist_hash(keys, rows)
+        # Each suffix needs only the pieces up to the last one the solution plays
+        for k, (zhash, start, held) in enumerate(states):
+            can_hold = position.can_hold if k == 0 else True
+            key = (kind, position_key(zhash, seq[start], held), seq[start + 1:i], can_hold)
+            self.cache.put(key, Solution(solution.kind, solution.steps[k:]))
+
+    def check_deadline(self):
+        self.nodes += 1
+        if self.nodes & 63 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def placements(self, rows, width, height, shape_idx, start):
+        """(placement, rows after it, lines cleared) for a piece from start or spawn"""
+        if start is None:
+            x, y, rotation = width // 2 - PIECE_STATES[shape_idx][0].width // 2, 0, 0
+        else:
+            x, y, rotation = start
+        result = []
+        for placement in find_placements(rows, width, height, shape_idx, x, y, rotation):
+            new_rows, lines = place_and_clear(rows, width, shape_idx, placement)
+            result.append((placement, new_rows, lines))
+        return result
+
+    def perfect_clear(self, position):
+        """Shortest perfect clear within the preview, or NO_SOLUTION"""
+        rows, width, height = position.rows, position.width, position.height
+        seq = (position.current,) + tuple(position.preview)
+        filled = sum(bin(row).count("1") for row in rows)
+        stack = height - next((y for y, row in enumerate(rows) if row), height)
+        for lines in range(max(stack, 1), self.max_pc_lines + 1):
+            empty = width * lines - filled
+            if empty <= 0 or empty % 4 or empty // 4 > len(seq):
+                continue
+            if not (regions_fillable(rows, width, lines)
+                    and parity_possible(rows, width, lines, seq + (position.held,))):
+                continue
+            failed = set()
+            steps = self.clear_lines(rows, width, height, lines, seq, 0, position.held,
+                                     position.can_hold, position.start, failed)
+            if steps is not None:
+                return Solution(PERFECT_CLEAR, tuple(steps))
+        return NO_SOLUTION
+
+    def clear_lines(self, rows, width, height, lines, seq, i, held, can_hold, start, failed):
+        """Steps that empty the bottom lines rows exactly, or None"""
+        top = height - lines
+        for shape_idx, hold, next_i, next_held in choices(seq, i, held, can_hold):
+            # Low placements first: they are the ones that complete lines
+            options = self.placements(rows, width, height, shape_idx, None if hold else start)
+            options.sort(key=lambda option: -option[0].y)
+            for placement, new_rows, cleared in options:
+                self.check_deadline()
+                if placement.y < top:
+                    continue  # Above the lines being cleared
+                left = lines - cleared
+                if left == 0:
+                    if not any(new_rows):
+                        return [Step(shape_idx, hold, placement, cleared)]
+                    continue
+                pieces = seq[next_i:]
+                empty = width * left - sum(bin(row).count("1") for row in new_rows)
+                if empty // 4 > len(pieces):
+                    continue
+                key = (tuple(new_rows[height - left:]), next_i, next_held)
+                if key in failed:
+                    continue
+                if (regions_fillable(new_rows, width, left)
+                        and parity_possible(new_rows, width, left, pieces + (next_held,))):
+                    steps = self.clear_lines(new_rows, width, height, left, seq, next_i,
+                                             next_held, True, None, failed)
+                    if steps is not None:
+                        return [Step(shape_idx, hold, placement, cleared)] + steps
+                failed.add(key)
+        return None
+
+    def t_spin(self, position):
+        """Shortest T-spin double or triple setup within the preview, or NO_SOLUTION"""
+        width, height = position.width, position.height
+        seq = (position.current,) + tuple(position.preview)
+        max_holes = covered_cells(position.rows) + SETUP_HOLES
+        # Beam nodes: (rows, next piece index, held, can hold, start, steps so far)
+        beam = [(position.rows, 0, position.held, position.can_hold, position.start, ())]
+        for depth in range(self.setup_depth + 1):
+            best = None
+            for rows, i, held, can_hold, start, steps in beam:
+                for shape_idx, hold, _, _ in choices(seq, i, held, can_hold):
+                    if shape_idx != T_PIECE:
+                        continue
+                    for placement, _, lines in self.placements(rows, width, height, shape_idx,
+                                                               None if hold else start):
+                        self.check_deadline()
+                        if placement.t_spin and lines >= 2 and (best is None or lines > best[-1].lines):
+                            best = steps + (Step(shape_idx, hold, placement, lines),)
+            if best is not None:
+                return Solution(T_SPIN_TRIPLE if best[-1].lines == 3 else T_SPIN_DOUBLE, best)
+            if depth == self.setup_depth:
+                break
+
+            children = {}
+            for rows, i, held, can_hold, start, steps in beam:
+                for shape_idx, hold, next_i, next_held in choices(seq, i, held, can_hold):
+                    if next_i >= len(seq):
+                        continue  # Nothing left in the preview to play the T from
+                    for placement, new_rows, lines in self.placements(
+                            rows, width, height, shape_idx, None if hold else start):
+                        self.check_deadline()
+                        if new_rows[0] or covered_cells(new_rows) > max_holes:
+                            continue
+                        key = (tuple(new_rows), next_i, next_held)
+                        if key not in children:
+                            children[key] = (setup_score(new_rows, width, height),
+                                             (new_rows, next_i, next_held, True, None,
+                                              steps + (Step(shape_idx, hold, placement, lines),)))
+            ranked = sorted(children.values(), key=lambda child: child[0], reverse=True)
+            beam = [node for _, node in ranked[:self.setup_beam]]
+            if not beam:
+                break
+        return NO_SOLUTION
+
+
+def _entry_size(solution):
+    """Rough bytes held by one cache entry"""
+    if not solution:
+        return 64
+    return 128 + sum(120 + 8 * len(step.placement.actions) for step in solution.steps)
+
+
+def _serve(conn, options):
+    """Worker process: answer the newest request, skipping those overtaken"""
+    solver = Solver(**options)
+    while True:
+        request = conn.recv()
+        while request is not None and conn.poll():
+            request = conn.recv()
+        if request is None:
+            return
+        tag, position = request
+        conn.send((tag, solver.solve(position)))
+
+
+class SolverWorker:
+    """A Solver in its own process; the game submits positions and polls"""
+
+    def __init__(self, **options):
+        # Spawned, not forked: the game has already initialised SDL
+        context = multiprocessing.get_context("spawn")
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, options),
+                                       name="solver", daemon=True)
+        self.process.start()
+        child.close()
+
+    def submit(self, tag, position):
+        """Ask for a solution of position; the answer comes back with tag"""
+        if self.conn is not None:
+            try:
+                self.conn.send((tag, position))
+            except OSError:
+                self.conn = None  # The worker died; the game goes on without hints
+
+    def poll(self):
+        """(tag, Solution or None) answers that arrived since the last poll"""
+        answers = []
+        try:
+            while self.conn is not None and self.conn.poll():
+                answers.append(self.conn.recv())
+        except (OSError, EOFError):
+            self.conn = None
+        return answers
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()  # Still deep in a search
+            self.process.join()
+
+
+def describe(solution):
+    """Short text for a solution, e.g. PC in 5: I O T S (hold) Z"""
+    if not solution:
+        return "no perfect clear or T-spin setup"
+    names = "IOTJLSZ"
+    pieces = " ".join(names[step.shape_idx] + (" (hold)" if step.hold else "")
+                      for step in solution.steps)
+    return f"{solution.kind.upper()} in {len(solution.steps)}: {pieces}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perfect clear / T-spin setup solver")
+    parser.add_argument("snapshots", nargs="*", metavar="SNAPSHOT",
+                        help="game snapshots (see snapshot.py) to solve")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="without snapshots: solve every position of a bot game")
+    parser.add_argument("--pieces", type=int, default=100, help="pieces of the bot game")
+    parser.add_argument("--budget", type=float, default=TIME_BUDGET,
+                        help="seconds per search (default %(default)s)")
+    parser.add_argument("--depth", type=int, default=SETUP_DEPTH, help="T-spin setup pieces")
+    args = parser.parse_args(argv)
+
+    solver = Solver(setup_depth=args.depth, time_budget=args.budget)
+    if args.snapshots:
+        engine = TetrisEngine()
+        for path in args.snapshots:
+            with open(path, "rb") as f:
+                load_state(engine, f.read())
+            start = time.perf_counter()
+            solution = solver.solve(engine_position(engine))
+            print(f"{path}: {describe(solution)} "
+                  f"({(time.perf_counter() - start) * 1000:.1f} ms, {solver.nodes} placements)")
+        return 0
+
+    # Every position of a bot game, solved like the game's worker would
+    engine = TetrisEngine(seed=args.seed)
+    bot = PlacementBot(time_budget=float("inf"))
+    found = {}
+    times = []
+    while not engine.game_over and engine.piece_count < args.pieces:
+        start = time.perf_counter()
+        solution = solver.solve(engine_position(engine))
+        times.append(time.perf_counter() - start)
+        kind = solution.kind if solution else "none"
+        found[kind] = found.get(kind, 0) + 1
+        pieces = engine.piece_count
+        for action in bot.plan(engine):
+            engine.step(action)
+        while engine.piece_count == pieces and not engine.game_over:
+            engine.tick(FRAME_DT)
+    times.sort()
+    print(f"{len(times)} positions: " + " ".join(f"{k}={n}" for k, n in sorted(found.items())))
+    print(f"search ms p50={times[len(times) // 2] * 1000:.1f} "
+          f"p90={times[len(times) * 9 // 10] * 1000:.1f} max={times[-1] * 1000:.1f}, "
+          f"cache hit rate {solver.cache.stats()['hit_rate']:.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Preloaded sound effects played through a fixed channel pool.
+
+All effects are synthesized once when the bank is created, so the input
+path only hands an existing Sound to the next channel in the pool.  A
+disabled bank (or one created where no audio device exists) turns every
+call into a no-op, which is what headless runs use.
+"""
+import pygame
+
+# name -> (sample value, sample count) of the raw 8-bit effect buffers
+EFFECTS = {
+    "move": (64, 500),  # Low-pitched
+    "rotate": (128, 1000),  # Mid-pitched
+    "soft_drop": (150, 800),  # Higher-pitched
+    "hard_drop": (200, 1500),  # Loudest/longest
+}
+
+
+class SoundBank:
+    def __init__(self, enabled=True, channels=4):
+        self.enabled = False
+        self.sounds = {}
+        self.channels = []
+        self.next_channel = 0
+        if not enabled:
+            return
+
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            pygame.mixer.set_reserved(channels)
+            self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+            for name, (value, length) in EFFECTS.items():
+                self.sounds[name] = pygame.mixer.Sound(buffer=bytes([value]) * length)
+        except pygame.error:
+            # No audio device; keep running silently
+            self.sounds = {}
+            self.channels = []
+            return
+        self.enabled = True
+
+    def play(self, name):
+        """Play a preloaded effect on the next channel of the pool"""
+        if not self.enabled:
+            return
+        channel = self.channels[self.next_channel]
+        self.next_channel = (self.next_channel + 1) % len(self.channels)
+        channel.play(self.sounds[name])
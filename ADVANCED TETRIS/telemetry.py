@@ -0,0 +1,250 @@
+"""Per-piece gameplay telemetry and its background log writer.
+
+``Telemetry`` is attached to a TetrisEngine as its observer and is told
+about every key press by the game.  For each placed piece it records:
+- where the piece went
+- the line clear it made (clear type, T-spin, back-to-back, combo)
+- the attack that clear sends
+- the keys pressed for it against the finesse optimum
+- the time from spawn to lock
+
+It also keeps the live PPS, APM and finesse fault count shown on the HUD.
+
+Finesse is judged against the fewest presses that reach the same cells
+on an empty board with this game's controls: a tap left or right, a DAS
+to the wall, a clockwise rotation, then the hard drop.  Pieces that were
+soft dropped, that did not come straight down (tucks and spins), or that
+were placed without a key press (by the bot), are not judged.
+
+The game thread only appends a tuple to a queue.  ``TelemetryWriter``
+formats and writes the tuples on its own thread, so disk I/O never
+blocks the game loop.  If writing fails (disk full, say), the writer
+keeps the error, stops and drops further records.  Logs are JSON lines (``.jsonl``) or a compact
+binary format:
+
+    record  u8 kind, then
+      GAME   u64 seed, u16 width, u16 height
+      PIECE  u32 piece, f64 game time, u8 shape, u8 rotation, i16 x,
+             i16 y, u8 lines, u8 T-spin, u8 B2B, i16 combo, u8 attack,
+             u8 inputs, u8 optimal inputs (255 = not judged),
+             f32 seconds to place
+"""
+import json
+import queue
+import struct
+import threading
+from collections import deque
+
+from board import Board
+from engine import HOLD, SOFT_DROP, attack_lines
+from pieces import PIECE_STATES, SHAPES, Tetrimino
+
+MAGIC = b"TTEL"
+VERSION = 1
+GAME = 0
+PIECE = 1
+HEADER = struct.Struct("<4sB")
+GAME_RECORD = struct.Struct("<BQHH")
+PIECE_RECORD = struct.Struct("<BIdBBhhBBBhBBBf")
+NOT_JUDGED = 255
+
+CLEAR_NAMES = {0: "none", 1: "single", 2: "double", 3: "triple", 4: "tetris"}
+
+# Optimal finesse per board width: FINESSE[width][shape_idx][footprint] = presses
+FINESSE = {}
+
+
+def footprint(state, x):
+    """Columns and shape of a placement, independent of its height"""
+    top = min(cy for _, cy in state.cells)
+    return frozenset((x + cx, cy - top) for cx, cy in state.cells)
+
+
+def finesse_table(width):
+    """Fewest presses (hard drop included) per footprint, for every shape"""
+    table = FINESSE.get(width)
+    if table is not None:
+        return table
+    board = Board(width, 4)
+    table = []
+    for shape_idx in range(len(SHAPES)):
+        piece = Tetrimino(shape_idx)
+        start = (0, width // 2 - piece.state.width // 2, 0)
+        dist = {start: 0}
+        todo = deque([start])
+        best = {}
+        while todo:
+            pos = todo.popleft()
+            rotation, x, y = pos
+            key = footprint(PIECE_STATES[shape_idx][rotation], x)
+            best[key] = min(best.get(key, 99), dist[pos] + 1)
+            for press in ("left", "right", "das_left", "das_right", "rotate"):
+                piece.rotation, piece.x, piece.y = pos
+                piece.state = PIECE_STATES[shape_idx][rotation]
+                if press == "rotate":
+                    piece.rotate(board)
+                else:
+                    dx = -1 if press.endswith("left") else 1
+                    if press.startswith("das"):
+                        while piece.move(dx, 0, board):
+                            pass
+                    else:
+                        piece.move(dx, 0, board)
+                new = (piece.rotation, piece.x, piece.y)
+                if new not in dist:
+                    dist[new] = dist[pos] + 1
+                    todo.append(new)
+        table.append(best)
+    FINESSE[width] = table
+    return table
+
+
+class Telemetry:
+    def __init__(self, writer=None):
+        self.writer = writer  # TelemetryWriter or None for live metrics only
+        self.engine = None
+
+    def start(self, engine):
+        """Begin a new game on engine (also attaches as its observer)"""
+        self.engine = engine
+        engine.observer = self
+        self.finesse = finesse_table(engine.width)
+        self.pieces = 0
+        self.attack = 0
+        self.keys = 0
+        self.judged = 0
+        self.faults = 0
+        self.pps = 0.0
+        self.apm = 0.0
+        self.new_piece(engine)
+        if self.writer:
+            self.writer.put((GAME, engine.seed, engine.width, engine.height))
+
+    def new_piece(self, engine):
+        self.spawn_time = engine.elapsed
+        self.inputs = 0
+        self.soft_dropped = False
+
+    def key_press(self, action):
+        """A gameplay key was pressed (auto-repeat does not count)"""
+        if action == HOLD:
+            return
+        self.keys += 1
+        self.inputs += 1
+        if action == SOFT_DROP:
+            self.soft_dropped = True
+
+    def piece_held(self, engine):
+        # Presses before the hold were for the other piece
+        self.inputs = 0
+        self.soft_dropped = False
+
+    def piece_locking(self, engine, piece):
+        # Judged only if the piece came straight down from the top
+        self.straight = engine.board.drop_y(piece.state, piece.x, 0) == piece.y
+        self.b2b_count = engine.b2b_count
+
+    def piece_locked(self, engine, piece, lines):
+        b2b = engine.b2b_count != self.b2b_count
+        attack = attack_lines(lines, piece.t_spin, b2b, engine.combo) if lines else 0
+        optimal = NOT_JUDGED
+        if self.inputs and self.straight and not self.soft_dropped:
+            optimal = self.finesse[piece.shape_idx].get(footprint(piece.state, piece.x),
+                                                        NOT_JUDGED)
+            if optimal != NOT_JUDGED:
+                self.judged += 1
+                self.faults += self.inputs > optimal
+
+        self.pieces += 1
+        self.attack += attack
+        now = engine.elapsed
+        if now > 0:
+            self.pps = self.pieces / now
+            self.apm = self.attack * 60 / now
+        if self.writer:
+            self.writer.put((PIECE, self.pieces, now, piece.shape_idx, piece.rotation,
+                             piece.x, piece.y, lines, piece.t_spin, b2b, engine.combo,
+                             attack, min(self.inputs, 254), optimal, now - self.spawn_time))
+        self.new_piece(engine)
+
+
+class TelemetryWriter:
+    """Writes telemetry records to path from a background thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self.jsonl = path.endswith(".jsonl")
+        self.queue = queue.SimpleQueue()  # put() never blocks
+        self.file = open(path, "w" if self.jsonl else "wb")
+        if not self.jsonl:
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.error = None  # Set by the thread if writing failed
+        # Daemon, so a game that dies without close() can still exit
+        self.thread = threading.Thread(target=self.run, name="telemetry-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, record):
+        if self.error is None:  # Nothing reads the queue once the thread stopped
+            self.queue.put(record)
+
+    def run(self):
+        get = self.queue.get
+        while True:
+            batch = [get()]
+            while not self.queue.empty():
+                batch.append(get())
+            done = batch[-1] is None
+            try:
+                self.file.write(self.encode([r for r in batch if r is not None]))
+                self.file.flush()
+            except (OSError, ValueError) as e:  # ValueError: the file was closed
+                self.error = e
+                done = True
+            if done:
+                try:
+                    self.file.close()
+                except OSError as e:
+                    self.error = self.error or e
+                return
+
+    def encode(self, records):
+        if self.jsonl:
+            return "".join(json.dumps(self.as_dict(r)) + "\n" for r in records)
+        return b"".join(GAME_RECORD.pack(*r) if r[0] == GAME else PIECE_RECORD.pack(*r)
+                        for r in records)
+
+    def as_dict(self, record):
+        if record[0] == GAME:
+            _, seed, width, height = record
+            return {"event": "game", "seed": seed, "width": width, "height": height}
+        (_, index, t, shape, rotation, x, y, lines, t_spin, b2b, combo, attack,
+         inputs, optimal, place_time) = record
+        clear = CLEAR_NAMES.get(lines, "none")
+        if t_spin:
+            clear = "tspin_" + clear
+        return {"event": "piece", "piece": index, "time": round(t, 4), "shape": shape,
+                "rotation": rotation, "x": x, "y": y, "lines": lines, "clear": clear,
+                "t_spin": bool(t_spin), "b2b": bool(b2b), "combo": combo, "attack": attack,
+                "inputs": inputs, "optimal": None if optimal == NOT_JUDGED else optimal,
+                "place_time": round(place_time, 4)}
+
+    def close(self):
+        """Write what is queued and stop the thread"""
+        self.queue.put(None)
+        self.thread.join()
+
+
+def read_log(path):
+    """Records of a binary telemetry log as tuples (kind first)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a telemetry log (or unsupported version)")
+    pos = HEADER.size
+    records = []
+    while pos < len(data):
+        record = GAME_RECORD if data[pos] == GAME else PIECE_RECORD
+        records.append(record.unpack_from(data, pos))
+        pos += record.size
+    return records
@@ -0,0 +1,28 @@
+import time
+
+import pytest
+
+from ai import PlacementBot, SearchTimeout, find_placements
+from engine import HARD_DROP, HOLD, TetrisEngine
+from pieces import T_PIECE
+
+
+def test_find_placements_stops_at_deadline():
+    rows = [0] * 20
+    assert find_placements(rows, 10, 20, T_PIECE, 4, 0, deadline=time.perf_counter() + 60)
+    with pytest.raises(SearchTimeout):
+        find_placements(rows, 10, 20, T_PIECE, 4, 0, deadline=time.perf_counter() - 1)
+
+
+def test_plan_without_time_plays_current_piece():
+    engine = TetrisEngine(seed=1)
+    actions = PlacementBot(time_budget=0).plan(engine)
+    # Only the current piece's own placements are searched once time is up
+    assert actions[-1] == HARD_DROP and HOLD not in actions
+
+
+def test_timed_out_search_is_dropped():
+    engine = TetrisEngine(seed=1)
+    # The hold search ran out of time: the plan is the one made without hold
+    quick = PlacementBot(depth=1, time_budget=0).plan(engine)
+    assert PlacementBot(depth=1, use_hold=False, time_budget=60).plan(engine) == quick
@@ -0,0 +1,27 @@
+from controls import InputHandler
+from engine import FRAME_DT, HARD_DROP, MOVE_LEFT, TetrisEngine
+
+
+def test_held_direction_does_not_move_a_hard_dropped_piece():
+    engine = TetrisEngine(seed=3)
+    board = engine.board
+    # A two-row ledge under the spawn columns, open to its left
+    colors = bytes([0, 0, 0] + [1] * (engine.width - 3))
+    board.set_row(engine.height - 1, colors)
+    board.set_row(engine.height - 2, colors)
+    board.update_heights()
+    controls = InputHandler(engine.step, das=0.1, arr=0)
+
+    piece = engine.current_piece
+    x = piece.x
+    controls.key_down(MOVE_LEFT, 0.0)
+    controls.key_down(HARD_DROP, 0.05)
+    landed = (piece.x, piece.y)
+    # The DAS runs out in the same frame as the drop
+    controls.update(0.2, engine.gravity)
+    assert (piece.x, piece.y) == landed and piece.x == x - 1
+    pieces = engine.piece_count
+    engine.tick(FRAME_DT)
+    assert engine.piece_count == pieces + 1
+    # Locked on the ledge, not floating over the empty columns
+    assert all(board.rows[y] & 0b111 == 0 for y in range(engine.height))
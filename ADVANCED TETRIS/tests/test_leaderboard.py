@@ -0,0 +1,42 @@
+import os
+
+from leaderboard import GameResult, Leaderboard
+
+
+def result(i, mode="marathon", score=None):
+    score = i * 10 if score is None else score
+    return GameResult(mode, 1_700_000_000 + i * 60, score, i, 1, 10, 30.0, i)
+
+
+def pragma(board, name):
+    return board.db.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_top_and_rank(tmp_path):
+    board = Leaderboard(str(tmp_path / "scores.db"))
+    for i in range(50):
+        board.add(result(i), os.urandom(100))
+    board.add(result(1000, "bot"))
+    board.flush()
+    assert [g.score for g in board.top("marathon", 3)] == [490, 480, 470]
+    assert board.rank("marathon", 485) == 2
+    assert sorted(board.modes()) == ["bot", "marathon"]
+    board.close()
+
+
+def test_prune_returns_pages(tmp_path):
+    path = str(tmp_path / "scores.db")
+    board = Leaderboard(path, keep_top=5, keep_recent=10, prune_interval=10 ** 9)
+    for i in range(500):
+        # Oldest games score best; incompressible replays of about a page each
+        board.add(result(i, score=500 - i), os.urandom(2000))
+    board.flush()
+    pages = pragma(board, "page_count")
+    assert board.prune() == 500 - 15
+    assert pragma(board, "freelist_count") == 0
+    assert pragma(board, "page_count") < pages // 10
+    assert os.path.getsize(path) < pages * pragma(board, "page_size") // 10
+    # Kept: the best 5 (ids 1-5) and the newest 10 (ids 491-500)
+    assert board.replay(1) is not None and board.replay(500) is not None
+    assert board.replay(6) is None and board.replay(490) is None
+    board.close()
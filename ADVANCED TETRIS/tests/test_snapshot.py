@@ -0,0 +1,32 @@
+from engine import FRAME_DT, GARBAGE_COLOR, HARD_DROP, TetrisEngine
+from snapshot import dump_state, load_state
+
+
+def play(engine, pieces):
+    for _ in range(pieces):
+        count = engine.piece_count
+        engine.step(HARD_DROP)
+        while engine.piece_count == count and not engine.game_over:
+            engine.tick(FRAME_DT)
+
+
+def test_load_continues_the_same_game():
+    engine = TetrisEngine(seed=5)
+    play(engine, 3)
+    data = dump_state(engine)
+    copy = TetrisEngine(seed=9)
+    load_state(copy, data)
+    play(engine, 4)
+    play(copy, 4)
+    assert dump_state(copy) == dump_state(engine)
+
+
+def test_load_drops_pending_garbage():
+    data = dump_state(TetrisEngine(seed=5))
+    used = TetrisEngine(seed=9)
+    used.receive_garbage(3, 2)
+    used.attack = 4
+    load_state(used, data)
+    assert used.garbage == [] and used.attack == 0
+    play(used, 1)
+    assert not any(GARBAGE_COLOR in row for row in used.board.colors)
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from engine import FRAME_DT, HARD_DROP, MOVE_LEFT, TetrisEngine
+from telemetry import PIECE, Telemetry, TelemetryWriter, read_log
+
+
+def drop(engine, telemetry, actions, keyboard):
+    pieces = engine.piece_count
+    for action in actions:
+        if keyboard:
+            telemetry.key_press(action)
+        engine.step(action)
+    while engine.piece_count == pieces:
+        engine.tick(FRAME_DT)
+
+
+def test_only_keyboard_pieces_are_judged(tmp_path):
+    path = str(tmp_path / "t.bin")
+    telemetry = Telemetry(TelemetryWriter(path))
+    engine = TetrisEngine(seed=1)
+    telemetry.start(engine)
+    drop(engine, telemetry, [HARD_DROP], keyboard=False)  # The bot's move
+    drop(engine, telemetry, [MOVE_LEFT, HARD_DROP], keyboard=True)
+    telemetry.writer.close()
+    assert telemetry.judged == 1
+    pieces = [r for r in read_log(path) if r[0] == PIECE]
+    assert [r[12:14] for r in pieces] == [(0, 255), (2, 2)]
+
+
+@pytest.mark.skipif(not os.path.exists("/dev/full"), reason="needs /dev/full")
+def test_writer_stops_after_write_error():
+    writer = TelemetryWriter("/dev/full")
+    writer.put((PIECE, 1, 0.0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 0.0))
+    writer.thread.join(5)
+    assert not writer.thread.is_alive()
+    assert isinstance(writer.error, OSError)
+    writer.put((PIECE, 2, 0.0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 0.0))
+    assert writer.queue.empty()
+    writer.close()
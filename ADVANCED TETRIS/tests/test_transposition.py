@@ -0,0 +1,32 @@
+import pytest
+
+from transposition import TranspositionTable
+
+
+@pytest.mark.parametrize("policy", ["lru", "clock"])
+def test_stays_under_budget(policy):
+    table = TranspositionTable(10 * 64, policy)
+    for key in range(100):
+        table.put(key, key)
+    assert len(table) == 10 and table.bytes <= 10 * 64
+    assert table.get(99) == 99 and table.get(0) is None
+
+
+def test_clock_ring_bounded_by_re_puts():
+    table = TranspositionTable(1000 * 64, "clock")
+    for key in range(10):
+        table.put(key, key)
+    for i in range(10000):
+        table.put(i % 10, i)
+    assert len(table) == 10
+    assert len(table.ring) <= 2 * len(table) + 1
+    assert [table.get(key) for key in range(10)] == list(range(9990, 10000))
+
+
+def test_clock_second_chance():
+    table = TranspositionTable(3 * 64, "clock")
+    for key in "abc":
+        table.put(key, key)
+    table.get("a")
+    table.put("d", "d")  # "a" was referenced, so "b" goes
+    assert table.get("a") == "a" and table.get("b") is None
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+
+from ai import PlacementBot
+from engine import FRAME_DT, GARBAGE_COLOR, TetrisEngine
+from versus import Connection, VersusClient, VersusServer
+
+
+class ServerThread:
+    """A VersusServer on a loopback port, run by asyncio.run in a thread"""
+
+    def __init__(self, players=2):
+        started = threading.Event()
+
+        async def run():
+            self.loop = asyncio.get_running_loop()
+            self.stop = asyncio.Event()
+            self.server = VersusServer(players, seed=3)
+            self.port = await self.server.start("127.0.0.1", 0)
+            started.set()
+            await self.stop.wait()
+            await self.server.close()
+
+        self.thread = threading.Thread(target=asyncio.run, args=(run(),), daemon=True)
+        self.thread.start()
+        assert started.wait(5)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.stop.set)
+        self.thread.join(5)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def same_board(a, b):
+    return (a.rows == b.rows and [bytes(c) for c in a.colors] == [bytes(c) for c in b.colors]
+            and a.zobrist == b.zobrist)
+
+
+def play_piece(bot, engine):
+    pieces = engine.piece_count
+    for action in bot.plan(engine):
+        engine.step(action)
+    while engine.piece_count == pieces and not engine.game_over:
+        engine.tick(FRAME_DT)
+
+
+def test_mirrored_boards_match(caplog):
+    server = ServerThread()
+    clients = [VersusClient("127.0.0.1", server.port) for _ in range(2)]
+    try:
+        engines = [TetrisEngine(seed=c.welcome.seed) for c in clients]
+        for client, engine in zip(clients, engines):
+            wait_for(lambda: client.poll(engine) or client.started)
+        bot = PlacementBot(depth=0, time_budget=float("inf"))
+        for i in range(12):
+            for client, engine in zip(clients, engines):
+                client.poll(engine)
+                if i % 3 == 1:
+                    engine.attack += 2  # Garbage for the opponent whether or not lines cleared
+                play_piece(bot, engine)
+                client.flush(engine)
+        assert all(not e.game_over for e in engines)
+        assert any(GARBAGE_COLOR in row for e in engines for row in e.board.colors)
+
+        # Deliver the last garbage, lock it in and send the resulting boards
+        time.sleep(0.1)
+        for client, engine in zip(clients, engines):
+            client.poll(engine)
+            play_piece(bot, engine)
+            client.flush(engine)
+
+        match = server.server.matches[1]
+        for i, engine in enumerate(engines):
+            other = clients[1 - i]
+            wait_for(lambda: other.poll(engines[1 - i]) or same_board(other.boards[i], engine.board))
+            wait_for(lambda: same_board(match.players[i].board, engine.board))
+    finally:
+        # Server first: closing it with players connected is not an error
+        server.close()
+        for client in clients:
+            client.close()
+    assert not [r for r in caplog.records if r.levelname == "ERROR"]
+
+
+def test_seat_freed_before_start():
+    server = ServerThread(players=2)
+
+    async def leave_and_rejoin():
+        first = await Connection.open("127.0.0.1", server.port)
+        first.close()
+        await first.writer.wait_closed()
+        match = server.server.open_match
+        for _ in range(100):
+            if not match.players:
+                break
+            await asyncio.sleep(0.01)
+        second = await Connection.open("127.0.0.1", server.port)
+        third = await Connection.open("127.0.0.1", server.port)
+        seats = [second.welcome.player, third.welcome.player]
+        matches = {second.welcome.match, third.welcome.match}
+        second.close()
+        third.close()
+        return seats, matches, match
+
+    try:
+        seats, matches, match = asyncio.run(leave_and_rejoin())
+    finally:
+        server.close()
+    assert seats == [0, 1]
+    assert matches == {match.id}
+    assert match.started
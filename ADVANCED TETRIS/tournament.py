@@ -0,0 +1,131 @@
+"""Headless self-play tournament and engine throughput benchmark.
+
+Plays M seeded games with the placement-search bot across a process
+pool (one game per task) and reports per-game results plus aggregate
+pieces/sec and games/sec.  Passing several pool sizes with ``--jobs``
+replays the same seeds at each size to show how throughput scales with
+the number of cores.  Seeds are fixed, so two heuristics can be
+compared on exactly the same piece sequences.
+
+Usage: python tournament.py [--games M] [--jobs 1,2,4] [--pieces N]
+                            [--heuristic module:function] [--verbose]
+"""
+import argparse
+import importlib
+import multiprocessing
+import os
+import sys
+import time
+from collections import namedtuple
+
+from ai import PlacementBot, default_heuristic
+from engine import FRAME_DT, TetrisEngine
+
+GameResult = namedtuple("GameResult", "seed score lines level pieces t_spins b2b topped_out seconds tt_hit_rate")
+RunResult = namedtuple("RunResult", "jobs games pieces seconds results")
+
+
+def load_heuristic(spec):
+    """Resolve a "module:function" heuristic spec (None = default)"""
+    if not spec:
+        return default_heuristic
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name or "heuristic")
+
+
+def play_game(task):
+    """Play one bot game to top-out or the piece limit"""
+    seed, max_pieces, heuristic, depth, beam_width = task
+    bot = PlacementBot(load_heuristic(heuristic), depth=depth, beam_width=beam_width,
+                       time_budget=float("inf"))  # No deadline: results only depend on the seed
+    engine = TetrisEngine(seed=seed)
+    start = time.perf_counter()
+    while not engine.game_over and engine.piece_count < max_pieces:
+        pieces = engine.piece_count
+        for action in bot.plan(engine):
+            engine.step(action)
+        while engine.piece_count == pieces and not engine.game_over:
+            engine.tick(FRAME_DT)
+    return GameResult(seed, engine.score, engine.lines_cleared, engine.level,
+                      engine.piece_count, engine.t_spins, engine.b2b_count,
+                      engine.game_over, time.perf_counter() - start,
+                      bot.table.stats()["hit_rate"])
+
+
+def run_tournament(seeds, jobs, max_pieces=500, heuristic=None, depth=2, beam_width=6):
+    """Play one game per seed on a pool of jobs worker processes"""
+    tasks = [(seed, max_pieces, heuristic, depth, beam_width) for seed in seeds]
+    start = time.perf_counter()
+    # Spawned rather than forked workers, since forking a parent that already
+    # initialised SDL (python main.py tournament) can deadlock.  Workers are
+    # shut down with close/join: SDL swallows the SIGTERM of Pool.terminate
+    pool = multiprocessing.get_context("spawn").Pool(jobs)
+    try:
+        results = pool.map(play_game, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    seconds = time.perf_counter() - start
+    return RunResult(jobs, len(results), sum(r.pieces for r in results), seconds, results)
+
+
+def print_games(results):
+    print(f"{'seed':>6} {'score':>9} {'lines':>6} {'level':>5} {'pieces':>6} "
+          f"{'tspin':>5} {'b2b':>4} {'end':>6} {'sec':>7}")
+    for r in results:
+        end = "top" if r.topped_out else "limit"
+        print(f"{r.seed:>6} {r.score:>9} {r.lines:>6} {r.level:>5} {r.pieces:>6} "
+              f"{r.t_spins:>5} {r.b2b:>4} {end:>6} {r.seconds:>7.2f}")
+
+
+def print_summary(results):
+    n = len(results)
+    def mean(field):
+        return sum(getattr(r, field) for r in results) / n
+    print(f"games={n} mean score={mean('score'):.0f} lines={mean('lines'):.1f} "
+          f"level={mean('level'):.1f} pieces={mean('pieces'):.1f} "
+          f"t-spins={mean('t_spins'):.2f} b2b={mean('b2b'):.2f} "
+          f"top-outs={sum(r.topped_out for r in results)} "
+          f"tt-hit-rate={mean('tt_hit_rate'):.1%}")
+
+
+def print_scaling(runs):
+    base = runs[0]
+    print(f"{'jobs':>4} {'seconds':>8} {'pieces/s':>9} {'games/s':>8} {'speedup':>8}")
+    for run in runs:
+        print(f"{run.jobs:>4} {run.seconds:>8.2f} {run.pieces / run.seconds:>9.0f} "
+              f"{run.games / run.seconds:>8.2f} {base.seconds / run.seconds:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless bot tournament / engine benchmark")
+    parser.add_argument("--games", type=int, default=8, help="number of games (default 8)")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the first game")
+    parser.add_argument("--jobs", default=str(os.cpu_count() or 1),
+                        help="comma separated pool sizes to run, e.g. 1,2,4")
+    parser.add_argument("--pieces", type=int, default=500, help="piece limit per game")
+    parser.add_argument("--heuristic", metavar="MODULE:FUNCTION",
+                        help="board heuristic for the bot (default ai.default_heuristic)")
+    parser.add_argument("--depth", type=int, default=2, help="bot search depth")
+    parser.add_argument("--beam-width", type=int, default=6, help="bot beam width")
+    parser.add_argument("--verbose", action="store_true", help="print every game")
+    args = parser.parse_args(argv)
+
+    load_heuristic(args.heuristic)  # Fail early on a bad spec
+    seeds = range(args.seed, args.seed + args.games)
+    runs = []
+    for jobs in (int(j) for j in args.jobs.split(",")):
+        run = run_tournament(seeds, jobs, args.pieces, args.heuristic, args.depth, args.beam_width)
+        runs.append(run)
+        print(f"jobs={jobs}: {run.games} games, {run.pieces} pieces in {run.seconds:.2f}s")
+
+    results = runs[0].results
+    if args.verbose:
+        print_games(results)
+    print_summary(results)
+    print_scaling(runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
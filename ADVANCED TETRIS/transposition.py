@@ -0,0 +1,114 @@
+"""Bounded transposition table for search results.
+
+Entries are keyed by position (see engine.position_key) and the table
+keeps its total size under a memory limit, evicting either the least
+recently used entry ("lru") or by the clock / second-chance algorithm
+("clock", cheaper lookups since a hit only sets a reference bit).  The
+size of an entry is supplied by the caller, so the limit is as accurate
+as the caller's estimate.  Hit, miss and eviction counters are kept for
+tuning.
+"""
+from collections import OrderedDict
+
+
+class TranspositionTable:
+    def __init__(self, max_bytes=32 * 1024 * 1024, policy="lru", sizeof=None):
+        if policy not in ("lru", "clock"):
+            raise ValueError(f"unknown eviction policy: {policy!r}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.sizeof = sizeof or (lambda value: 64)  # Bytes charged per entry
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # lru: key -> (value, size) in use order; clock: key -> [value, size, referenced]
+        self.entries = OrderedDict() if policy == "lru" else {}
+        self.ring = []  # clock only: keys in insertion order, None for free slots
+        self.slots = {}  # clock only: key -> index in ring
+        self.hand = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Stored value for key, or None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.policy == "lru":
+            self.entries.move_to_end(key)
+        else:
+            entry[2] = True
+        return entry[0]
+
+    def put(self, key, value):
+        """Store value under key, evicting entries until it fits"""
+        size = self.sizeof(value)
+        if key in self.entries:
+            self.discard(key)
+        if size > self.max_bytes:
+            return
+        while self.bytes + size > self.max_bytes:
+            self.evict()
+        self.bytes += size
+        if self.policy == "lru":
+            self.entries[key] = (value, size)
+        else:
+            self.entries[key] = [value, size, False]
+            self.slots[key] = len(self.ring)
+            self.ring.append(key)
+
+    def discard(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= entry[1]
+        if self.policy == "clock":
+            self.ring[self.slots.pop(key)] = None
+            # Re-puts leave gaps too, not only evictions: keep them fewer than
+            # the entries, or a table under its budget grows its ring forever
+            if len(self.ring) > 2 * len(self.entries):
+                self.compact()
+
+    def evict(self):
+        """Drop one entry according to the policy"""
+        if self.policy == "lru":
+            _, (_, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+        else:
+            ring = self.ring
+            while True:
+                if self.hand >= len(ring):
+                    self.compact()
+                    self.hand = 0
+                    ring = self.ring
+                key = ring[self.hand]
+                if key is not None:
+                    entry = self.entries[key]
+                    if not entry[2]:
+                        break
+                    entry[2] = False  # Second chance
+                self.hand += 1
+            self.discard(key)
+        self.evictions += 1
+
+    def compact(self):
+        """Clock only: close the gaps in the ring; the hand stays on its entry"""
+        self.hand = sum(key is not None for key in self.ring[:self.hand])
+        self.ring = [key for key in self.ring if key is not None]
+        self.slots = {key: i for i, key in enumerate(self.ring)}
+
+    def clear(self):
+        self.entries.clear()
+        self.ring = []
+        self.slots = {}
+        self.hand = 0
+        self.bytes = 0
+
+    def stats(self):
+        """Counters for tuning: entries, bytes, hits, misses, evictions, hit rate"""
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "bytes": self.bytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
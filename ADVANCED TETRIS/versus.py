@@ -0,0 +1,661 @@
+"""Networked versus mode: an asyncio match server and its clients.
+
+Every player runs its own TetrisEngine; all players of a match get the
+same seed, so the same pieces.  The server relays board changes, routes
+garbage and decides the winner, so its cost per match stays small.
+
+* A client sends ATTACK with the lines its clears send (engine.attack).
+  The server forwards them as GARBAGE, with a hole column from the
+  match RNG, to the next player still alive.
+* Boards are synced as row deltas.  The sender's board journals its line
+  clears and garbage, and a mirror of what the receivers have replays
+  those entries.  Only rows that still differ afterwards are sent, so
+  a Tetris costs a few bytes instead of every shifted row.  The server
+  keeps a mirror of every player for spectators that join late.
+* The last player left wins; a disconnect counts as topping out.
+
+Messages are length-prefixed (u16, little endian) binary frames.  In the
+pygame game, VersusClient keeps the socket in a background thread, so
+decoding never runs on the render path.  The game polls decoded events
+once per frame.
+
+Usage: python versus.py serve [--host H] [--port P] [--players N]
+       python versus.py bench [--matches M] [--players N] [--pieces P]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import queue
+import random
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from board import Board
+from engine import FRAME_DT, TetrisEngine
+
+DEFAULT_PORT = 7700
+FRAME = struct.Struct("<H")  # Length prefix of every message
+
+# Message types (first byte of a message)
+HELLO = 1  # client: role, match id (0 = next open match)
+WELCOME = 2  # server: player id, match id, seed, width, height, player count
+START = 3
+DELTA = 4  # player id, score, lines, op count, ops
+ATTACK = 5  # client: garbage lines sent by a clear
+GARBAGE = 6  # server: lines, hole column
+TOPOUT = 7
+PLAYER_OUT = 8  # player id
+MATCH_END = 9  # winner id (NO_PLAYER = none)
+
+PLAYER = 0
+SPECTATOR = 1
+NO_PLAYER = 0xFF
+
+HELLO_MSG = struct.Struct("<BBI")
+WELCOME_MSG = struct.Struct("<BBIQHHB")
+DELTA_MSG = struct.Struct("<BBIIB")
+ATTACK_MSG = struct.Struct("<BH")
+GARBAGE_MSG = struct.Struct("<BHH")
+PLAYER_MSG = struct.Struct("<BB")
+
+# Delta ops, replayed in order on the receiver's copy of the board
+OP_CLEAR = 0  # u8 count, u16 row each
+OP_GARBAGE = 1  # u16 count, u16 hole, u8 color
+OP_ROWS = 2  # u16 count, then u16 row + width color bytes each
+OP_HEADER = struct.Struct("<BH")
+GARBAGE_OP = struct.Struct("<BHHB")
+ROW_INDEX = struct.Struct("<H")
+
+Welcome = namedtuple("Welcome", "player match seed width height players")
+MatchStats = namedtuple("MatchStats", "match players winner bytes_in bytes_out messages seconds")
+
+
+def frame(payload):
+    return FRAME.pack(len(payload)) + payload
+
+
+async def read_message(reader):
+    """Next message payload, or None once the connection is closed"""
+    try:
+        size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+        return await reader.readexactly(size)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+def apply_ops(board, ops):
+    """Replay decoded delta ops on a board"""
+    for op in ops:
+        if op[0] == OP_CLEAR:
+            board.remove_rows(op[1])
+        elif op[0] == OP_GARBAGE:
+            board.insert_garbage(op[1], op[2], op[3])
+        else:
+            for y, colors in op[1]:
+                board.set_row(y, colors)
+            board.update_heights()
+
+
+def encode_ops(ops):
+    out = bytearray()
+    for op in ops:
+        if op[0] == OP_CLEAR:
+            out += struct.pack(f"<BB{len(op[1])}H", OP_CLEAR, len(op[1]), *op[1])
+        elif op[0] == OP_GARBAGE:
+            out += GARBAGE_OP.pack(*op)
+        else:
+            out += OP_HEADER.pack(OP_ROWS, len(op[1]))
+            for y, colors in op[1]:
+                out += ROW_INDEX.pack(y)
+                out += colors
+    return out
+
+
+def decode_delta(data, width):
+    """(player, score, lines, ops) of a DELTA message"""
+    _, player, score, lines, count = DELTA_MSG.unpack_from(data, 0)
+    pos = DELTA_MSG.size
+    ops = []
+    for _ in range(count):
+        op = data[pos]
+        if op == OP_CLEAR:
+            n = data[pos + 1]
+            ops.append((OP_CLEAR, struct.unpack_from(f"<{n}H", data, pos + 2)))
+            pos += 2 + 2 * n
+        elif op == OP_GARBAGE:
+            ops.append(GARBAGE_OP.unpack_from(data, pos))
+            pos += GARBAGE_OP.size
+        else:
+            _, n = OP_HEADER.unpack_from(data, pos)
+            pos += OP_HEADER.size
+            rows = []
+            for _ in range(n):
+                y, = ROW_INDEX.unpack_from(data, pos)
+                pos += ROW_INDEX.size
+                rows.append((y, bytes(data[pos:pos + width])))
+                pos += width
+            ops.append((OP_ROWS, rows))
+    return player, score, lines, ops
+
+
+def delta_message(player, score, lines, ops):
+    return frame(DELTA_MSG.pack(DELTA, player, score, lines, len(ops)) + encode_ops(ops))
+
+
+def full_sync_ops(board):
+    """Ops that rebuild board on an empty one: its non-empty rows"""
+    rows = [(y, bytes(board.colors[y])) for y in range(board.height) if board.rows[y]]
+    return [(OP_ROWS, rows)] if rows else []
+
+
+class BoardSync:
+    """Sender side of the row delta sync for one board"""
+
+    def __init__(self, board):
+        self.board = board
+        board.journal = []
+        # What the receivers have seen
+        self.mirror = Board(board.width, board.height)
+        self.version = board.version
+
+    def delta(self):
+        """Ops bringing the receivers up to date, or None when nothing changed"""
+        board = self.board
+        if board.version == self.version:
+            return None
+        self.version = board.version
+        mirror = self.mirror
+        ops = []
+        for entry in board.journal:
+            if entry[0] == "clear":
+                ops.append((OP_CLEAR, entry[1]))
+                mirror.remove_rows(entry[1])
+            else:
+                ops.append((OP_GARBAGE,) + entry[1:])
+                mirror.insert_garbage(*entry[1:])
+        board.journal.clear()
+        rows = []
+        for y in range(board.height):
+            if board.rows[y] != mirror.rows[y]:
+                colors = bytes(board.colors[y])
+                mirror.set_row(y, colors)
+                rows.append((y, colors))
+        if rows:
+            mirror.update_heights()
+            ops.append((OP_ROWS, rows))
+        return ops
+
+
+class Player:
+    def __init__(self, player_id, writer, width, height):
+        self.id = player_id
+        self.writer = writer
+        self.board = Board(width, height)  # Mirror for spectators joining late
+        self.score = 0
+        self.lines = 0
+        self.alive = True
+        self.target = player_id  # Last player sent garbage, for round robin
+
+
+class Match:
+    def __init__(self, match_id, size, width, height, seed):
+        self.id = match_id
+        self.size = size
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.rng = random.Random(seed)  # Garbage hole columns
+        self.players = []
+        self.spectators = []
+        self.started = False
+        self.finished = False
+        self.winner = NO_PLAYER
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages = 0
+        self.seconds = 0.0  # Server time spent handling this match's messages
+
+    def send(self, writer, data):
+        if not writer.is_closing():
+            writer.write(data)
+            self.bytes_out += len(data)
+
+    def broadcast(self, data, skip=None):
+        for player in self.players:
+            if player is not skip and player.alive:
+                self.send(player.writer, data)
+        for writer in self.spectators:
+            self.send(writer, data)
+
+
+class VersusServer:
+    """Runs matches of players_per_match players; any number at once"""
+
+    def __init__(self, players_per_match=2, width=10, height=20, seed=None, max_matches=None):
+        self.players_per_match = players_per_match
+        self.width = width
+        self.height = height
+        self.rng = random.Random(seed)
+        self.max_matches = max_matches  # Stop after this many finished matches
+        self.matches = {}
+        self.open_match = None
+        self.next_id = 1
+        self.finished = []  # MatchStats of finished matches
+        self.done = asyncio.Event()
+        self.connections = set()  # Tasks handling the open connections
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """End the open connections, then stop listening"""
+        for task in self.connections:
+            task.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        self.server.close()
+        await self.server.wait_closed()
+
+    def join(self, writer, role, match_id):
+        """Match and Player (None for spectators) of a new connection"""
+        if role == SPECTATOR:
+            match = self.matches.get(match_id) or self.open_match
+            if match is not None:
+                match.spectators.append(writer)
+            return match, None
+        match = self.open_match
+        if match is None:
+            match = Match(self.next_id, self.players_per_match, self.width, self.height,
+                          self.rng.getrandbits(64))
+            self.matches[match.id] = match
+            self.open_match = match
+            self.next_id += 1
+        # Lowest free seat: a player who left before the start freed theirs
+        taken = {p.id for p in match.players}
+        seat = min(i for i in range(match.size) if i not in taken)
+        player = Player(seat, writer, self.width, self.height)
+        match.players.insert(seat, player)
+        if len(match.players) == match.size:
+            self.open_match = None
+        return match, player
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            await self.serve_connection(reader, writer)
+        except asyncio.CancelledError:
+            pass  # Server closing; a cancelled handler task would be logged as an error
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def serve_connection(self, reader, writer):
+        data = await read_message(reader)
+        if data is None or data[0] != HELLO:
+            return
+        _, role, match_id = HELLO_MSG.unpack(data)
+        match, player = self.join(writer, role, match_id)
+        if match is None:
+            return
+        start = time.perf_counter()
+        match.bytes_in += FRAME.size + len(data)
+        player_id = NO_PLAYER if player is None else player.id
+        match.send(writer, frame(WELCOME_MSG.pack(WELCOME, player_id, match.id, match.seed,
+                                                  match.width, match.height, match.size)))
+        if player is None:
+            # Spectator: full boards now, deltas from here on
+            for p in match.players:
+                match.send(writer, delta_message(p.id, p.score, p.lines, full_sync_ops(p.board)))
+            if match.started:
+                match.send(writer, frame(bytes((START,))))
+        elif len(match.players) == match.size:
+            match.started = True
+            match.broadcast(frame(bytes((START,))))
+        match.seconds += time.perf_counter() - start
+
+        while True:
+            data = await read_message(reader)
+            start = time.perf_counter()
+            if data is None:
+                break
+            match.bytes_in += FRAME.size + len(data)
+            match.messages += 1
+            if player is not None and player.alive:
+                self.dispatch(match, player, data)
+            match.seconds += time.perf_counter() - start
+        if player is None:
+            match.spectators.remove(writer)
+        else:
+            self.player_out(match, player)
+        match.seconds += time.perf_counter() - start
+
+    def dispatch(self, match, player, data):
+        kind = data[0]
+        if kind == DELTA:
+            _, score, lines, ops = decode_delta(data, match.width)
+            apply_ops(player.board, ops)
+            player.score = score
+            player.lines = lines
+            # Re-stamped with the sender's id and relayed as is
+            match.broadcast(frame(data[:1] + bytes((player.id,)) + data[2:]), skip=player)
+        elif kind == ATTACK:
+            _, lines = ATTACK_MSG.unpack(data)
+            target = self.next_target(match, player)
+            if target is not None:
+                hole = match.rng.randrange(match.width)
+                match.send(target.writer, frame(GARBAGE_MSG.pack(GARBAGE, lines, hole)))
+        elif kind == TOPOUT:
+            self.player_out(match, player)
+
+    def next_target(self, match, player):
+        """Next living opponent after the last one player attacked"""
+        n = len(match.players)
+        for i in range(1, n + 1):
+            target = match.players[(player.target + i) % n]
+            if target is not player and target.alive:
+                player.target = target.id
+                return target
+        return None
+
+    def player_out(self, match, player):
+        if not player.alive or match.finished:
+            return
+        player.alive = False
+        if match is self.open_match:
+            # Left before the match started: free the seat for the next player
+            match.players.remove(player)
+            return
+        match.broadcast(frame(PLAYER_MSG.pack(PLAYER_OUT, player.id)))
+        alive = [p for p in match.players if p.alive]
+        if len(alive) > 1:
+            return
+        match.finished = True
+        match.winner = alive[0].id if alive else NO_PLAYER
+        match.broadcast(frame(PLAYER_MSG.pack(MATCH_END, match.winner)))
+        del self.matches[match.id]
+        self.finished.append(MatchStats(match.id, match.size, match.winner, match.bytes_in,
+                                        match.bytes_out, match.messages, match.seconds))
+        if self.max_matches and len(self.finished) >= self.max_matches:
+            self.done.set()
+
+
+class Connection:
+    """Client end of a versus connection (asyncio)"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.welcome = None
+
+    @classmethod
+    async def open(cls, host="127.0.0.1", port=DEFAULT_PORT, role=PLAYER, match_id=0):
+        reader, writer = await asyncio.open_connection(host, port)
+        conn = cls(reader, writer)
+        writer.write(frame(HELLO_MSG.pack(HELLO, role, match_id)))
+        data = await read_message(reader)
+        if data is None or data[0] != WELCOME:
+            writer.close()
+            raise ConnectionError("versus server refused the connection")
+        conn.welcome = Welcome(*WELCOME_MSG.unpack(data)[1:])
+        return conn
+
+    async def read_event(self):
+        """Next decoded event tuple (type, ...), or None once closed"""
+        data = await read_message(self.reader)
+        if data is None:
+            return None
+        kind = data[0]
+        if kind == DELTA:
+            return (DELTA,) + decode_delta(data, self.welcome.width)
+        if kind == GARBAGE:
+            return GARBAGE_MSG.unpack(data)
+        if kind in (PLAYER_OUT, MATCH_END):
+            return PLAYER_MSG.unpack(data)
+        return (kind,)
+
+    def send_delta(self, engine, ops):
+        self.writer.write(delta_message(self.welcome.player, engine.score,
+                                        engine.lines_cleared, ops))
+
+    def send_attack(self, lines):
+        self.writer.write(frame(ATTACK_MSG.pack(ATTACK, lines)))
+
+    def send_topout(self):
+        self.writer.write(frame(bytes((TOPOUT,))))
+
+    def close(self):
+        self.writer.close()
+
+
+class VersusClient:
+    """Versus connection for the pygame game, run in a background thread.
+
+    Network reads and message decoding happen on the thread's event loop;
+    the game calls poll() once per frame for the decoded events and
+    flush(engine) after updating to send its attack and board delta.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, role=PLAYER, match_id=0):
+        self.events = queue.SimpleQueue()
+        self.loop = asyncio.new_event_loop()
+        self.conn = None
+        self.sync = None
+        ready = threading.Event()
+        error = []
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.conn = self.loop.run_until_complete(
+                    Connection.open(host, port, role, match_id))
+            except OSError as e:
+                error.append(e)
+                ready.set()
+                return
+            ready.set()
+            self.loop.run_until_complete(self.receive())
+
+        self.thread = threading.Thread(target=run, name="versus-client", daemon=True)
+        self.thread.start()
+        ready.wait()
+        if error:
+            raise error[0]
+        self.welcome = self.conn.welcome
+        # Copies of the other players' boards, updated by poll()
+        self.boards = {i: Board(self.welcome.width, self.welcome.height)
+                       for i in range(self.welcome.players) if i != self.welcome.player}
+        self.scores = dict.fromkeys(self.boards, 0)
+        self.out = set()
+        self.started = False
+        self.winner = None
+
+    async def receive(self):
+        while True:
+            event = await self.conn.read_event()
+            self.events.put(event)
+            if event is None:
+                return
+
+    def poll(self, engine):
+        """Apply the events received since the last call to engine and the boards"""
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return
+            if event is None:
+                if self.winner is None:
+                    self.winner = NO_PLAYER
+                return
+            kind = event[0]
+            if kind == DELTA:
+                _, player, score, _, ops = event
+                if player in self.boards:
+                    apply_ops(self.boards[player], ops)
+                    self.scores[player] = score
+            elif kind == GARBAGE:
+                engine.receive_garbage(event[1], event[2])
+            elif kind == START:
+                self.started = True
+            elif kind == PLAYER_OUT:
+                self.out.add(event[1])
+            elif kind == MATCH_END:
+                self.winner = event[1]
+
+    def flush(self, engine):
+        """Send the engine's pending attack, board changes and top-out"""
+        if self.sync is None or self.sync.board is not engine.board:
+            self.sync = BoardSync(engine.board)
+        data = []
+        if engine.attack:
+            data.append(frame(ATTACK_MSG.pack(ATTACK, engine.attack)))
+            engine.attack = 0
+        ops = self.sync.delta()
+        if ops:
+            data.append(delta_message(self.welcome.player, engine.score,
+                                      engine.lines_cleared, ops))
+        if engine.game_over and self.welcome.player not in self.out:
+            self.out.add(self.welcome.player)
+            data.append(frame(bytes((TOPOUT,))))
+        if data:
+            self.loop.call_soon_threadsafe(self.conn.writer.write, b"".join(data))
+
+    def close(self):
+        if self.conn is not None:
+            self.loop.call_soon_threadsafe(self.conn.close)
+        self.thread.join(1.0)
+
+
+async def play_bot(host, port, max_pieces, bot=None, pps=0):
+    """Headless player: a PlacementBot plays until the match ends or max_pieces"""
+    if bot is None:
+        from ai import PlacementBot
+        bot = PlacementBot(depth=0, time_budget=float("inf"))
+    conn = await Connection.open(host, port)
+    welcome = conn.welcome
+    engine = TetrisEngine(welcome.width, welcome.height, seed=welcome.seed)
+    sync = BoardSync(engine.board)
+    events = []
+    ended = asyncio.Event()
+
+    async def receive():
+        while True:
+            event = await conn.read_event()
+            if event is None or event[0] == MATCH_END:
+                ended.set()
+                return
+            events.append(event)
+
+    receiver = asyncio.ensure_future(receive())
+    while not any(e[0] == START for e in events) and not ended.is_set():
+        await asyncio.sleep(0.001)
+
+    while not engine.game_over and engine.piece_count < max_pieces and not ended.is_set():
+        for event in events:
+            if event[0] == GARBAGE:
+                engine.receive_garbage(event[1], event[2])
+        events.clear()
+        pieces = engine.piece_count
+        for action in bot.plan(engine):
+            engine.step(action)
+        while engine.piece_count == pieces and not engine.game_over:
+            engine.tick(FRAME_DT)
+        if engine.attack:
+            conn.send_attack(engine.attack)
+            engine.attack = 0
+        ops = sync.delta()
+        if ops:
+            conn.send_delta(engine, ops)
+        await conn.writer.drain()
+        await asyncio.sleep(1 / pps if pps else 0)
+
+    if engine.game_over:
+        conn.send_topout()
+    conn.close()
+    receiver.cancel()
+    return engine
+
+
+def serve_process(players, matches, ports, stats):
+    """Bench server: reports its port, then its match stats and CPU time"""
+    async def run():
+        server = VersusServer(players, max_matches=matches, seed=1)
+        ports.put(await server.start("127.0.0.1", 0))
+        await server.done.wait()
+        await server.close()
+        return server.finished
+    cpu = time.process_time()
+    finished = asyncio.run(run())
+    stats.put((finished, time.process_time() - cpu))
+
+
+def bench(matches, players, pieces, pps):
+    """Play matches concurrently against a server process on loopback"""
+    ctx = multiprocessing.get_context("spawn")
+    ports = ctx.Queue()
+    stats = ctx.Queue()
+    server = ctx.Process(target=serve_process, args=(players, matches, ports, stats))
+    server.start()
+    port = ports.get()
+
+    async def run():
+        return await asyncio.gather(*(play_bot("127.0.0.1", port, pieces, pps=pps)
+                                      for _ in range(matches * players)))
+    start = time.perf_counter()
+    engines = asyncio.run(run())
+    seconds = time.perf_counter() - start
+    finished, cpu = stats.get()
+    server.join()
+
+    total_pieces = sum(e.piece_count for e in engines)
+    n = len(finished)
+    bytes_in = sum(m.bytes_in for m in finished)
+    bytes_out = sum(m.bytes_out for m in finished)
+    print(f"matches={n} players={players} pieces={total_pieces} in {seconds:.2f}s "
+          f"({total_pieces / seconds:.0f} pieces/s)")
+    print(f"bandwidth per match: in {bytes_in / n / 1024:.1f} KiB, out {bytes_out / n / 1024:.1f} KiB; "
+          f"per piece in {bytes_in / total_pieces:.1f} B, out {bytes_out / total_pieces:.1f} B")
+    print(f"server CPU: {cpu:.3f}s total, {cpu / n * 1e3:.1f} ms per match, "
+          f"{sum(m.seconds for m in finished) / total_pieces * 1e6:.1f} us handling per piece")
+    print(f"winners: {sum(m.winner != NO_PLAYER for m in finished)} of {n} matches decided, "
+          f"{sum(e.game_over for e in engines)} top-outs")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Versus mode server / loopback benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="run a match server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--players", type=int, default=2, help="players per match")
+    serve.add_argument("--width", type=int, default=10)
+    serve.add_argument("--height", type=int, default=20)
+    run = sub.add_parser("bench", help="bot matches against a local server")
+    run.add_argument("--matches", type=int, default=24, help="concurrent matches")
+    run.add_argument("--players", type=int, default=2, help="players per match")
+    run.add_argument("--pieces", type=int, default=200, help="piece limit per player")
+    run.add_argument("--pps", type=float, default=0, help="pieces per second per bot (0 = max)")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        return bench(args.matches, args.players, args.pieces, args.pps)
+
+    async def serve_forever():
+        server = VersusServer(args.players, args.width, args.height)
+        port = await server.start(args.host, args.port)
+        print(f"versus server on {args.host}:{port}, {args.players} players per match")
+        await server.server.serve_forever()
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())